@@ -0,0 +1,529 @@
+"""
+esp_benchmark_module.py
+
+替换引擎（esp_text_replacement_module.py）的性能测量工具，不被 Streamlit 页面使用。
+包括：
+- build_scaled_rule_list(...)：由实际的 replacements_final_list 抽样或合成扩充出指定条数的规则
+- BENCHMARK_ENGINES：参与比较的各个引擎实现（逐条替换 / 词汇表模式 / 中间表示 / 紧凑规则存储 / 批量转换）
+- run_throughput_benchmark(...)：按“规则条数 × 引擎 × 串行/并行”测量吞吐量和内存
+- write_benchmark_csv(...) / write_benchmark_chart_svg(...)：输出扩展曲线（CSV + SVG 折线图）
+- run_memory_benchmark(...)：测量读取规则、各子进程、转换期间峰值的内存，并与内存预算比较
+- 命令行入口：python esp_benchmark_module.py --help
+
+规则越多，热点（replace_with_placeholders 对每条规则的查找）越慢；定期运行并比较 CSV 即可发现性能退化。
+"""
+
+import re
+import os
+import sys
+import csv
+import math
+import time
+import random
+import argparse
+import tracemalloc
+import multiprocessing
+from array import array
+from typing import List, Dict, Tuple, Optional, Callable
+
+from esp_text_replacement_module import (
+    import_placeholders,
+    load_rule_file,
+    orchestrate_comprehensive_esperanto_text_replacement,
+    parallel_process,
+    build_text_ir,
+    parallel_build_text_ir,
+    render_text_ir,
+    convert_many,
+    CompactRuleList,
+    ProcessTreeRssSampler,
+    process_rss_bytes,
+    limit_worker_count,
+    DEFAULT_MEMORY_BUDGET_BYTES
+)
+from esp_replacement_json_make_module import (
+    REPLACEMENTS_FINAL_LIST_KEY,
+    REPLACEMENTS_LIST_FOR_2CHAR_KEY,
+    REPLACEMENTS_LIST_FOR_LOCALIZED_STRING_KEY,
+    CASE_INSENSITIVE_MATCHING_KEY,
+    DEFAULT_FILES_DIR
+)
+
+# ================================
+# 1) 默认设置
+# ================================
+DEFAULT_RULE_FILE_PATH = DEFAULT_FILES_DIR + '/最终的な替换用リスト(列表)(合并3个JSON文件).json'
+DEFAULT_TEXT_PATH = './例句_Esperanto文本.txt'
+DEFAULT_PLACEHOLDERS_FOR_SKIPPING_PATH = DEFAULT_FILES_DIR + '/占位符(placeholders)_%1854%-%4934%_文字列替换skip用.txt'
+DEFAULT_PLACEHOLDERS_FOR_LOCALIZED_PATH = DEFAULT_FILES_DIR + '/占位符(placeholders)_@5134@-@9728@_局部文字列替换结果捕捉用.txt'
+DEFAULT_BENCHMARK_RULE_COUNTS = [10000, 50000, 100000, 300000, 1000000]
+DEFAULT_BENCHMARK_TEXT_CHARS = 5000
+DEFAULT_BENCHMARK_PROCESSES = 4
+DEFAULT_BENCHMARK_CSV_PATH = './benchmark_results/throughput_scaling.csv'
+DEFAULT_BENCHMARK_CHART_PATH = './benchmark_results/throughput_scaling.svg'
+
+BENCHMARK_CSV_FIELDS = [
+    'rule_count', 'rule_source', 'engine', 'mode', 'processes', 'text_chars',
+    'seconds', 'chars_per_second', 'rule_set_bytes', 'peak_traced_bytes', 'matches_standard'
+]
+
+# ================================
+# 2) 不同规模的规则列表
+# ================================
+# 合成规则的 old 在原规则前加上 'q' + 5 个字母的编号（世界语不用 q，因此合成规则几乎不会匹配），
+# 大小写与原规则一致。这模拟了“词典不断扩充、但大部分新规则与当前文本无关”的情况：
+# 每条规则仍要被查找一次，测量的正是随规则条数增长的扫描成本。
+SYNTHETIC_RULE_PREFIX = 'q'
+SYNTHETIC_RULE_CODE_LENGTH = 5
+
+def synthetic_rule(rule, serial: int) -> tuple:
+    """
+    由 rule 生成第 serial 条合成规则（placeholder 为 '$s<编号>_...$'，不会与原有的 placeholder 互相包含）。
+    """
+    old, new, placeholder, *rest = rule
+    code = ''
+    for _ in range(SYNTHETIC_RULE_CODE_LENGTH):
+        serial, digit = divmod(serial, 26)
+        code = chr(ord('a') + digit) + code
+    code = SYNTHETIC_RULE_PREFIX + code
+    body = old.lstrip(' ')
+    if body.isupper():
+        code = code.upper()
+    elif body[:1].isupper():
+        code = code.capitalize()
+        body = body[:1].lower() + body[1:]
+    padding = old[:len(old) - len(old.lstrip(' '))]
+    new_padding = new[:len(new) - len(new.lstrip(' '))]
+    return (
+        padding + code + body,
+        new_padding + code + new.lstrip(' '),
+        placeholder.replace('$', f'$s{code}_', 1),
+        *rest
+    )
+
+def build_scaled_rule_list(rules: List[Tuple[str, str, str]], rule_count: int, seed: int = 0) -> Tuple[List[tuple], str]:
+    """
+    返回 (条数为 rule_count 的规则列表, 来源)。来源为：
+      'full'      -> rule_count 等于原规则数，原样使用
+      'subsample' -> 随机抽取 rule_count 条（保持原来的优先顺序）
+      'inflated'  -> 原规则之后插入由它生成的合成规则（synthetic_rule），合成规则均匀分布在整个列表中
+    """
+    rules = [tuple(rule) for rule in rules]
+    if rule_count == len(rules):
+        return rules, 'full'
+    if rule_count < len(rules):
+        chosen = sorted(random.Random(seed).sample(range(len(rules)), rule_count))
+        return [rules[i] for i in chosen], 'subsample'
+    extra_count = rule_count - len(rules)
+    scaled = []
+    serial = 0
+    for i, rule in enumerate(rules):
+        scaled.append(rule)
+        for _ in range(extra_count * (i + 1) // len(rules) - extra_count * i // len(rules)):
+            scaled.append(synthetic_rule(rule, serial))
+            serial += 1
+    return scaled, 'inflated'
+
+def deep_sizeof(obj, seen: Optional[set] = None) -> int:
+    """
+    obj 及其引用的 list / tuple / dict / array / str 等（含 __slots__ 属性）的总字节数（同一对象只计一次）。
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, array, int, float, bool)) or obj is None:
+        return size
+    if isinstance(obj, dict):
+        return size + sum(deep_sizeof(key, seen) + deep_sizeof(value, seen) for key, value in obj.items())
+    if isinstance(obj, (list, tuple, set)):
+        return size + sum(deep_sizeof(item, seen) for item in obj)
+    for name in getattr(type(obj), '__slots__', ()):
+        if hasattr(obj, name):
+            size += deep_sizeof(getattr(obj, name), seen)
+    return size
+
+# ================================
+# 3) 参与比较的引擎
+# ================================
+# 每个引擎为 (准备规则的函数, 转换函数)。准备函数把规则列表转换为该引擎使用的形式（不计入转换时间），
+# 转换函数 convert(text, rules, num_processes) 返回与 orchestrate_comprehensive_esperanto_text_replacement 相同的结果。
+# rules 为 {'final': ..., '2char': ..., 'localized': ..., 'skip_placeholders': ..., 'localized_placeholders': ...,
+#          'format_type': ..., 'case_insensitive': ...}。
+def _orchestrate_args(rules: Dict) -> tuple:
+    return (
+        rules['skip_placeholders'],
+        rules['localized'],
+        rules['localized_placeholders'],
+        rules['final'],
+        rules['2char'],
+        rules['format_type'],
+        rules['case_insensitive']
+    )
+
+def convert_standard(text: str, rules: Dict, num_processes: int) -> str:
+    if num_processes > 1:
+        return parallel_process(text, num_processes, *_orchestrate_args(rules))
+    return orchestrate_comprehensive_esperanto_text_replacement(text, *_orchestrate_args(rules))
+
+def convert_vocabulary_mode(text: str, rules: Dict, num_processes: int) -> str:
+    if num_processes > 1:
+        return parallel_process(text, num_processes, *_orchestrate_args(rules), vocabulary_mode=True)
+    return orchestrate_comprehensive_esperanto_text_replacement(text, *_orchestrate_args(rules), vocabulary_mode=True)
+
+def convert_text_ir(text: str, rules: Dict, num_processes: int) -> str:
+    args = (
+        rules['skip_placeholders'],
+        rules['localized'],
+        rules['localized_placeholders'],
+        rules['final'],
+        rules['2char'],
+        rules['case_insensitive']
+    )
+    if num_processes > 1:
+        text_ir = parallel_build_text_ir(text, num_processes, *args)
+    else:
+        text_ir = build_text_ir(text, *args)
+    return render_text_ir(text_ir, rules['format_type'])
+
+def convert_lines_in_batch(text: str, rules: Dict, num_processes: int) -> str:
+    return ''.join(convert_many(re.findall(r'.*?\n|.+$', text), *_orchestrate_args(rules), num_processes=num_processes))
+
+def prepare_compact_rules(rules: Dict) -> Dict:
+    return dict(rules, **{name: CompactRuleList(rules[name]) for name in ('final', '2char', 'localized')})
+
+BENCHMARK_ENGINES: Dict[str, Tuple[Callable[[Dict], Dict], Callable[[str, Dict, int], str]]] = {
+    'standard': (dict, convert_standard),
+    'vocabulary': (dict, convert_vocabulary_mode),
+    'text_ir': (dict, convert_text_ir),
+    'compact': (prepare_compact_rules, convert_standard),
+    'batch_lines': (dict, convert_lines_in_batch),
+}
+
+# ================================
+# 4) 测量
+# ================================
+def measure_conversion(
+    convert: Callable[[str, Dict, int], str],
+    text: str,
+    rules: Dict,
+    num_processes: int,
+    repeat: int = 1,
+    trace_memory: bool = True
+) -> Tuple[str, float, Optional[int]]:
+    """
+    返回 (转换结果, 最短耗时（秒）, tracemalloc 记录的峰值字节数)。
+    耗时在不启用 tracemalloc 的情况下测量；峰值另外执行一次测量（并行时只包含主进程）。
+    """
+    best_seconds = math.inf
+    result = ''
+    for _ in range(max(repeat, 1)):
+        start = time.perf_counter()
+        result = convert(text, rules, num_processes)
+        best_seconds = min(best_seconds, time.perf_counter() - start)
+    peak_bytes = None
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            convert(text, rules, num_processes)
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, best_seconds, peak_bytes
+
+def run_throughput_benchmark(
+    rule_data: Dict,
+    text: str,
+    placeholders_for_skipping_replacements: List[str],
+    placeholders_for_localized_replacement: List[str],
+    format_type: str,
+    rule_counts: List[int] = DEFAULT_BENCHMARK_RULE_COUNTS,
+    engines: Optional[List[str]] = None,
+    num_processes: int = DEFAULT_BENCHMARK_PROCESSES,
+    repeat: int = 1,
+    trace_memory: bool = True,
+    seed: int = 0,
+    progress: Optional[Callable[[Dict], None]] = None
+) -> List[Dict]:
+    """
+    对 rule_counts 中的每种规则条数（只缩放全域替换列表，二文字词根和局部替换列表保持原样），
+    用各引擎串行（1 个进程）和并行（num_processes 个进程，num_processes <= 1 时省略）转换 text，返回结果行（字段见 BENCHMARK_CSV_FIELDS）。
+    matches_standard 表示结果是否与同一规则下 standard 引擎的串行结果相同。每得到一行调用一次 progress(row)。
+    """
+    modes = [('serial', 1)] + ([('parallel', num_processes)] if num_processes > 1 else [])
+    rows = []
+    for rule_count in rule_counts:
+        final_list, rule_source = build_scaled_rule_list(rule_data[REPLACEMENTS_FINAL_LIST_KEY], rule_count, seed)
+        base_rules = {
+            'final': final_list,
+            '2char': rule_data[REPLACEMENTS_LIST_FOR_2CHAR_KEY],
+            'localized': rule_data[REPLACEMENTS_LIST_FOR_LOCALIZED_STRING_KEY],
+            'skip_placeholders': placeholders_for_skipping_replacements,
+            'localized_placeholders': placeholders_for_localized_replacement,
+            'format_type': format_type,
+            'case_insensitive': bool(rule_data.get(CASE_INSENSITIVE_MATCHING_KEY, False)),
+        }
+        reference = None
+        for engine in engines or list(BENCHMARK_ENGINES):
+            prepare, convert = BENCHMARK_ENGINES[engine]
+            rules = prepare(base_rules)
+            rule_set_bytes = deep_sizeof([rules['final'], rules['2char'], rules['localized']])
+            for mode, processes in modes:
+                result, seconds, peak_bytes = measure_conversion(convert, text, rules, processes, repeat, trace_memory)
+                if reference is None:
+                    reference = result if engine == 'standard' and mode == 'serial' else convert_standard(text, base_rules, 1)
+                row = {
+                    'rule_count': rule_count,
+                    'rule_source': rule_source,
+                    'engine': engine,
+                    'mode': mode,
+                    'processes': processes,
+                    'text_chars': len(text),
+                    'seconds': round(seconds, 4),
+                    'chars_per_second': round(len(text) / seconds, 1) if seconds > 0 else math.inf,
+                    'rule_set_bytes': rule_set_bytes,
+                    'peak_traced_bytes': peak_bytes if peak_bytes is not None else '',
+                    'matches_standard': result == reference,
+                }
+                rows.append(row)
+                if progress is not None:
+                    progress(row)
+            del rules
+    return rows
+
+# ================================
+# 5) 输出（CSV / SVG 折线图）
+# ================================
+def write_benchmark_csv(rows: List[Dict], path: str) -> None:
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=BENCHMARK_CSV_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def write_benchmark_chart_svg(rows: List[Dict], path: str, width: int = 760, height: int = 460) -> None:
+    """
+    把“规则条数 - 吞吐量（字/秒）”画成 SVG 折线图（双对数坐标，每个 引擎/模式 一条线），不依赖绘图库。
+    """
+    series: Dict[str, List[Tuple[int, float]]] = {}
+    for row in rows:
+        if 0 < row['chars_per_second'] < math.inf:
+            series.setdefault(f"{row['engine']} / {row['mode']}", []).append((row['rule_count'], row['chars_per_second']))
+    left, right, top, bottom = 70, 190, 20, 50
+    xs = [x for points in series.values() for x, _y in points] or [1]
+    ys = [y for points in series.values() for _x, y in points] or [1]
+    x_min, x_max = math.log10(min(xs)), math.log10(max(xs))
+    y_min, y_max = math.floor(math.log10(min(ys))), math.ceil(math.log10(max(ys)))
+    x_span = (x_max - x_min) or 1
+    y_span = (y_max - y_min) or 1
+
+    def position(x: float, y: float) -> Tuple[float, float]:
+        return (
+            left + (math.log10(x) - x_min) / x_span * (width - left - right),
+            height - bottom - (math.log10(y) - y_min) / y_span * (height - top - bottom)
+        )
+
+    colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf']
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-family="sans-serif" font-size="11">',
+        f'<rect width="{width}" height="{height}" fill="white"/>',
+        f'<line x1="{left}" y1="{height - bottom}" x2="{width - right}" y2="{height - bottom}" stroke="black"/>',
+        f'<line x1="{left}" y1="{top}" x2="{left}" y2="{height - bottom}" stroke="black"/>',
+        f'<text x="{(left + width - right) / 2}" y="{height - 10}" text-anchor="middle">规则条数（全域替换，对数坐标）</text>',
+        f'<text x="15" y="{(top + height - bottom) / 2}" text-anchor="middle" transform="rotate(-90 15 {(top + height - bottom) / 2})">吞吐量（字/秒，对数坐标）</text>',
+    ]
+    for x in sorted(set(xs)):
+        px, _py = position(x, 10 ** y_min)
+        parts.append(f'<text x="{px:.1f}" y="{height - bottom + 15}" text-anchor="middle">{x:,}</text>')
+    for exponent in range(y_min, y_max + 1):
+        _px, py = position(min(xs), 10 ** exponent)
+        parts.append(f'<line x1="{left}" y1="{py:.1f}" x2="{width - right}" y2="{py:.1f}" stroke="#dddddd"/>')
+        parts.append(f'<text x="{left - 5}" y="{py + 4:.1f}" text-anchor="end">1e{exponent}</text>')
+    for i, (label, points) in enumerate(sorted(series.items())):
+        color = colors[i % len(colors)]
+        dash = '' if label.endswith('serial') else ' stroke-dasharray="5,3"'
+        coordinates = ' '.join('%.1f,%.1f' % position(x, y) for x, y in sorted(points))
+        parts.append(f'<polyline points="{coordinates}" fill="none" stroke="{color}" stroke-width="2"{dash}/>')
+        legend_y = top + 15 * i + 10
+        parts.append(f'<line x1="{width - right + 10}" y1="{legend_y}" x2="{width - right + 30}" y2="{legend_y}" stroke="{color}" stroke-width="2"{dash}/>')
+        parts.append(f'<text x="{width - right + 35}" y="{legend_y + 4}">{label}</text>')
+    parts.append('</svg>')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(parts))
+
+# ================================
+# 6) 内存测量与预算
+# ================================
+def run_memory_benchmark(
+    rule_file_path: str,
+    text: str,
+    placeholders_for_skipping_replacements: List[str],
+    placeholders_for_localized_replacement: List[str],
+    format_type: str,
+    num_processes: int = DEFAULT_BENCHMARK_PROCESSES,
+    memory_budget_bytes: int = DEFAULT_MEMORY_BUDGET_BYTES,
+    engine: str = 'standard'
+) -> Dict:
+    """
+    在当前进程中读取规则文件并用 engine 转换 text（num_processes 个子进程），返回各阶段的内存（字节）：
+      baseline_rss_bytes             -> 读取规则前当前进程的 RSS
+      rule_loading_rss_bytes         -> 读取规则（并按 engine 准备规则）后 RSS 的增量
+      rule_loading_traced_bytes      -> 读取规则后 tracemalloc 记录的 Python 对象大小（另读一次测量）
+      rule_loading_peak_traced_bytes -> 读取规则过程中 tracemalloc 的峰值
+      worker_peak_rss_bytes          -> {子进程 pid: RSS 峰值}（包括 multiprocessing 的辅助进程）
+      parent_peak_rss_bytes          -> 转换期间当前进程的 RSS 峰值
+      total_peak_rss_bytes           -> 转换期间“当前进程 + 所有子进程”RSS 之和的峰值
+      within_budget                  -> total_peak_rss_bytes 是否不超过 memory_budget_bytes
+      suggested_processes            -> 按实测的子进程内存，limit_worker_count 给出的进程数
+    RSS 无法读取时相应的值为 0。读取规则的内存只有在新的进程中调用才准确（命令行入口即如此）。
+    """
+    baseline_rss = process_rss_bytes() or 0
+    rule_data = load_rule_file(rule_file_path)
+    prepare, convert = BENCHMARK_ENGINES[engine]
+    rules = prepare({
+        'final': rule_data[REPLACEMENTS_FINAL_LIST_KEY],
+        '2char': rule_data[REPLACEMENTS_LIST_FOR_2CHAR_KEY],
+        'localized': rule_data[REPLACEMENTS_LIST_FOR_LOCALIZED_STRING_KEY],
+        'skip_placeholders': placeholders_for_skipping_replacements,
+        'localized_placeholders': placeholders_for_localized_replacement,
+        'format_type': format_type,
+        'case_insensitive': bool(rule_data.get(CASE_INSENSITIVE_MATCHING_KEY, False)),
+    })
+    del rule_data
+    rule_loading_rss = (process_rss_bytes() or 0) - baseline_rss
+
+    with ProcessTreeRssSampler() as sampler:
+        convert(text, rules, num_processes)
+    worker_peaks = dict(sampler.worker_peak_bytes)
+    suggested_processes = limit_worker_count(
+        num_processes,
+        memory_budget_bytes,
+        rules['final'], rules['2char'], rules['localized'],
+        per_worker_bytes=max(worker_peaks.values()) if worker_peaks else None
+    )
+
+    # tracemalloc 会使 RSS 增大，所以放在 RSS 测量之后，另读一次规则文件
+    tracemalloc.start()
+    try:
+        traced_rule_data = load_rule_file(rule_file_path)
+        traced_rules = prepare({
+            'final': traced_rule_data[REPLACEMENTS_FINAL_LIST_KEY],
+            '2char': traced_rule_data[REPLACEMENTS_LIST_FOR_2CHAR_KEY],
+            'localized': traced_rule_data[REPLACEMENTS_LIST_FOR_LOCALIZED_STRING_KEY],
+        })
+        del traced_rule_data
+        rule_loading_traced, rule_loading_peak_traced = tracemalloc.get_traced_memory()
+        del traced_rules
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'engine': engine,
+        'processes': num_processes,
+        'text_chars': len(text),
+        'baseline_rss_bytes': baseline_rss,
+        'rule_loading_rss_bytes': rule_loading_rss,
+        'rule_loading_traced_bytes': rule_loading_traced,
+        'rule_loading_peak_traced_bytes': rule_loading_peak_traced,
+        'worker_peak_rss_bytes': worker_peaks,
+        'parent_peak_rss_bytes': sampler.parent_peak_bytes,
+        'total_peak_rss_bytes': sampler.total_peak_bytes,
+        'memory_budget_bytes': memory_budget_bytes,
+        'within_budget': sampler.total_peak_bytes <= memory_budget_bytes,
+        'suggested_processes': suggested_processes,
+    }
+
+# ================================
+# 7) 命令行入口
+# ================================
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    例：python esp_benchmark_module.py --rule-counts 10000 100000 --engines standard vocabulary --processes 4
+        python esp_benchmark_module.py --memory --processes 4 --memory-budget-mb 1024（超过预算时返回 1）
+    """
+    parser = argparse.ArgumentParser(description="测量替换引擎的吞吐量随规则条数的变化（CSV + SVG 图表），或测量内存占用")
+    parser.add_argument('--rules', default=DEFAULT_RULE_FILE_PATH, help="替换用 JSON（合并3个JSON文件，也可为 .json.gz / .json.zst）")
+    parser.add_argument('--text', default=DEFAULT_TEXT_PATH, help="用于转换的世界语文本")
+    parser.add_argument('--text-chars', type=int, default=DEFAULT_BENCHMARK_TEXT_CHARS, help="只使用文本的前 N 个字（0 表示全部）")
+    parser.add_argument('--format-type', default='HTML格式', help="输出格式（应与规则文件的格式一致）")
+    parser.add_argument('--rule-counts', type=int, nargs='+', default=DEFAULT_BENCHMARK_RULE_COUNTS, help="全域替换规则的条数")
+    parser.add_argument('--engines', nargs='+', choices=list(BENCHMARK_ENGINES), default=list(BENCHMARK_ENGINES), help="参与比较的引擎")
+    parser.add_argument('--processes', type=int, default=DEFAULT_BENCHMARK_PROCESSES, help="并行模式的进程数（1 表示只测串行）")
+    parser.add_argument('--repeat', type=int, default=1, help="每项重复次数（取最短时间）")
+    parser.add_argument('--no-memory', action='store_true', help="不用 tracemalloc 测量峰值内存（节省时间）")
+    parser.add_argument('--seed', type=int, default=0, help="抽样规则时的随机种子")
+    parser.add_argument('--csv-output', default=DEFAULT_BENCHMARK_CSV_PATH, help="结果 CSV")
+    parser.add_argument('--chart-output', default=DEFAULT_BENCHMARK_CHART_PATH, help="结果图表（SVG）")
+    parser.add_argument('--skip-placeholders', default=DEFAULT_PLACEHOLDERS_FOR_SKIPPING_PATH, help="%...% 跳过替换用占位符文件")
+    parser.add_argument('--localized-placeholders', default=DEFAULT_PLACEHOLDERS_FOR_LOCALIZED_PATH, help="@...@ 局部替换用占位符文件")
+    parser.add_argument('--memory', action='store_true', help="测量内存（读取规则、各子进程、转换期间的峰值）而不是吞吐量")
+    parser.add_argument('--memory-engine', choices=list(BENCHMARK_ENGINES), default='standard', help="--memory 时使用的引擎")
+    parser.add_argument('--memory-budget-mb', type=float, default=DEFAULT_MEMORY_BUDGET_BYTES / (1 << 20),
+                        help="内存预算（MB）；--memory 时峰值超过预算则返回 1")
+    parser.add_argument('--start-method', choices=['spawn', 'fork', 'forkserver'], default='spawn',
+                        help="子进程的启动方式（默认与 main.py 相同的 spawn）")
+    args = parser.parse_args(argv)
+    multiprocessing.set_start_method(args.start_method, force=True)
+
+    with open(args.text, 'r', encoding='utf-8') as f:
+        text = f.read()
+    if args.text_chars > 0:
+        text = text[:args.text_chars]
+
+    if args.memory:
+        report = run_memory_benchmark(
+            args.rules,
+            text,
+            import_placeholders(args.skip_placeholders),
+            import_placeholders(args.localized_placeholders),
+            args.format_type,
+            num_processes=args.processes,
+            memory_budget_bytes=int(args.memory_budget_mb * (1 << 20)),
+            engine=args.memory_engine
+        )
+        mb = lambda n: f"{n / (1 << 20):,.1f} MB"
+        print(f"读取规则：RSS +{mb(report['rule_loading_rss_bytes'])}（tracemalloc {mb(report['rule_loading_traced_bytes'])}，"
+              f"峰值 {mb(report['rule_loading_peak_traced_bytes'])}；读取前 RSS {mb(report['baseline_rss_bytes'])}）")
+        for pid, peak_bytes in sorted(report['worker_peak_rss_bytes'].items()):
+            print(f"子进程 {pid}：RSS 峰值 {mb(peak_bytes)}")
+        print(f"转换期间：主进程 RSS 峰值 {mb(report['parent_peak_rss_bytes'])}，主进程 + 子进程 {mb(report['total_peak_rss_bytes'])}"
+              f"（预算 {mb(report['memory_budget_bytes'])}）")
+        print(f"按实测内存，预算内可用的进程数：{report['suggested_processes']}")
+        if not report['within_budget']:
+            print("超过内存预算")
+            return 1
+        return 0
+
+    rule_data = load_rule_file(args.rules)
+
+    def print_row(row: Dict) -> None:
+        print(f"{row['rule_count']:>9,} 条（{row['rule_source']}） {row['engine']:<12} {row['mode']:<8} "
+              f"{row['seconds']:>9.3f} 秒 {row['chars_per_second']:>12,.0f} 字/秒"
+              f"{'' if row['matches_standard'] else '  [结果与 standard 不同]'}")
+
+    rows = run_throughput_benchmark(
+        rule_data,
+        text,
+        import_placeholders(args.skip_placeholders),
+        import_placeholders(args.localized_placeholders),
+        args.format_type,
+        rule_counts=args.rule_counts,
+        engines=args.engines,
+        num_processes=args.processes,
+        repeat=args.repeat,
+        trace_memory=not args.no_memory,
+        seed=args.seed,
+        progress=print_row
+    )
+    for path in (args.csv_output, args.chart_output):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_benchmark_csv(rows, args.csv_output)
+    write_benchmark_chart_svg(rows, args.chart_output)
+    print(f"已生成 {args.csv_output}、{args.chart_output}")
+    return 0 if all(row['matches_standard'] for row in rows) else 1
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
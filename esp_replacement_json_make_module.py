@@ -5,19 +5,47 @@ esp_replacement_json_make_module.py
 包括：
 - 字符转换函数（convert_to_circumflex）
 - output_format(...)：根据用户选择的输出类型，构建 <ruby> 结构 或 括号结构
-- capitalize_ruby_and_rt(...)：在 HTML ruby 中将首字母大写
+- capitalize_ruby_and_rt(...)：在 HTML ruby 中将首字母大写（定义在 esp_text_replacement_module.py，构建与运行时共用）
 - 并行替换相关函数（process_chunk_for_pre_replacements, parallel_build_pre_replacements_dict）
 - remove_redundant_ruby_if_identical(...)：如果 <ruby>文本 与 <rt>文本 完全相同，则去除重复
+- build_replacements_json(...)：构建“合并3个JSON文件”替换规则的完整流程（原先写在 JSON 生成页面中）
+- build_replacements_json_cached(...)：带磁盘缓存的版本（输入内容不变时直接返回上次的结果）
+- write_replacements_json(...)：逐条规则流式写出 JSON（可选紧凑格式、gzip / zstd 压缩）
+- render_format_independent_rules(...)：由格式无关的规则文件（FORMAT_INDEPENDENT_TYPE）生成指定格式的规则
+- 命令行入口：python esp_replacement_json_make_module.py --help
 
 它与 esp_text_replacement_module.py 有所重叠/交叉，一部分函数实现思路类似，但为保持独立性可能重复定义。
 """
 
 import re
+import sys
+import copy
 import json
+import hashlib
+import time
+import argparse
 import multiprocessing
+import numpy as np
 import pandas as pd
 import os
-from typing import List, Dict, Tuple, Optional
+import io
+import gzip
+from io import StringIO
+from typing import List, Dict, Tuple, Optional, Callable, Iterator
+
+# zstd 输出为可选功能（pip install zstandard）
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from esp_text_replacement_module import (
+    capitalize_ruby_and_rt,
+    is_case_insensitive_rule,
+    BOUNDARY_WORD_START,
+    BOUNDARY_WORD_END,
+    BOUNDARY_STANDALONE
+)
 
 # ================================
 # 1) 世界语字符转换用的字典
@@ -59,56 +87,127 @@ def convert_to_circumflex(text: str) -> str:
 # ================================
 # 3) 文字宽度测量 & <br> 插入
 # ================================
+# 文字宽度表：把 {char: width(px)} 转成按码位索引的 65536 项 NumPy 数组（BMP 以外、表中没有的字符宽度为 8），
+# 之后整段文字的宽度、累计宽度都用数组运算求出，不再逐字查 dict。
+CHAR_WIDTH_TABLE_SIZE = 0x10000
+DEFAULT_CHAR_WIDTH = 8
+_char_width_table_cache = {}
+
+# 紧凑的二进制宽度表：BMP 每个码位 1 字节（uint8，共 64KB），由 JSON 版转换而来。
+# 读取时用 np.memmap 映射，不必解析 6 万多个键的 JSON、也不在内存中保留大量 Python 对象。
+DEFAULT_CHAR_WIDTHS_BIN_PATH = './Appの运行に使用する各类文件/Unicode_BMP全范围文字幅(宽)_Arial16.bin'
+_char_width_table_memmaps = {}
+
+def convert_char_widths_json_to_binary(json_path: str, bin_path: str):
+    """
+    把 {char: width(px)} 形式的 JSON 宽度表转换为二进制宽度表（码位 0~65535 各 1 字节，缺少的字符为 8）。
+    """
+    with open(json_path, 'r', encoding='utf-8') as fp:
+        char_widths_dict = json.load(fp)
+    width_table = char_widths_dict_to_table(char_widths_dict)
+    if width_table.min() < 0 or width_table.max() > 0xFF:
+        raise ValueError("文字宽度超出 uint8 的范围(0~255)，无法保存为二进制宽度表")
+    tmp_path = bin_path + '.tmp'
+    width_table.astype(np.uint8).tofile(tmp_path)
+    os.replace(tmp_path, bin_path)
+
+def load_char_width_table(bin_path: str = DEFAULT_CHAR_WIDTHS_BIN_PATH) -> np.ndarray:
+    """
+    以只读 memmap 方式加载二进制宽度表（每个路径只映射一次）。
+    返回的数组可以代替 char_widths_dict 传给本模块的宽度相关函数和 output_format。
+    """
+    width_table = _char_width_table_memmaps.get(bin_path)
+    if width_table is None:
+        width_table = np.memmap(bin_path, dtype=np.uint8, mode='r')
+        if width_table.shape[0] != CHAR_WIDTH_TABLE_SIZE:
+            raise ValueError(f"二进制宽度表的大小应为 {CHAR_WIDTH_TABLE_SIZE} 字节: {bin_path}")
+        _char_width_table_memmaps[bin_path] = width_table
+    return width_table
+
+def get_char_width_table(char_widths_dict) -> np.ndarray:
+    """
+    由 char_widths_dict 生成（并缓存）按码位索引的宽度表。
+    如果传入的已经是宽度表数组（例如 load_char_width_table 的结果），直接返回。
+    """
+    if isinstance(char_widths_dict, np.ndarray):
+        return char_widths_dict
+    cached = _char_width_table_cache.get(id(char_widths_dict))
+    if cached is not None and cached[0] is char_widths_dict:
+        return cached[1]
+    width_table = char_widths_dict_to_table(char_widths_dict)
+    _char_width_table_cache[id(char_widths_dict)] = (char_widths_dict, width_table)
+    return width_table
+
+def char_widths_dict_to_table(char_widths_dict: Dict[str, int]) -> np.ndarray:
+    """
+    {char: width(px)} → 按码位索引的 int32 宽度表（不缓存）。
+    """
+    width_table = np.full(CHAR_WIDTH_TABLE_SIZE, DEFAULT_CHAR_WIDTH, dtype=np.int32)
+    code_points = np.fromiter((ord(ch) for ch in char_widths_dict), dtype=np.int64, count=len(char_widths_dict))
+    widths = np.fromiter(char_widths_dict.values(), dtype=np.int32, count=len(char_widths_dict))
+    in_bmp = code_points < CHAR_WIDTH_TABLE_SIZE
+    width_table[code_points[in_bmp]] = widths[in_bmp]
+    return width_table
+
+def text_char_widths(text: str, width_table: np.ndarray) -> np.ndarray:
+    """
+    返回 text 中每个字符的宽度数组。
+    """
+    code_points = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    widths = width_table[code_points & 0xFFFF]
+    if code_points.size and code_points.max() >= CHAR_WIDTH_TABLE_SIZE:
+        widths = np.where(code_points < CHAR_WIDTH_TABLE_SIZE, widths, DEFAULT_CHAR_WIDTH)
+    return widths
+
 def measure_text_width_Arial16(text, char_widths_dict: Dict[str, int]) -> int:
     """
     利用从 JSON 中加载的 {char: width(px)}，计算 text 的总宽度像素值。
     如果 char 不在字典中，默认宽度 8。
     """
-    total_width = 0
-    for ch in text:
-        char_width = char_widths_dict.get(ch, 8)
-        total_width += char_width
-    return total_width
+    return int(text_char_widths(text, get_char_width_table(char_widths_dict)).sum())
+
+def measure_text_widths_Arial16(texts: List[str], char_widths_dict: Dict[str, int]) -> List[int]:
+    """
+    一次测量多段文字的宽度：把所有文字连在一起查表，再按各段的起点用 np.add.reduceat 分段求和。
+    """
+    if not texts:
+        return []
+    widths = text_char_widths(''.join(texts), get_char_width_table(char_widths_dict)).astype(np.int64)
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    # reduceat 遇到空字符串（起点等于下一段起点）时会返回该位置的单个值，因此单独置 0
+    totals = np.add.reduceat(np.append(widths, 0), starts) if widths.size else np.zeros(len(texts), dtype=np.int64)
+    totals[lengths == 0] = 0
+    return totals.tolist()
 
 def insert_br_at_half_width(text, char_widths_dict: Dict[str, int]) -> str:
     """
     测量 text 的宽度，找到中点位置附近，插入一个 <br>。
+    （累计宽度首次达到总宽度一半的字符之后）
     """
-    total_width = measure_text_width_Arial16(text, char_widths_dict)
-    half_width = total_width / 2
-    current_width = 0
-    insert_index = None
-    for i, ch in enumerate(text):
-        char_width = char_widths_dict.get(ch, 8)
-        current_width += char_width
-        if current_width >= half_width:
-            insert_index = i + 1
-            break
-    if insert_index is not None:
-        result = text[:insert_index] + "<br>" + text[insert_index:]
-    else:
-        result = text
-    return result
+    if not text:
+        return text
+    cumulative_widths = np.cumsum(text_char_widths(text, get_char_width_table(char_widths_dict)))
+    half_width = cumulative_widths[-1] / 2
+    insert_index = int(np.searchsorted(cumulative_widths, half_width, side='left')) + 1
+    return text[:insert_index] + "<br>" + text[insert_index:]
 
 def insert_br_at_third_width(text, char_widths_dict: Dict[str, int]) -> str:
     """
     把 total_width / 3, 2/3 的位置各插一个 <br>，即插两处。
+    （第二处从第一处之后的字符开始找；找不到时只插一处）
     """
-    total_width = measure_text_width_Arial16(text, char_widths_dict)
-    third_width = total_width / 3
-    thresholds = [third_width, third_width * 2]
-    current_width = 0
+    if not text:
+        return text
+    cumulative_widths = np.cumsum(text_char_widths(text, get_char_width_table(char_widths_dict)))
+    third_width = cumulative_widths[-1] / 3
     insert_indices = []
-    found_first = False
-    for i, ch in enumerate(text):
-        char_width = char_widths_dict.get(ch, 8)
-        current_width += char_width
-        if not found_first and current_width >= thresholds[0]:
-            insert_indices.append(i + 1)
-            found_first = True
-        elif found_first and current_width >= thresholds[1]:
-            insert_indices.append(i + 1)
-            break
+    first_index = int(np.searchsorted(cumulative_widths, third_width, side='left'))
+    if first_index < len(text):
+        insert_indices.append(first_index + 1)
+        second_index = first_index + 1 + int(np.searchsorted(cumulative_widths[first_index + 1:], third_width * 2, side='left'))
+        if second_index < len(text):
+            insert_indices.append(second_index + 1)
     result = text
     for idx in reversed(insert_indices):
         result = result[:idx] + "<br>" + result[idx:]
@@ -117,15 +216,19 @@ def insert_br_at_third_width(text, char_widths_dict: Dict[str, int]) -> str:
 # ================================
 # 4) output_format(...) 函数
 # ================================
-def output_format(main_text, ruby_content, format_type, char_widths_dict):
+def output_format(main_text, ruby_content, format_type, char_widths_dict, width_main=None, width_ruby=None):
     """
     根据用户选择的 format_type，不同方式组合 main_text 和 ruby_content。
     可能是 <ruby>main<rt>ruby</rt></ruby>，也可能是“main(ruby)”等。
     并对过长的 ruby 或 main_text 做 <br> 插入。
+    width_main / width_ruby 可传入已测量的宽度（output_format_batch 批量测量时使用）。
     """
+    if format_type in ('HTML格式_Ruby文字_大小调整', 'HTML格式_Ruby文字_大小调整_汉字替换'):
+        if width_ruby is None:
+            width_ruby = measure_text_width_Arial16(ruby_content, char_widths_dict)
+        if width_main is None:
+            width_main = measure_text_width_Arial16(main_text, char_widths_dict)
     if format_type == 'HTML格式_Ruby文字_大小调整':
-        width_ruby = measure_text_width_Arial16(ruby_content, char_widths_dict)
-        width_main = measure_text_width_Arial16(main_text, char_widths_dict)
         ratio_1 = width_ruby / width_main
         if ratio_1 > 6:
             return f'<ruby>{main_text}<rt class="XXXS_S">{insert_br_at_third_width(ruby_content, char_widths_dict)}</rt></ruby>'
@@ -144,8 +247,6 @@ def output_format(main_text, ruby_content, format_type, char_widths_dict):
         else:
             return f'<ruby>{main_text}<rt class="XXL_L">{ruby_content}</rt></ruby>'
     elif format_type == 'HTML格式_Ruby文字_大小调整_汉字替换':
-        width_ruby = measure_text_width_Arial16(ruby_content, char_widths_dict)
-        width_main = measure_text_width_Arial16(main_text, char_widths_dict)
         ratio_2 = width_main / width_ruby
         if ratio_2 > 6:
             return f'<ruby>{ruby_content}<rt class="XXXS_S">{insert_br_at_third_width(main_text, char_widths_dict)}</rt></ruby>'
@@ -174,6 +275,86 @@ def output_format(main_text, ruby_content, format_type, char_widths_dict):
     elif format_type == '替换后文字列のみ(仅)保留(简单替换)':
         return f'{ruby_content}'
 
+def output_format_batch(main_texts: List[str], ruby_contents: List[str], format_type: str, char_widths_dict: Dict[str, int]) -> List[str]:
+    """
+    对多组 (main_text, ruby_content) 一次性执行 output_format，返回同顺序的列表。
+    需要按文字宽度调整 ruby 大小的格式，先用 measure_text_widths_Arial16 批量测量全部宽度。
+    """
+    if format_type in ('HTML格式_Ruby文字_大小调整', 'HTML格式_Ruby文字_大小调整_汉字替换'):
+        widths_main = measure_text_widths_Arial16(main_texts, char_widths_dict)
+        widths_ruby = measure_text_widths_Arial16(ruby_contents, char_widths_dict)
+        return [output_format(main_text, ruby_content, format_type, char_widths_dict, width_main, width_ruby)
+                for main_text, ruby_content, width_main, width_ruby
+                in zip(main_texts, ruby_contents, widths_main, widths_ruby)]
+    return [output_format(main_text, ruby_content, format_type, char_widths_dict)
+            for main_text, ruby_content in zip(main_texts, ruby_contents)]
+
+# 格式无关规则中的词根片段标记：第 N 个 (词根, 翻译) 片段用一个补充私用区字符表示，
+# 词根分解、加词尾、去掉 '/' 等字符串操作都不会影响它，加载时再用 str.translate 换成指定格式的文字。
+SEGMENT_MARKER_RANGES = ((0xF0000, 0xFFFFE), (0x100000, 0x10FFFE))
+
+def format_independent_segment_marker(segment_id: int) -> str:
+    for start, end in SEGMENT_MARKER_RANGES:
+        if segment_id < end - start:
+            return chr(start + segment_id)
+        segment_id -= end - start
+    raise ValueError("词根片段数量超出标记字符的范围")
+
+def new_format_independent_segment_registry() -> Dict:
+    """
+    片段登记表：'ids' 为 {(词根, 翻译, 是否去掉'/'): 片段序号}，'segments' 为按序号排列的 [词根, 翻译, 是否去掉'/']。
+    """
+    return {'ids': {}, 'segments': []}
+
+def register_format_independent_segments(
+    segment_registry: Dict,
+    main_texts: List[str],
+    ruby_contents: List[str],
+    remove_separators: bool = False
+) -> List[str]:
+    """
+    登记 (main_text, ruby_content) 片段（相同的片段只登记一次），返回对应的片段标记。
+    remove_separators=True 的片段在加载时生成文字后再执行 remove_root_separators
+    （直接构建时词根 trie 的替换结果都会经过 remove_root_separators，标记则不受其影响）。
+    """
+    segment_ids = segment_registry['ids']
+    segments = segment_registry['segments']
+    markers = []
+    for main_text, ruby_content in zip(main_texts, ruby_contents):
+        key = (main_text, ruby_content, remove_separators and ('/' in main_text or '/' in ruby_content))
+        segment_id = segment_ids.get(key)
+        if segment_id is None:
+            segment_id = segment_ids[key] = len(segments)
+            segments.append(key)
+        markers.append(format_independent_segment_marker(segment_id))
+    return markers
+
+def finish_format_independent_segments(segment_registry: Dict, char_widths_dict) -> List[List]:
+    """
+    返回 [[词根, 翻译, 词根宽度, 翻译宽度, 是否去掉'/'], ...]。宽度预先测量好，加载时调整 ruby 大小不必再测量。
+    """
+    segments = segment_registry['segments']
+    widths_main = measure_text_widths_Arial16([segment[0] for segment in segments], char_widths_dict)
+    widths_ruby = measure_text_widths_Arial16([segment[1] for segment in segments], char_widths_dict)
+    return [[main_text, ruby_content, width_main, width_ruby, int(remove_separators)]
+            for (main_text, ruby_content, remove_separators), width_main, width_ruby in zip(segments, widths_main, widths_ruby)]
+
+def render_root_pairs(
+    main_texts: List[str],
+    ruby_contents: List[str],
+    format_type: str,
+    char_widths_dict,
+    segment_registry: Optional[Dict] = None,
+    remove_separators: bool = False
+) -> List[str]:
+    """
+    构建时生成词根的替换后文字：通常为 output_format_batch 的结果；
+    构建格式无关的规则文件（segment_registry 不为 None）时为片段标记。
+    """
+    if segment_registry is not None:
+        return register_format_independent_segments(segment_registry, main_texts, ruby_contents, remove_separators)
+    return output_format_batch(main_texts, ruby_contents, format_type, char_widths_dict)
+
 # ================================
 # 5) 其他辅助函数
 # ================================
@@ -191,47 +372,6 @@ def import_placeholders(filename: str) -> List[str]:
         placeholders = [line.strip() for line in file if line.strip()]
     return placeholders
 
-# -------------------------------
-# capitalize_ruby_and_rt(...)
-# -------------------------------
-RUBY_PATTERN = re.compile(
-    r'^'
-    r'(.*?)'
-    r'(<ruby>)'
-    r'([^<]+)'
-    r'(<rt[^>]*>)'
-    r'([^<]*?(?:<br>[^<]*?){0,2})'
-    r'(</rt>)'
-    r'(</ruby>)?'
-    r'(.*)'
-    r'$'
-)
-def capitalize_ruby_and_rt(text: str) -> str:
-    """
-    当需要把 <ruby>xxx<rt>yyy</rt></ruby> 中的 xxx 或 yyy 首字母大写时使用。
-    实际逻辑是先匹配，然后尝试做大写化。若没匹配到，就把整段做 text.capitalize()。
-    """
-    def replacer(match):
-        g1 = match.group(1)
-        g2 = match.group(2)
-        g3 = match.group(3)
-        g4 = match.group(4)
-        g5 = match.group(5)
-        g6 = match.group(6)
-        g7 = match.group(7)
-        g8 = match.group(8)
-        if g1.strip():
-            return g1.capitalize() + g2 + g3 + g4 + g5 + g6 + (g7 if g7 else '') + g8
-        else:
-            parent_text = g3.capitalize()
-            rt_text = g5.capitalize()
-            return g1 + g2 + parent_text + g4 + rt_text + g6 + (g7 if g7 else '') + g8
-
-    replaced_text = RUBY_PATTERN.sub(replacer, text)
-    if replaced_text == text:
-        replaced_text = text.capitalize()
-    return replaced_text
-
 # ================================
 # 6) 并行处理：用在创建 JSON 过程
 # ================================
@@ -245,13 +385,86 @@ def safe_replace(text: str, replacements: List[Tuple[str, str, str]]) -> str:
         text = text.replace(placeholder, new)
     return text
 
-def process_chunk_for_pre_replacements(
+# -------------------------------
+# 基于 trie 的词根分解（safe_replace 的高速版）
+# -------------------------------
+# safe_replace(stem, 词根列表) 对每个 stem 都要把约 11k 个词根逐一做 "old in text"，
+# 对约 44k 个 stem 来说就是约 5 亿次子串检查。
+# 这里先把词根列表建成 trie，每个 stem 只需沿 trie 走一遍（时间与 stem 长度成正比）。
+# 结果与 safe_replace 完全相同：按列表顺序（即优先级顺序）依次占用尚未被占用的位置，
+# 同一词根在 stem 中出现多次时，从左到右、互不重叠地替换。
+# （前提：词根 old 中不含 placeholder 用的字符 '$' 和数字，实际数据满足这一点）
+TRIE_END = ''
+
+def build_root_trie(replacements: List[Tuple[str, str, str]]) -> Dict:
+    """
+    由 (old, new, placeholder) 列表构建 trie（嵌套 dict）。
+    叶子处 TRIE_END 键保存 (列表中的序号, new)，序号越小优先级越高。
+    同一个 old 出现多次时，与 safe_replace 一样只有第一次有效。
+    """
+    trie = {}
+    for rank, (old, new, _placeholder) in enumerate(replacements):
+        if not old:
+            continue
+        node = trie
+        for ch in old:
+            node = node.setdefault(ch, {})
+        node.setdefault(TRIE_END, (rank, new))
+    return trie
+
+def trie_find_root_spans(text: str, trie: Dict) -> List[Tuple[int, int, str]]:
+    """
+    返回 trie_safe_replace 实际采用的词根位置 [(start, end, new), ...]（按 start 升序）。
+    """
+    n = len(text)
+    candidates = []
+    for i in range(n):
+        node = trie
+        for j in range(i, n):
+            node = node.get(text[j])
+            if node is None:
+                break
+            entry = node.get(TRIE_END)
+            if entry is not None:
+                candidates.append((entry[0], i, j + 1, entry[1]))
+    if not candidates:
+        return []
+
+    candidates.sort()
+    occupied = bytearray(n)
+    chosen = []
+    for _rank, start, end, new in candidates:
+        if any(occupied[start:end]):
+            continue
+        occupied[start:end] = b'\x01' * (end - start)
+        chosen.append((start, end, new))
+    chosen.sort()
+    return chosen
+
+def trie_safe_replace(text: str, trie: Dict) -> str:
+    """
+    与 safe_replace(text, replacements) 结果相同，但使用 build_root_trie 生成的 trie。
+    """
+    chosen = trie_find_root_spans(text, trie)
+    if not chosen:
+        return text
+
+    pieces = []
+    last_end = 0
+    for start, end, new in chosen:
+        pieces.append(text[last_end:start])
+        pieces.append(new)
+        last_end = end
+    pieces.append(text[last_end:])
+    return ''.join(pieces)
+
+def segment_stems_with_trie(
     chunk: List[List[str]],
-    replacements: List[Tuple[str, str, str]]
-) -> Dict[str, List[str]]:
+    trie: Dict
+) -> Dict[str, List]:
     """
-    针对 chunk（类似 [ [词根, 词性], ... ]）中的每个词根，执行 safe_replace。
-    返回 { 词根: [ 替换后字符串, 合并词性 ], ... }。
+    对 chunk（类似 [ [词根, 词性], ... ]）中的每个词根执行 trie_safe_replace。
+    返回 { 词根: [ 替换后字符串, 词性的有序集合(dict) ] }，同一词根的词性按出现顺序去重累积。
     """
     local_dict = {}
     for item in chunk:
@@ -260,63 +473,83 @@ def process_chunk_for_pre_replacements(
         E_root, pos_info = item
         if len(E_root) < 2:
             continue
-        if E_root in local_dict:
-            replaced_stem, existing_pos_str = local_dict[E_root]
-            existing_pos_list = existing_pos_str.split(',')
-            if pos_info not in existing_pos_list:
-                existing_pos_list.append(pos_info)
-                merged_pos_str = ",".join(existing_pos_list)
-                local_dict[E_root] = [replaced_stem, merged_pos_str]
+        entry = local_dict.get(E_root)
+        if entry is None:
+            local_dict[E_root] = [trie_safe_replace(E_root, trie), {pos_info: None}]
         else:
-            replaced = safe_replace(E_root, replacements)
-            local_dict[E_root] = [replaced, pos_info]
+            entry[1][pos_info] = None
     return local_dict
 
+def process_chunk_for_pre_replacements(
+    chunk: List[List[str]],
+    replacements: List[Tuple[str, str, str]]
+) -> Dict[str, List[str]]:
+    """
+    针对 chunk（类似 [ [词根, 词性], ... ]）中的每个词根，执行 safe_replace（trie 版）。
+    返回 { 词根: [ 替换后字符串, 合并词性 ], ... }。
+    """
+    trie = build_root_trie(replacements)
+    return {
+        E_root: [replaced_stem, ','.join(pos_set)]
+        for E_root, (replaced_stem, pos_set) in segment_stems_with_trie(chunk, trie).items()
+    }
+
+# 并行处理时，每个任务只处理一小块（而不是把列表平均切成 num_processes 块），
+# 用 imap_unordered 动态分配，哪个进程先空下来就先领下一块，同时可以按块报告进度。
+PRE_REPLACEMENTS_CHUNK_SIZE = 1000
+
+# 各 worker 进程中的词根 trie（由 init_pre_replacements_worker 在进程启动时构建一次，
+# 之后的任务只传 stem 块，不再每次传送约 2 万条的词根列表）
+_worker_root_trie = None
+
+def init_pre_replacements_worker(replacements: List[Tuple[str, str, str]]):
+    global _worker_root_trie
+    _worker_root_trie = build_root_trie(replacements)
+
+def process_indexed_chunk_in_worker(indexed_chunk: Tuple[int, List[List[str]]]) -> Tuple[int, int, Dict[str, List]]:
+    chunk_index, chunk = indexed_chunk
+    return chunk_index, len(chunk), segment_stems_with_trie(chunk, _worker_root_trie)
+
 def parallel_build_pre_replacements_dict(
     E_stem_with_Part_Of_Speech_list: List[List[str]],
     replacements: List[Tuple[str, str, str]],
-    num_processes: int = 4
+    num_processes: int = 4,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    chunk_size: int = PRE_REPLACEMENTS_CHUNK_SIZE
 ) -> Dict[str, List[str]]:
     """
-    把 E_stem_with_Part_Of_Speech_list 切成若干块并行处理，再合并。
+    把 E_stem_with_Part_Of_Speech_list 切成许多小块，由 num_processes 个进程动态领取处理，再合并。
+    每完成一块调用一次 progress_callback(已处理数, 总数)。
+    合并按块的原始顺序进行，词性按出现顺序去重，结果与逐条处理相同。
     返回 { 词根: [ 替换后, 合并词性 ] }。
     """
     total_len = len(E_stem_with_Part_Of_Speech_list)
     if total_len == 0:
         return {}
 
-    chunk_size = -(-total_len // num_processes)
-    chunks = []
-    start_index = 0
-    for _ in range(num_processes):
-        end_index = min(start_index + chunk_size, total_len)
-        chunk = E_stem_with_Part_Of_Speech_list[start_index:end_index]
-        chunks.append(chunk)
-        start_index = end_index
-        if start_index >= total_len:
-            break
-
-    with multiprocessing.Pool(num_processes) as pool:
-        partial_dicts = pool.starmap(
-            process_chunk_for_pre_replacements,
-            [(chunk, replacements) for chunk in chunks]
-        )
+    indexed_chunks = [
+        (chunk_index, E_stem_with_Part_Of_Speech_list[start_index:start_index + chunk_size])
+        for chunk_index, start_index in enumerate(range(0, total_len, chunk_size))
+    ]
+    partial_dicts = [None] * len(indexed_chunks)
+    processed_count = 0
+    with multiprocessing.Pool(num_processes, initializer=init_pre_replacements_worker, initargs=(replacements,)) as pool:
+        for chunk_index, chunk_len, partial_d in pool.imap_unordered(process_indexed_chunk_in_worker, indexed_chunks):
+            partial_dicts[chunk_index] = partial_d
+            processed_count += chunk_len
+            if progress_callback is not None:
+                progress_callback(processed_count, total_len)
 
     merged_dict = {}
     for partial_d in partial_dicts:
-        for E_root, val in partial_d.items():
-            replaced_stem, pos_str = val
-            if E_root not in merged_dict:
-                merged_dict[E_root] = [replaced_stem, pos_str]
+        for E_root, (replaced_stem, pos_set) in partial_d.items():
+            entry = merged_dict.get(E_root)
+            if entry is None:
+                merged_dict[E_root] = [replaced_stem, pos_set]
             else:
-                existing_replaced_stem, existing_pos_str = merged_dict[E_root]
-                existing_pos_list = existing_pos_str.split(',')
-                new_pos_list = pos_str.split(',')
-                pos_merged = list(set(existing_pos_list) | set(new_pos_list))
-                pos_merged_str = ",".join(sorted(pos_merged))
-                merged_dict[E_root] = [existing_replaced_stem, pos_merged_str]
+                entry[1].update(pos_set)
 
-    return merged_dict
+    return {E_root: [replaced_stem, ','.join(pos_set)] for E_root, (replaced_stem, pos_set) in merged_dict.items()}
 
 # -------------------------------
 # remove_redundant_ruby_if_identical
@@ -335,3 +568,1803 @@ def remove_redundant_ruby_if_identical(text: str) -> str:
             return match.group(0)
     replaced_text = IDENTICAL_RUBY_PATTERN.sub(replacer, text)
     return replaced_text
+
+# ================================
+# 7) 构建 JSON 时使用的后缀/词根数据
+# ================================
+# 以下是关于动词后缀(活用)以及若干特殊后缀(例如 an, on) 的变量定义。
+# 这些数据会在生成 JSON 的流程中被使用，用来给特定单词自动添加后缀。
+
+# 动词活用词尾 (as, is, os, us 等)
+verb_suffix_2l = {
+    'as':'as', 'is':'is', 'os':'os', 'us':'us','at':'at','it':'it','ot':'ot',
+    'ad':'ad','iĝ':'iĝ','ig':'ig','ant':'ant','int':'int','ont':'ont'
+}
+
+# 例如 an, on 这两个列表，用于在处理世界语词根 + 后缀“an”/“on”时，自动拆分或区分不同含义
+AN = [
+    ['dietan', '/diet/an/', '/diet/an'],
+    ['afrikan', '/afrik/an/', '/afrik/an'],
+    ['movadan', '/mov/ad/an/', '/mov/ad/an'],
+    ['akcian', '/akci/an/', '/akci/an'],
+    ['montaran', '/mont/ar/an/', '/mont/ar/an'],
+    ['amerikan', '/amerik/an/', '/amerik/an'],
+    ['regnan', '/regn/an/', '/regn/an'],
+    ['dezertan', '/dezert/an/', '/dezert/an'],
+    ['asocian', '/asoci/an/', '/asoci/an'],
+    ['insulan', '/insul/an/', '/insul/an'],
+    ['azian', '/azi/an/', '/azi/an'],
+    ['ŝtatan', '/ŝtat/an/', '/ŝtat/an'],
+    ['doman', '/dom/an/', '/dom/an'],
+    ['montan', '/mont/an/', '/mont/an'],
+    ['familian', '/famili/an/', '/famili/an'],
+    ['urban', '/urb/an/', '/urb/an'],
+    ['popolan', '/popol/an/', '/popol/an'],
+    ['dekan', '/dekan/', '/dek/an'],
+    ['partian', '/parti/an/', '/parti/an'],
+    ['lokan', '/lok/an/', '/lok/an'],
+    ['ŝipan', '/ŝip/an/', '/ŝip/an'],
+    ['eklezian', '/eklezi/an/', '/eklezi/an'],
+    ['landan', '/land/an/', '/land/an'],
+    ['orientan', '/orient/an/', '/orient/an'],
+    ['lernejan', '/lern/ej/an/', '/lern/ej/an'],
+    ['enlandan', '/en/land/an/', '/en/land/an'],
+    ['kalkan', '/kalkan/', '/kalk/an'],
+    ['estraran', '/estr/ar/an/', '/estr/ar/an'],
+    ['etnan', '/etn/an/', '/etn/an'],
+    ['eŭropan', '/eŭrop/an/', '/eŭrop/an'],
+    ['fazan', '/fazan/', '/faz/an'],
+    ['polican', '/polic/an/', '/polic/an'],
+    ['socian', '/soci/an/', '/soci/an'],
+    ['societan', '/societ/an/', '/societ/an'],
+    ['grupan', '/grup/an/', '/grup/an'],
+    ['ligan', '/lig/an/', '/lig/an'],
+    ['nacian', '/naci/an/', '/naci/an'],
+    ['koran', '/koran/', '/kor/an'],
+    ['religian', '/religi/an/', '/religi/an'],
+    ['kuban', '/kub/an/', '/kub/an'],
+    ['majoran', '/major/an/', '/major/an'],
+    ['nordan', '/nord/an/', '/nord/an'],
+    ['paran', 'paran', '/par/an'],
+    ['parizan', '/pariz/an/', '/pariz/an'],
+    ['parokan', '/parok/an/', '/parok/an'],
+    ['podian', '/podi/an/', '/podi/an'],
+    ['rusian', '/rus/i/an/', '/rus/ian'],
+    ['satan', '/satan/', '/sat/an'],
+    ['sektan', '/sekt/an/', '/sekt/an'],
+    ['senatan', '/senat/an/', '/senat/an'],
+    ['skisman', '/skism/an/', '/skism/an'],
+    ['sudan', 'sudan', '/sud/an'],
+    ['utopian', '/utopi/an/', '/utopi/an'],
+    ['vilaĝan', '/vilaĝ/an/', '/vilaĝ/an'],
+    ['arĝentan', '/arĝent/an/', '/arĝent/an']
+]
+
+ON = [
+    ['duon', '/du/on/', '/du/on'],
+    ['okon', '/ok/on/', '/ok/on'],
+    ['nombron', '/nombr/on/', '/nombr/on'],
+    ['patron', '/patron/', '/patr/on'],
+    ['karbon', '/karbon/', '/karb/on'],
+    ['ciklon', '/ciklon/', '/cikl/on'],
+    ['aldon', '/al/don/', '/ald/on'],
+    ['balon', '/balon/', '/bal/on'],
+    ['baron', '/baron/', '/bar/on'],
+    ['baston', '/baston/', '/bast/on'],
+    ['magneton', '/magnet/on/', '/magnet/on'],
+    ['beton', 'beton', '/bet/on'],
+    ['bombon', '/bombon/', '/bomb/on'],
+    ['breton', 'breton', '/bret/on'],
+    ['burĝon', '/burĝon/', '/burĝ/on'],
+    ['centon', '/cent/on/', '/cent/on'],
+    ['milon', '/mil/on/', '/mil/on'],
+    ['kanton', '/kanton/', '/kant/on'],
+    ['citron', '/citron/', '/citr/on'],
+    ['platon', 'platon', '/plat/on'],
+    ['dekon', '/dek/on/', '/dek/on'],
+    ['kvaron', '/kvar/on/', '/kvar/on'],
+    ['kvinon', '/kvin/on/', '/kvin/on'],
+    ['seson', '/ses/on/', '/ses/on'],
+    ['trion', '/tri/on/', '/tri/on'],
+    ['karton', '/karton/', '/kart/on'],
+    ['foton', '/fot/on/', '/fot/on'],
+    ['peron', '/peron/', '/per/on'],
+    ['elektron', '/elektr/on/', '/elektr/on'],
+    ['drakon', 'drakon', '/drak/on'],
+    ['mondon', '/mon/don/', '/mond/on'],
+    ['pension', '/pension/', '/pensi/on'],
+    ['ordon', '/ordon/', '/ord/on'],
+    ['eskadron', 'eskadron', '/eskadr/on'],
+    ['senton', '/sen/ton/', '/sent/on'],
+    ['eston', 'eston', '/est/on'],
+    ['fanfaron', '/fanfaron/', '/fanfar/on'],
+    ['feston', '/feston/', '/fest/on'],
+    ['flegmon', 'flegmon', '/flegm/on'],
+    ['fronton', '/fronton/', '/front/on'],
+    ['galon', '/galon/', '/gal/on'],
+    ['mason', '/mason/', '/mas/on'],
+    ['helikon', 'helikon', '/helik/on'],
+    ['kanon', '/kanon/', '/kan/on'],
+    ['kapon', '/kapon/', '/kap/on'],
+    ['kokon', '/kokon/', '/kok/on'],
+    ['kolon', '/kolon/', '/kol/on'],
+    ['komision', '/komision/', '/komisi/on'],
+    ['salon', '/salon/', '/sal/on'],
+    ['ponton', '/ponton/', '/pont/on'],
+    ['koton', '/koton/', '/kot/on'],
+    ['kripton', 'kripton', '/kript/on'],
+    ['kupon', '/kupon/', '/kup/on'],
+    ['lakon', 'lakon', '/lak/on'],
+    ['ludon', '/lu/don/', '/lud/on'],
+    ['melon', '/melon/', '/mel/on'],
+    ['menton', '/menton/', '/ment/on'],
+    ['milion', '/milion/', '/mili/on'],
+    ['milionon', '/milion/on/', '/milion/on'],
+    ['naŭon', '/naŭ/on/', '/naŭ/on'],
+    ['violon', '/violon/', '/viol/on'],
+    ['trombon', '/trombon/', '/tromb/on'],
+    ['senson', '/sen/son/', '/sens/on'],
+    ['sepon', '/sep/on/', '/sep/on'],
+    ['skadron', 'skadron', '/skadr/on'],
+    ['stadion', '/stadion/', '/stadi/on'],
+    ['tetraon', 'tetraon', '/tetra/on'],
+    ['timon', '/timon/', '/tim/on'],
+    ['valon', 'valon', '/val/on']
+]
+
+# allowed_values 用于处理 -1 等表示不进行替换的自定义设定
+allowed_values = {-1, "-1", "ー１", "ー1", "-１", "－１", "－1"}
+
+# ---------------------------------------------------------------------
+# 以下三组列表用于处理 2 字母词根 （前缀/后缀/独立词根）
+# ---------------------------------------------------------------------
+suffix_2char_roots = [
+    'ad', 'ag', 'am', 'ar', 'as', 'at', 'av', 'di', 'ec', 'eg', 'ej',
+    'em', 'er', 'et', 'id', 'ig', 'il', 'in', 'ir', 'is', 'it', 'lu',
+    'nj', 'op', 'or', 'os', 'ot', 'ov', 'pi', 'te', 'uj', 'ul', 'um',
+    'us', 'uz','ĝu','aĵ','iĝ','aĉ','aĝ','ŝu','eĥ'
+]
+prefix_2char_roots = [
+    'al', 'am', 'av', 'bo', 'di', 'du', 'ek', 'el', 'en', 'fi', 'ge',
+    'ir', 'lu', 'ne', 'ok', 'or', 'ov', 'pi', 're', 'te', 'uz','ĝu',
+    'aĉ','aĝ','ŝu','eĥ'
+]
+standalone_2char_roots = [
+    'al', 'ci', 'da', 'de', 'di', 'do', 'du', 'el', 'en', 'fi', 'ha',
+    'he', 'ho', 'ia', 'ie', 'io', 'iu', 'ja', 'je', 'ju','ke', 'la',
+    'li', 'mi', 'ne', 'ni', 'nu', 'ok', 'ol', 'po', 'se', 'si', 've',
+    'vi','ŭa','aŭ','ĉe','ĝi','ŝi','ĉu'
+]
+
+# ---------------------------------------------------------------------
+# 品词词尾扩展表（构建流程第 8 步使用）
+# 每条规则：(词性, 词尾组, 新键前缀, 优先级调整, 已存在同名键时的处理)
+#   - 词尾组为元组，或 'verbo_s1'（表示 verb_suffix_2l 的动词活用词尾，替换后文字在构建时求得）
+#   - 新键 = 新键前缀 + 词根 + 词尾，优先级 = 词根优先级 + len(新键前缀 + 词尾)*10000 + 优先级调整
+#   - 已存在同名键（PEJVO 中已有该单词）时：
+#       AFFIX_SKIP_IF_EXISTING      不生成
+#       AFFIX_SAME_IF_EXISTING      照常生成（带前缀）
+#       AFFIX_OVERRIDE_IF_EXISTING  生成不带前缀的键并固定（不再被该单词本身的分解覆盖）
+#       AFFIX_OVERRIDE_IF_DIFFERENT 只有分解结果不同时，才生成不带前缀的键并固定
+# ---------------------------------------------------------------------
+AFFIX_SKIP_IF_EXISTING = 'skip'
+AFFIX_SAME_IF_EXISTING = 'same'
+AFFIX_OVERRIDE_IF_EXISTING = 'override'
+AFFIX_OVERRIDE_IF_DIFFERENT = 'override_if_different'
+AFFIX_VERB_SUFFIXES = 'verbo_s1'
+
+# 2 字母词根（优先级 20000）：名词/形容词/副词的词尾形前加空格，只在词首匹配
+AFFIX_EXPANSION_RULES_2CHAR = [
+    ("名词", ('o', 'on', 'oj'), ' ', -5000, AFFIX_SKIP_IF_EXISTING),
+    ("形容词", ('a', 'aj', 'an'), ' ', -5000, AFFIX_OVERRIDE_IF_EXISTING),
+    ("副词", ('e',), ' ', -5000, AFFIX_SAME_IF_EXISTING),
+    ("动词", AFFIX_VERB_SUFFIXES, '', -3000, AFFIX_OVERRIDE_IF_DIFFERENT),
+    ("动词", ('u ', 'i ', 'u', 'i'), '', -3000, AFFIX_SKIP_IF_EXISTING),
+]
+# 实际替换的 3~6 字母词根（优先级 30000~60000）：新作的词根分解优先
+AFFIX_EXPANSION_RULES_SHORT = [
+    ("名词", ('o', 'on', 'oj'), '', -3000, AFFIX_OVERRIDE_IF_DIFFERENT),
+    ("形容词", ('a', 'aj', 'an'), '', -3000, AFFIX_OVERRIDE_IF_DIFFERENT),
+    ("副词", ('e',), '', -3000, AFFIX_OVERRIDE_IF_DIFFERENT),
+    ("动词", AFFIX_VERB_SUFFIXES, '', -3000, AFFIX_OVERRIDE_IF_DIFFERENT),
+    ("动词", ('u ', 'i ', 'u', 'i'), '', -3000, AFFIX_OVERRIDE_IF_DIFFERENT),
+]
+# 其余 3~6 字母的词（不实际替换的词根等）：只补充最基本的词尾，优先级较低
+AFFIX_EXPANSION_RULES_MEDIUM = [
+    ("名词", ('o',), '', -5000, AFFIX_SKIP_IF_EXISTING),
+    ("形容词", ('a',), '', -5000, AFFIX_SKIP_IF_EXISTING),
+    ("副词", ('e',), '', -5000, AFFIX_SKIP_IF_EXISTING),
+]
+AFFIX_SHORT_ROOT_PRIORITIES = (60000, 50000, 40000, 30000)
+
+# AN / ON 列表中的词：生成 词根+an+o/a/e 以及 把 an 拆成 a+n 的形式
+AN_ON_EXPANSIONS = [('an', AN), ('on', ON)]
+
+# ================================
+# 8) 构建替换用 JSON 的整体流程
+# ================================
+DEFAULT_FILES_DIR = './Appの运行に使用する各类文件'
+DEFAULT_CSV_PATH = DEFAULT_FILES_DIR + '/世界语词根-中文注释对应列表.csv'
+DEFAULT_STEMMING_SETTING_JSON_PATH = DEFAULT_FILES_DIR + '/世界语单词词根分解方法の使用者自定义设置.json'
+DEFAULT_REPLACEMENT_SETTING_JSON_PATH = DEFAULT_FILES_DIR + '/替换后文字列(汉字)の使用者自定义设置(基本上完全不推荐).json'
+DEFAULT_PEJVO_STEM_JSON_PATH = DEFAULT_FILES_DIR + "/PEJVO(世界语全部单词列表)'全部'について、词尾(a,i,u,e,o,n等)をcutし、comma(,)で隔てて词性と併せて记录した列表(E_stem_with_Part_Of_Speech_list).json"
+DEFAULT_ROOT_LIST_PATH = DEFAULT_FILES_DIR + '/世界语全部词根_约11137个_202501.txt'
+DEFAULT_CHAR_WIDTHS_JSON_PATH = DEFAULT_FILES_DIR + '/Unicode_BMP全范围文字幅(宽)_Arial16.json'
+DEFAULT_PLACEHOLDERS_FOR_GLOBAL_REPLACEMENT_PATH = DEFAULT_FILES_DIR + '/占位符(placeholders)_$20987$-$499999$_全域替换用.txt'
+DEFAULT_PLACEHOLDERS_FOR_2CHAR_REPLACEMENT_PATH = DEFAULT_FILES_DIR + '/占位符(placeholders)_$13246$-$19834$_二文字词根替换用.txt'
+DEFAULT_PLACEHOLDERS_FOR_LOCAL_REPLACEMENT_PATH = DEFAULT_FILES_DIR + '/占位符(placeholders)_@20374@-@97648@_局部文字列替换用.txt'
+DEFAULT_BUILD_CACHE_DIR = './.replacement_json_build_cache'
+
+# 随仓库提供的各语言“世界语词根 - 翻译” CSV（批量构建用）
+SHIPPED_ROOT_CSV_PATHS = [
+    DEFAULT_FILES_DIR + '/世界语词根-中文注释对应列表.csv',
+    DEFAULT_FILES_DIR + '/世界语词根-汉字对应列表.csv',
+    DEFAULT_FILES_DIR + '/Mingeo先生版 世界语词根-汉字对应列表.csv',
+    DEFAULT_FILES_DIR + '/エスペラント語根-日本語訳ルビ対応リスト.csv',
+    DEFAULT_FILES_DIR + '/에스페란토 어근-한국어 번역 루비 대응 목록.csv',
+    DEFAULT_FILES_DIR + '/Корни эсперанто – список с русским переводом и руби.csv',
+]
+
+# 合并后 JSON 中各列表的键名（main.py 读取时使用相同的键名）
+REPLACEMENTS_FINAL_LIST_KEY = "全域替换用のリスト(列表)型配列(replacements_final_list)"
+REPLACEMENTS_LIST_FOR_2CHAR_KEY = "二文字词根替换用のリスト(列表)型配列(replacements_list_for_2char)"
+REPLACEMENTS_LIST_FOR_LOCALIZED_STRING_KEY = "局部文字替换用のリスト(列表)型配列(replacements_list_for_localized_string)"
+CASE_INSENSITIVE_MATCHING_KEY = "大小写不敏感匹配(case_insensitive_matching)"
+
+# 格式无关的规则文件：保存词根片段 (词根, 翻译, 宽度) 和未展开大小写形式的基本行，加载时再生成指定格式的规则
+FORMAT_INDEPENDENT_TYPE = '格式无关(加载时选择格式)'
+FORMAT_INDEPENDENT_VERSION = 1
+FORMAT_INDEPENDENT_VERSION_KEY = "格式无关规则文件版本(format_independent_version)"
+FORMAT_INDEPENDENT_SEGMENTS_KEY = "词根片段(segments)"
+FORMAT_INDEPENDENT_GLOBAL_ROWS_KEY = "全域替换用基本行(global_rows)"
+FORMAT_INDEPENDENT_2CHAR_ROWS_KEY = "二文字词根基本行(2char_rows)"
+FORMAT_INDEPENDENT_LOCALIZED_ROWS_KEY = "局部文字替换用行(localized_rows)"
+NATIVE_WORD_BOUNDARIES_KEY = "词边界约束(native_word_boundaries)"
+# 2 字词根基本行的种类
+TWO_CHAR_ROOT_STANDALONE = 'standalone'
+TWO_CHAR_ROOT_SUFFIX = 'suffix'
+TWO_CHAR_ROOT_PREFIX = 'prefix'
+
+# 修改构建逻辑、使旧缓存失效时，请同时更新此版本号（本模块源码的哈希也会计入缓存键）
+BUILD_CODE_VERSION = '20250301'
+
+FORMAT_TYPES = [
+    'HTML格式_Ruby文字_大小调整',
+    'HTML格式_Ruby文字_大小调整_汉字替换',
+    'HTML格式',
+    'HTML格式_汉字替换',
+    '括弧(号)格式',
+    '括弧(号)格式_汉字替换',
+    '替换后文字列のみ(仅)保留(简单替换)'
+]
+
+def read_csv_for_replacement(csv_text: str) -> pd.DataFrame:
+    """
+    读取“世界语词根 - 翻译”CSV 的文本内容（先把 cx, c^ 等统一为 ĉ 等），只取前两列。
+    """
+    converted_text = convert_to_circumflex(csv_text)
+    return pd.read_csv(StringIO(converted_text), encoding="utf-8", usecols=[0, 1])
+
+def filter_csv_rows(CSV_data_imported: pd.DataFrame) -> pd.DataFrame:
+    """
+    用列运算（而不是逐行 iterrows）筛选 CSV 的有效行：跳过空值、空字符串和词根含 '#' 的行。
+    返回保持原顺序的 DataFrame，列为 'E_root', 'hanzi_or_meaning'。
+    """
+    E_roots = CSV_data_imported.iloc[:, 0]
+    hanzi_or_meanings = CSV_data_imported.iloc[:, 1]
+    not_null = E_roots.notna() & hanzi_or_meanings.notna()
+    E_roots = E_roots[not_null].astype(str)
+    hanzi_or_meanings = hanzi_or_meanings[not_null].astype(str)
+    valid = ~E_roots.str.contains('#', regex=False) & (E_roots != '') & (hanzi_or_meanings != '')
+    return pd.DataFrame({'E_root': E_roots[valid], 'hanzi_or_meaning': hanzi_or_meanings[valid]})
+
+def csv_root_translation_dict(CSV_data_imported: pd.DataFrame) -> Dict[str, str]:
+    """
+    从 CSV 中取出有效的 {词根: 翻译}（跳过空值、空字符串和含 '#' 的行）。
+    同一词根出现多次时，以最后一行的翻译为准（位置按第一次出现）。
+    """
+    csv_rows = filter_csv_rows(CSV_data_imported)
+    return dict(zip(csv_rows['E_root'].tolist(), csv_rows['hanzi_or_meaning'].tolist()))
+
+def build_localized_string_rows(
+    CSV_data_imported: pd.DataFrame,
+    format_type: str,
+    char_widths_dict: Dict[str, int],
+    case_insensitive_matching: bool = False,
+    segment_registry: Optional[Dict] = None
+) -> List[List]:
+    """
+    由 CSV 的有效行生成局部替换用的 [词根, 替换后文字, 词根长度]（每行依次为 原形 / 全大写 / 首字母大写）。
+    大写形式、长度、是否跳过大写形式都用列运算一次求出，替换后文字用 render_root_pairs 批量生成。
+    词根与翻译完全相同的行不加注释，只做大小写变换。
+    """
+    csv_rows = filter_csv_rows(CSV_data_imported)
+    E_roots = csv_rows['E_root']
+    hanzi_or_meanings = csv_rows['hanzi_or_meaning']
+    lengths = E_roots.str.len().tolist()
+    identical = (E_roots == hanzi_or_meanings).tolist()
+    if case_insensitive_matching:
+        # 与 is_case_insensitive_rule 相同的判定：全小写且含有大小写字母
+        skip_case_variants = ((E_roots == E_roots.str.lower()) & (E_roots != E_roots.str.upper())).tolist()
+    else:
+        skip_case_variants = [False] * len(csv_rows)
+
+    variant_columns = []
+    for E_root_column, hanzi_column in (
+        (E_roots, hanzi_or_meanings),
+        (E_roots.str.upper(), hanzi_or_meanings.str.upper()),
+        (E_roots.str.capitalize(), hanzi_or_meanings.str.capitalize()),
+    ):
+        E_root_list = E_root_column.tolist()
+        hanzi_list = hanzi_column.tolist()
+        rendered_list = list(hanzi_list)
+        to_render = [k for k, same in enumerate(identical) if not same]
+        rendered = render_root_pairs(
+            [E_root_list[k] for k in to_render], [hanzi_list[k] for k in to_render], format_type, char_widths_dict, segment_registry
+        )
+        for k, rendered_text in zip(to_render, rendered):
+            rendered_list[k] = rendered_text
+        variant_columns.append((E_root_list, rendered_list))
+
+    (base_roots, base_rendered), (upper_roots, upper_rendered), (cap_roots, cap_rendered) = variant_columns
+    localized_rows = []
+    for k in range(len(lengths)):
+        localized_rows.append([base_roots[k], base_rendered[k], lengths[k]])
+        if skip_case_variants[k]:
+            continue
+        localized_rows.append([upper_roots[k], upper_rendered[k], lengths[k]])
+        localized_rows.append([cap_roots[k], cap_rendered[k], lengths[k]])
+    return localized_rows
+
+def render_root_spans(stem: str, spans: List[int], render_dict: Dict[str, str]) -> str:
+    """
+    spans 为 [start0, end0, start1, end1, ...]（trie_find_root_spans 的结果），
+    把其中的词根换成 render_dict 中的替换后文字，得到与 trie_safe_replace 相同的结果。
+    """
+    pieces = []
+    last_end = 0
+    for k in range(0, len(spans), 2):
+        start, end = spans[k], spans[k + 1]
+        pieces.append(stem[last_end:start])
+        pieces.append(render_dict[stem[start:end]])
+        last_end = end
+    pieces.append(stem[last_end:])
+    return ''.join(pieces)
+
+def build_pre_replacements_dict_incrementally(
+    E_stem_with_Part_Of_Speech_list: List[List[str]],
+    replacements: List[Tuple[str, str, str]],
+    root_trie: Dict,
+    build_state: Dict
+) -> Dict[str, List[str]]:
+    """
+    第 5 步（词根分解）的增量版本，结果与非并行的逐条 trie_safe_replace 完全相同。
+
+    词根分解的结果（采用了哪些位置的词根）只取决于词根集合及其优先顺序，与翻译无关。
+    build_state 中保存上次构建的词根顺序 'root_order' 和每个 stem 的分解位置 'stem_spans'：
+      - 只有翻译改变时，所有 stem 沿用上次的分解位置，只需用新的翻译重新拼接；
+      - 词根有增减时，只重新分解“包含增减词根”的 stem（不包含它们的 stem 的候选词根不变）；
+      - 共同词根的相对顺序改变（例如 CSV 行顺序调整）或没有上次的结果时，全部重新分解。
+    函数结束时 build_state 被更新为本次的结果，'resegmented_stem_count' 记录重新分解的 stem 数。
+    """
+    root_order = [old for old, _new, _placeholder in replacements]
+    render_dict = {}
+    for old, new, _placeholder in replacements:
+        render_dict.setdefault(old, new)
+
+    previous_root_order = build_state.get('root_order')
+    previous_stem_spans = build_state.get('stem_spans') or {}
+    affected_roots = None  # None 表示全部重新分解
+    if previous_root_order is not None:
+        previous_roots = set(previous_root_order)
+        current_roots = set(render_dict)
+        if [r for r in previous_root_order if r in current_roots] == [r for r in root_order if r in previous_roots]:
+            affected_roots = list(previous_roots ^ current_roots)
+
+    pre_replacements_dict_1 = {}
+    stem_spans = {}
+    resegmented_stem_count = 0
+    for item in E_stem_with_Part_Of_Speech_list:
+        if len(item) != 2 or len(item[0]) < 2:
+            continue
+        stem, pos_info = item
+        if stem in pre_replacements_dict_1:
+            if pos_info not in pre_replacements_dict_1[stem][1]:
+                pre_replacements_dict_1[stem][1] += ',' + pos_info
+            continue
+
+        spans = previous_stem_spans.get(stem) if affected_roots is not None else None
+        if spans is None or any(root in stem for root in affected_roots):
+            spans = [x for start, end, _new in trie_find_root_spans(stem, root_trie) for x in (start, end)]
+            resegmented_stem_count += 1
+        stem_spans[stem] = spans
+        pre_replacements_dict_1[stem] = [render_root_spans(stem, spans, render_dict), pos_info]
+
+    build_state['root_order'] = root_order
+    build_state['stem_spans'] = stem_spans
+    build_state['resegmented_stem_count'] = resegmented_stem_count
+    return pre_replacements_dict_1
+
+def remove_root_separators(text: str) -> str:
+    """
+    去掉词根分解用的 '/'（但保留 '</rt></ruby>' 中的 '/'）。
+    """
+    return text.replace("</rt></ruby>","%%%").replace('/', '').replace("%%%","</rt></ruby>")
+
+def resolve_affix_expansion_rules(verb_suffix_2l_2: Dict[str, str]) -> Dict[str, List[Tuple]]:
+    """
+    把 AFFIX_EXPANSION_RULES_* 中的词尾组展开为 [(词尾, 替换后词尾), ...]，
+    'verbo_s1' 换成 verb_suffix_2l_2（动词词尾及其替换后文字）。
+    返回 {'2char': [...], 'short': [...], 'medium': [...]}。
+    """
+    def resolve(rules):
+        resolved = []
+        for pos, suffixes, key_prefix, priority_delta, on_existing in rules:
+            if suffixes == AFFIX_VERB_SUFFIXES:
+                suffix_pairs = tuple(verb_suffix_2l_2.items())
+            else:
+                suffix_pairs = tuple((suffix, suffix) for suffix in suffixes)
+            resolved.append((pos, suffix_pairs, key_prefix, priority_delta, on_existing))
+        return resolved
+    return {
+        '2char': resolve(AFFIX_EXPANSION_RULES_2CHAR),
+        'short': resolve(AFFIX_EXPANSION_RULES_SHORT),
+        'medium': resolve(AFFIX_EXPANSION_RULES_MEDIUM),
+    }
+
+def expand_affixes_for_entry(
+    stem: str,
+    entry: List,
+    affix_rules_by_stem_class: Dict[str, List[Tuple]],
+    existing_dict: Dict[str, List]
+):
+    """
+    按词尾扩展表，为一个词条 (stem, [替换后文字, 词性, 优先级]) 逐条生成
+    (新键, [替换后文字, 优先级], 是否固定)。
+    existing_dict 用于判断“同名键是否已存在”；本函数不修改任何字典，由调用方按词条顺序写入结果。
+    """
+    replaced, pos_info, priority = entry
+    if priority == 20000:
+        rules = affix_rules_by_stem_class['2char']
+    elif priority in AFFIX_SHORT_ROOT_PRIORITIES:
+        rules = affix_rules_by_stem_class['short']
+    elif 3 <= len(stem) <= 6:
+        rules = affix_rules_by_stem_class['medium']
+    else:
+        return
+    for pos, suffix_pairs, key_prefix, priority_delta, on_existing in rules:
+        if pos not in pos_info:
+            continue
+        for suffix, replaced_suffix in suffix_pairs:
+            key = stem + suffix
+            existing = existing_dict.get(key)
+            if existing is None or on_existing == AFFIX_SAME_IF_EXISTING:
+                yield (key_prefix + key,
+                       [key_prefix + replaced + replaced_suffix, priority + len(key_prefix + suffix)*10000 + priority_delta],
+                       False)
+            elif on_existing == AFFIX_OVERRIDE_IF_EXISTING or \
+                 (on_existing == AFFIX_OVERRIDE_IF_DIFFERENT and replaced + replaced_suffix != existing[0]):
+                yield key, [replaced + replaced_suffix, priority + len(suffix)*10000 + priority_delta], True
+
+def expand_an_on_entries(root_trie: Dict):
+    """
+    为 AN / ON 列表中的词生成 (键, [替换后文字, 优先级])：
+    词根+an+o/a/e（an 作为后缀）以及 词根+a+n（an 拆成形容词词尾 a + 宾格 n）。
+    """
+    for affix, entries in AN_ON_EXPANSIONS:
+        split_affix = '/' + '/'.join(affix) + '/'
+        for entry in entries:
+            if entry[1].endswith('/' + affix + '/'):
+                stem_part = entry[1][:-len(affix) - 2]
+                affix_part = '/' + affix + '/'
+            else:
+                stem_part = re.sub(affix + "/$", "", re.sub(affix + "$", "", entry[1]))
+                affix_part = affix + '/'
+            for form in (stem_part + affix_part + 'o', stem_part + affix_part + 'a',
+                         stem_part + affix_part + 'e', stem_part + split_affix):
+                key = form.replace('/', '')
+                yield key, [remove_root_separators(trie_safe_replace(form, root_trie)), (len(key)-1)*10000+3000]
+
+def build_replacements_json(
+    CSV_data_imported: pd.DataFrame,
+    custom_stemming_setting_list: List,
+    user_replacement_item_setting_list: List,
+    format_type: str,
+    char_widths_dict: Dict[str, int],
+    imported_placeholders_for_global_replacement: List[str],
+    imported_placeholders_for_2char_replacement: List[str],
+    imported_placeholders_for_local_replacement: List[str],
+    use_parallel: bool = False,
+    num_processes: int = 4,
+    case_insensitive_matching: bool = False,
+    native_word_boundaries: bool = False,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    pejvo_stem_json_path: str = DEFAULT_PEJVO_STEM_JSON_PATH,
+    root_list_path: str = DEFAULT_ROOT_LIST_PATH,
+    build_state: Optional[Dict] = None,
+    E_stem_with_Part_Of_Speech_list: Optional[List[List[str]]] = None
+) -> Dict:
+    """
+    构建替换用 JSON 的完整流程，返回“合并3个JSON文件”的字典：
+      { REPLACEMENTS_FINAL_LIST_KEY: [...], REPLACEMENTS_LIST_FOR_2CHAR_KEY: [...],
+        REPLACEMENTS_LIST_FOR_LOCALIZED_STRING_KEY: [...], CASE_INSENSITIVE_MATCHING_KEY: True（仅大小写不敏感时） }
+    progress_callback(当前数, 总数) 用于报告词根分解的进度（并行模式下按块报告）。
+    build_state 见 build_pre_replacements_dict_incrementally（增量构建时使用，会被原地更新，
+    另外记录本次 CSV 的 {词根: 翻译} 于 'csv_rows'）。
+    E_stem_with_Part_Of_Speech_list 可传入已读取的 PEJVO 列表（批量构建时共用），省略时从 pejvo_stem_json_path 读取。
+    """
+    # -------------------------------------------------------------
+    # 1) 读取“大规模世界语词典/列表” (E_stem_with_Part_Of_Speech_list)
+    #    内含约数万条世界语单词(含词性信息)
+    # -------------------------------------------------------------
+    if E_stem_with_Part_Of_Speech_list is None:
+        with open(pejvo_stem_json_path, "r", encoding="utf-8") as g:
+            E_stem_with_Part_Of_Speech_list = json.load(g)
+
+    # 先读取“世界语全部词根(约11137个)”到一个临时字典
+    temporary_replacements_dict = {}
+    with open(root_list_path, 'r', encoding='utf-8') as file:
+        E_roots = file.readlines()
+        for E_root in E_roots:
+            E_root = E_root.strip()
+            if not E_root.isdigit(): 
+                # 临时记录：[替换后文字, 替换优先级]
+                # 先全部设成 E_root 本身，优先级设为 len(E_root)
+                temporary_replacements_dict[E_root] = [E_root, len(E_root)]
+
+    # -------------------------------------------------------------
+    # 2) 用 CSV 文件中的词根->(汉字/翻译) 覆盖这个临时字典
+    # -------------------------------------------------------------
+    root_translation_dict = csv_root_translation_dict(CSV_data_imported)
+    if build_state is not None:
+        build_state['csv_rows'] = root_translation_dict
+    # 构建格式无关的规则文件时，词根的替换后文字是片段标记（见 register_format_independent_segments）
+    segment_registry = new_format_independent_segment_registry() if format_type == FORMAT_INDEPENDENT_TYPE else None
+    rendered_roots = render_root_pairs(
+        list(root_translation_dict.keys()), list(root_translation_dict.values()), format_type, char_widths_dict, segment_registry,
+        remove_separators=True
+    )
+    for E_root, rendered in zip(root_translation_dict.keys(), rendered_roots):
+        temporary_replacements_dict[E_root] = [rendered, len(E_root)]
+
+    # -------------------------------------------------------------
+    # 3) 把临时字典转为列表，并根据优先级(字符串长度)从大到小排序
+    # -------------------------------------------------------------
+    temporary_replacements_list_1 = []
+    for old, new in temporary_replacements_dict.items():
+        temporary_replacements_list_1.append((old, new[0], new[1]))
+    temporary_replacements_list_2 = sorted(temporary_replacements_list_1, key=lambda x: x[2], reverse=True)
+
+    # -------------------------------------------------------------
+    # 4) 用 placeholder(占位符) 来构建 “(old->placeholder->new)” 的安全替换列表
+    # -------------------------------------------------------------
+    temporary_replacements_list_final = []
+    for kk in range(len(temporary_replacements_list_2)):
+        temporary_replacements_list_final.append([
+            temporary_replacements_list_2[kk][0],
+            temporary_replacements_list_2[kk][1],
+            imported_placeholders_for_global_replacement[kk]
+        ])
+
+    # 把词根列表建成 trie，之后的词根分解都用 trie_safe_replace（结果与 safe_replace 相同，但快得多）
+    root_trie = build_root_trie(temporary_replacements_list_final)
+
+    # -------------------------------------------------------------
+    # 5) 对 E_stem_with_Part_Of_Speech_list 执行批量替换（可并行）
+    #    传入 build_state 时为增量构建：沿用上次的词根分解结果，只重新分解受影响的 stem
+    # -------------------------------------------------------------
+    if build_state is not None:
+        pre_replacements_dict_1 = build_pre_replacements_dict_incrementally(
+            E_stem_with_Part_Of_Speech_list,
+            temporary_replacements_list_final,
+            root_trie,
+            build_state
+        )
+    elif use_parallel:
+        pre_replacements_dict_1 = parallel_build_pre_replacements_dict(
+            E_stem_with_Part_Of_Speech_list,
+            temporary_replacements_list_final,
+            num_processes,
+            progress_callback=progress_callback
+        )
+    else:
+        # 如果不使用并行，则手动循环，顺便通过 progress_callback 报告进度
+        total_items = len(E_stem_with_Part_Of_Speech_list)
+        pre_replacements_dict_1 = {}
+
+        for i, j in enumerate(E_stem_with_Part_Of_Speech_list):
+            if len(j) == 2:
+                if len(j[0]) >= 2:
+                    if j[0] in pre_replacements_dict_1:
+                        if j[1] not in pre_replacements_dict_1[j[0]][1]:
+                            pre_replacements_dict_1[j[0]] = [
+                                pre_replacements_dict_1[j[0]][0],
+                                pre_replacements_dict_1[j[0]][1] + ',' + j[1]
+                            ]
+                    else:
+                        pre_replacements_dict_1[j[0]] = [
+                            trie_safe_replace(j[0], root_trie),
+                            j[1]
+                        ]
+
+            if i % 1000 == 0 and progress_callback is not None:
+                progress_callback(i + 1, total_items)
+
+        if progress_callback is not None:
+            progress_callback(total_items, total_items)
+
+    # 例如可在这里 pop 掉某些键
+    keys_to_remove = ['domen', 'teren','posten']
+    for key in keys_to_remove:
+        pre_replacements_dict_1.pop(key, None)
+
+    # -------------------------------------------------------------
+    # 6) 将 pre_replacements_dict_1 进一步做各种优先级、后缀添加等处理：
+    #    生成 “replacements_final_list” 的最终形态
+    # -------------------------------------------------------------
+    pre_replacements_dict_2 = {}
+    for i,j in pre_replacements_dict_1.items():
+        if i==j[0]:
+            pre_replacements_dict_2[i.replace('/', '')] = [
+                j[0].replace("</rt></ruby>","%%%").replace('/', '').replace("%%%","</rt></ruby>"),
+                j[1],
+                len(i.replace('/', ''))*10000 - 3000
+            ]
+        else:
+            pre_replacements_dict_2[i.replace('/', '')] = [
+                j[0].replace("</rt></ruby>","%%%").replace('/', '').replace("%%%","</rt></ruby>"),
+                j[1],
+                len(i.replace('/', ''))*10000
+            ]
+
+    #-------------------------------------------------------------
+    # (8) ここから先は、AN, ON, 動詞語尾などの接頭辞/接尾辞を用いた
+    #     優先順位調整を大量に行う。
+    #
+    #     具体的には、辞書 pre_replacements_dict_2 をさらに書き換えたり、
+    #     新しいキー(=語尾を付けた形など)を追加して、より精度の高い置換を行えるようにしている。
+    #
+    #     コード量は多いですが、やっていることは
+    #       「(語根 + an)を名詞/形容詞とみなすか、それとも接尾辞an(員)とみなすか」
+    #       「(語根 + as)で動詞現在形にする場合の優先順位をどうするか」
+    #     などの細かいルール付けです。
+    #-------------------------------------------------------------
+
+    #------------------------------------------
+    # verb_suffix_2l_2 という辞書を作る:
+    #   verb_suffix_2l の各キー(例:'as')とその置換結果をsafe_replace()で更新
+    #   こうすることで "(語根)+(動詞接尾辞)" に対してルビなどを入れ込めるようにします。
+    #------------------------------------------
+    verb_suffix_2l_2={}
+    for original_verb_suffix,replaced_verb_suffix in verb_suffix_2l.items():
+        # 例: 'as'→'as' のままのことが多いが、safe_replaceで更に別ルビを当てはめる可能性あり
+        verb_suffix_2l_2[original_verb_suffix] = trie_safe_replace(replaced_verb_suffix, root_trie)
+
+    # 一番の工夫ポイント(以下、コメントはコード内にある通り):
+    #  置換の優先順位をどう定めるかで、置換の精度が大きく変わる。
+    #  文字数の多い単語を先に置換する、動詞の場合は活用語尾を付けた形を優先度高くするetc.
+    #
+    # pre_replacements_dict_1→pre_replacements_dict_2→pre_replacements_dict_3
+    # という流れで段階的に書き換え、最終的に "replacements_final_list" へまとめる方針。
+
+    AN_replacement = trie_safe_replace('an', root_trie)
+    pre_replacements_dict_3={}
+
+    # (8-1) 例えば "xxxan" という語があり、それが名詞品詞("名词")なのに
+    #        中で "an"がルビとして置換されている...等、誤置換を防ぐための調整。
+    #        判定は常に元の pre_replacements_dict_2 に対して行い、削除はループの後でまとめて行う（辞書のコピーは不要）。
+    keys_removed_from_dict_2 = []
+    for i,j in pre_replacements_dict_2.items(): # j[0]:置換後文字列, j[1]:品詞, j[2]:優先順位
+        if i.endswith('an') and (AN_replacement in j[0]) and ("名词" in j[1]) and (i[:-2] in pre_replacements_dict_2):
+            # 形容詞語尾anと接尾辞anが衝突する場合などに対応
+            keys_removed_from_dict_2.append(i)
+            # そこへさらに "i+"o,"i+"a,"i+"e などの派生形を追加する処理
+            for k in ["o","a","e"]:
+                if not i+k in pre_replacements_dict_2:
+                    pre_replacements_dict_3[i+k]=[j[0]+k, j[2]+len(k)*10000-2000]
+        elif (j[1] == "名词") and (len(i)<=6) and not(j[2] in [60000,50000,40000,30000,20000]):
+            # 名詞で6文字以下、かつ特定優先順位でないものを調整
+            for k in ["o"]:
+                if not i+k in pre_replacements_dict_2:
+                    pre_replacements_dict_3[i+k]=[j[0]+k,j[2]+len(k)*10000-2000]
+            keys_removed_from_dict_2.append(i)
+    for i in keys_removed_from_dict_2:
+        pre_replacements_dict_2.pop(i, None)
+
+    # (8-2) 品詞語尾(o/on/oj, a/aj/an, e, 動詞語尾 as/is/os..., u/i)を付けた形の追加。
+    #       どの語にどの語尾をどの優先順位で付けるかは AFFIX_EXPANSION_RULES_* の表で定義し、
+    #       expand_affixes_for_entry が表に従って (キー, [置換後文字列, 優先順位], 固定するか) を生成する。
+    #       固定(unchangeable)されたキーは、後から来る同じキーの「語尾なしの形」で上書きしない。
+    affix_rules_by_stem_class = resolve_affix_expansion_rules(verb_suffix_2l_2)
+    unchangeable_after_creation_set = set()
+    for i,j in pre_replacements_dict_2.items():
+        if j[2] != 20000 and i not in unchangeable_after_creation_set:
+            pre_replacements_dict_3[i]=[j[0],j[2]]# 品詞情報はここで用いるためにあった。以後は不要なので省いていく。
+        for key, value, unchangeable in expand_affixes_for_entry(i, j, affix_rules_by_stem_class, pre_replacements_dict_2):
+            pre_replacements_dict_3[key] = value
+            if unchangeable:
+                unchangeable_after_creation_set.add(key)
+
+    # (8-3) 针对 AN、ON 等也进行对应处理
+    for key, value in expand_an_on_entries(root_trie):
+        pre_replacements_dict_3[key] = value
+
+    # -------------------------------------------------------------
+    # 7) 应用自定义词根分解 JSON
+    # -------------------------------------------------------------
+    # 以下处理会修改这两个列表（pop / remove），先复制一份，避免改动调用方的数据
+    custom_stemming_setting_list = copy.deepcopy(custom_stemming_setting_list)
+    user_replacement_item_setting_list = copy.deepcopy(user_replacement_item_setting_list)
+    if len(custom_stemming_setting_list) > 0:
+        if len(custom_stemming_setting_list[0]) != 3:
+            custom_stemming_setting_list.pop(0)
+
+    for i in custom_stemming_setting_list:
+        if len(i)==3:
+            try:
+                esperanto_Word_before_replacement = i[0].replace('/', '')
+                if i[1]=="dflt":
+                    replacement_priority_by_length=len(esperanto_Word_before_replacement)*10000
+                elif i[1] in allowed_values:
+                    pre_replacements_dict_3.pop(esperanto_Word_before_replacement, None)
+                    if "ne" in i[2]:
+                        pre_replacements_dict_3.pop(esperanto_Word_before_replacement, None)
+                        i[2].remove("ne")
+                    if "verbo_s1" in i[2]:
+                        for k1 in verb_suffix_2l.keys():
+                            removed_E_word = esperanto_Word_before_replacement + k1
+                            pre_replacements_dict_3.pop(removed_E_word, None)
+                        i[2].remove("verbo_s1")
+                    if "verbo_s2" in i[2]:
+                        for k in ["u ", "i ", "u", "i"]:
+                            removed_E_word = esperanto_Word_before_replacement + k
+                            pre_replacements_dict_3.pop(removed_E_word, None)
+                        i[2].remove("verbo_s2")
+                    if len(i[2]) >= 1:
+                        for j_ in i[2]:
+                            j2 = j_.replace('/', '')
+                            removed_E_word = esperanto_Word_before_replacement + j2
+                            pre_replacements_dict_3.pop(removed_E_word, None)
+                    continue
+                elif isinstance(i[1], int) or (isinstance(i[1], str) and i[1].isdigit()):
+                    replacement_priority_by_length = int(i[1])
+
+                Replaced_String = trie_safe_replace(i[0], root_trie).replace("</rt></ruby>","%%%").replace('/', '').replace("%%%","</rt></ruby>")
+                if "ne" in i[2]:
+                    pre_replacements_dict_3[esperanto_Word_before_replacement]=[Replaced_String, replacement_priority_by_length]
+                    i[2].remove("ne")
+                if "verbo_s1" in i[2]:
+                    for k1,k2 in verb_suffix_2l.items():
+                        replaced_k2 = trie_safe_replace(k2, root_trie)
+                        pre_replacements_dict_3[esperanto_Word_before_replacement + k1]=[Replaced_String+replaced_k2, replacement_priority_by_length+len(k1)*10000]
+                    i[2].remove("verbo_s1")
+                if "verbo_s2" in i[2]:
+                    for k in ["u ","i ","u","i"]:
+                        pre_replacements_dict_3[esperanto_Word_before_replacement + k]=[Replaced_String+k, replacement_priority_by_length+len(k)*10000]
+                    i[2].remove("verbo_s2")
+                if len(i[2])>=1:
+                    for j_ in i[2]:
+                        j2 = j_.replace('/', '')
+                        j3 = trie_safe_replace(j_, root_trie).replace("</rt></ruby>","%%%").replace('/', '').replace("%%%","</rt></ruby>")
+                        pre_replacements_dict_3[esperanto_Word_before_replacement + j2]=[Replaced_String + j3, replacement_priority_by_length+len(j2)*10000]
+                else:
+                    pre_replacements_dict_3[esperanto_Word_before_replacement]=[Replaced_String, replacement_priority_by_length]
+            except:
+                continue
+
+    # -------------------------------------------------------------
+    # 8) 应用“自定义替换后文字” JSON
+    # -------------------------------------------------------------
+    if len(user_replacement_item_setting_list) > 0:
+        if len(user_replacement_item_setting_list[0]) != 4:
+            user_replacement_item_setting_list.pop(0)
+
+    for i in user_replacement_item_setting_list:
+        if len(i)==4:
+            try:   
+                esperanto_Roots_before_replacement = i[0].strip('/').split('/')
+                replaced_roots = i[3].strip('/').split('/')
+                if len(esperanto_Roots_before_replacement) == len(replaced_roots):
+                    Replaced_String = ""
+                    for kk in range(len(esperanto_Roots_before_replacement)):
+                        Replaced_String += render_root_pairs([esperanto_Roots_before_replacement[kk]],[replaced_roots[kk]], format_type, char_widths_dict, segment_registry)[0]
+                    
+                    esperanto_Word_before_replacement = i[0].replace('/', '')
+                    if i[1]=="dflt":
+                        replacement_priority_by_length=len(esperanto_Word_before_replacement)*10000
+                    elif isinstance(i[1], int) or (isinstance(i[1], str) and i[1].isdigit()):
+                        replacement_priority_by_length = int(i[1])
+
+                    if "ne" in i[2]:
+                        pre_replacements_dict_3[esperanto_Word_before_replacement]=[Replaced_String, replacement_priority_by_length]
+                        i[2].remove("ne")
+                    if "verbo_s1" in i[2]:
+                        for k1,k2 in verb_suffix_2l.items():
+                            replaced_k2 = trie_safe_replace(k2, root_trie)
+                            pre_replacements_dict_3[esperanto_Word_before_replacement + k1]=[Replaced_String+replaced_k2, replacement_priority_by_length+len(k1)*10000]
+                        i[2].remove("verbo_s1")
+                    if "verbo_s2" in i[2]:
+                        for k in ["u ","i ","u","i"]:
+                            pre_replacements_dict_3[esperanto_Word_before_replacement + k]=[Replaced_String+k, replacement_priority_by_length+len(k)*10000]
+                        i[2].remove("verbo_s2")
+                    if len(i[2])>=1:
+                        for j_ in i[2]:
+                            j2 = j_.replace('/', '')
+                            j3 = trie_safe_replace(j_, root_trie).replace("</rt></ruby>","%%%").replace('/', '').replace("%%%","</rt></ruby>")
+                            pre_replacements_dict_3[esperanto_Word_before_replacement + j2]=[Replaced_String + j3, replacement_priority_by_length+len(j2)*10000]
+                    else:
+                        pre_replacements_dict_3[esperanto_Word_before_replacement]=[Replaced_String, replacement_priority_by_length]
+            except:
+                continue
+
+    # -------------------------------------------------------------
+    # 9) 将生成的 pre_replacements_dict_3 转为列表，并按优先级排序
+    # -------------------------------------------------------------
+    pre_replacements_list_1=[]
+    for old,new in  pre_replacements_dict_3.items():
+        if isinstance(new[1], int):
+            pre_replacements_list_1.append((old,new[0],new[1]))
+
+    pre_replacements_list_2= sorted(pre_replacements_list_1, key=lambda x: x[2], reverse=True)
+
+    # 在 10) 中统一执行 remove_redundant_ruby_if_identical（删除可能出现的 parent=child 的情况）
+    pre_replacements_list_3=[]
+    for kk in range(len(pre_replacements_list_2)):
+        if len(pre_replacements_list_2[kk][0])>=3:
+            pre_replacements_list_3.append([pre_replacements_list_2[kk][0],pre_replacements_list_2[kk][1],imported_placeholders_for_global_replacement[kk]])
+
+    # 2字词根的基本行：[种类, 词根, 替换后文字, placeholder]（大写/首字母大写形式在 10) 中生成）
+    two_char_root_rows = []
+    for i in range(len(standalone_2char_roots)):
+        two_char_root_rows.append([TWO_CHAR_ROOT_STANDALONE, standalone_2char_roots[i], trie_safe_replace(standalone_2char_roots[i], root_trie), imported_placeholders_for_2char_replacement[i+2000]])
+    for i in range(len(suffix_2char_roots)):
+        two_char_root_rows.append([TWO_CHAR_ROOT_SUFFIX, suffix_2char_roots[i], trie_safe_replace(suffix_2char_roots[i], root_trie), imported_placeholders_for_2char_replacement[i]])
+    for i in range(len(prefix_2char_roots)):
+        two_char_root_rows.append([TWO_CHAR_ROOT_PREFIX, prefix_2char_roots[i], trie_safe_replace(prefix_2char_roots[i], root_trie), imported_placeholders_for_2char_replacement[i+1000]])
+
+    # 用 CSV（仅包含词根→翻译) 构建“局部替换用列表”
+    pre_replacements_list_for_localized_string_1 = build_localized_string_rows(
+        CSV_data_imported, format_type, char_widths_dict, case_insensitive_matching, segment_registry
+    )
+
+    pre_replacements_list_for_localized_string_2 = sorted(pre_replacements_list_for_localized_string_1, key=lambda x: x[2], reverse=True)
+
+    replacements_list_for_localized_string=[]
+    for kk in range(len(pre_replacements_list_for_localized_string_2)):
+        replacements_list_for_localized_string.append([
+            pre_replacements_list_for_localized_string_2[kk][0],
+            pre_replacements_list_for_localized_string_2[kk][1],
+            imported_placeholders_for_local_replacement[kk]
+        ])
+
+    if segment_registry is not None:
+        # 格式无关的规则文件：只保存词根片段表和基本行，加载时再用 render_format_independent_rules 生成指定格式的规则
+        return {
+            FORMAT_INDEPENDENT_VERSION_KEY: FORMAT_INDEPENDENT_VERSION,
+            FORMAT_INDEPENDENT_SEGMENTS_KEY: finish_format_independent_segments(segment_registry, char_widths_dict),
+            FORMAT_INDEPENDENT_GLOBAL_ROWS_KEY: pre_replacements_list_3,
+            FORMAT_INDEPENDENT_2CHAR_ROWS_KEY: two_char_root_rows,
+            FORMAT_INDEPENDENT_LOCALIZED_ROWS_KEY: replacements_list_for_localized_string,
+            CASE_INSENSITIVE_MATCHING_KEY: case_insensitive_matching,
+            NATIVE_WORD_BOUNDARIES_KEY: native_word_boundaries,
+        }
+
+    return assemble_replacements_json(
+        pre_replacements_list_3,
+        two_char_root_rows,
+        replacements_list_for_localized_string,
+        format_type,
+        case_insensitive_matching,
+        native_word_boundaries
+    )
+
+def two_char_root_case_variants(root: str, replaced: str, place_holder: str, add_case_variants: bool = True):
+    """
+    生成 2 字词根的 (old, new, placeholder)：小写形式，以及（add_case_variants 时）大写、首字母大写形式。
+    """
+    yield root, replaced, place_holder
+    if add_case_variants:
+        yield root.upper(), replaced.upper(), place_holder[:-1]+'up$'
+        yield root.capitalize(), capitalize_ruby_and_rt(replaced), place_holder[:-1]+'cap$'
+
+# 词边界约束的包含关系：(较严的约束, 较宽的约束) -> 两者合并后的约束（即较宽的那个）。
+# 'start' 与 'end' 互不包含，不能合并。
+WORD_BOUNDARY_UNIONS = {
+    (BOUNDARY_STANDALONE, BOUNDARY_WORD_START): BOUNDARY_WORD_START,
+    (BOUNDARY_STANDALONE, BOUNDARY_WORD_END): BOUNDARY_WORD_END,
+    (BOUNDARY_STANDALONE, ''): '',
+    (BOUNDARY_WORD_START, ''): '',
+    (BOUNDARY_WORD_END, ''): '',
+}
+
+def merge_word_boundary_duplicates(rules: List[tuple]) -> List[tuple]:
+    """
+    使用词边界约束时，原先只差前后空格的规则（例如动词词尾 'u ' 与 'u' 两种变体生成的 'amu ' / 'amu'）
+    去掉空格后 old、new 完全相同。若一条的约束包含另一条（见 WORD_BOUNDARY_UNIONS），只保留优先级较低（靠后）的那一条，
+    约束取两者中较宽的一个。保留靠后的位置，是因为较宽的规则原本就在那里替换大部分出现位置。
+    """
+    merged: List[Optional[tuple]] = []
+    kept_positions: Dict[Tuple[str, str], int] = {}
+    for rule in reversed(rules):
+        boundary = rule[3] if len(rule) > 3 else ''
+        position = kept_positions.get((rule[0], rule[1]))
+        if position is not None:
+            kept_rule = merged[position]
+            kept_boundary = kept_rule[3] if len(kept_rule) > 3 else ''
+            union = kept_boundary if boundary == kept_boundary else (
+                WORD_BOUNDARY_UNIONS.get((boundary, kept_boundary), WORD_BOUNDARY_UNIONS.get((kept_boundary, boundary)))
+            )
+            if union is not None:
+                merged[position] = kept_rule[:3] + ((union,) if union else ())
+                continue
+        kept_positions[(rule[0], rule[1])] = len(merged)
+        merged.append(rule)
+    merged.reverse()
+    return merged
+
+def assemble_replacements_json(
+    global_rows: List,
+    two_char_root_rows: List,
+    localized_rows: List,
+    format_type: str,
+    case_insensitive_matching: bool = False,
+    native_word_boundaries: bool = False,
+    render: Optional[Callable[[str], str]] = None
+) -> Dict:
+    """
+    build_replacements_json 的第 10) 步以后：由已排序、已分配 placeholder 的基本行生成大写/首字母大写形式、
+    处理前后空格（或词边界约束）、组装 2 字词根列表，返回“合并3个JSON文件”的字典。
+    render 用于把格式无关规则中的词根片段标记换成指定格式的文字（见 render_format_independent_rules）；
+    直接构建某一格式时为 None。
+    """
+    if render is None:
+        render = lambda text: text
+
+    # -------------------------------------------------------------
+    # 10) 针对大写/首字母大写等情况，再生成两条替换记录
+    # -------------------------------------------------------------
+    pre_replacements_list_3 = [(old, remove_redundant_ruby_if_identical(render(new)), place_holder) for old, new, place_holder in global_rows]
+    pre_replacements_list_4=[]
+    if format_type in ('HTML格式_Ruby文字_大小调整','HTML格式_Ruby文字_大小调整_汉字替换','HTML格式','HTML格式_汉字替换'):
+        for old,new,place_holder in pre_replacements_list_3:
+            pre_replacements_list_4.append((old,new,place_holder))
+            if case_insensitive_matching and is_case_insensitive_rule(old):
+                continue
+            pre_replacements_list_4.append((old.upper(),new.upper(),place_holder[:-1]+'up$'))
+            if old[0]==' ':
+                pre_replacements_list_4.append((old[0] + old[1:].capitalize() ,new[0] + capitalize_ruby_and_rt(new[1:]),place_holder[:-1]+'cap$'))
+            else:
+                pre_replacements_list_4.append((old.capitalize(),capitalize_ruby_and_rt(new),place_holder[:-1]+'cap$'))
+    elif format_type in ('括弧(号)格式', '括弧(号)格式_汉字替换'):
+        for old,new,place_holder in pre_replacements_list_3:
+            pre_replacements_list_4.append((old,new,place_holder))
+            if case_insensitive_matching and is_case_insensitive_rule(old):
+                continue
+            pre_replacements_list_4.append((old.upper(),new.upper(),place_holder[:-1]+'up$'))
+            if old[0]==' ':
+                pre_replacements_list_4.append((old[0] + old[1:].capitalize(),new[0] + new[1:].capitalize(),place_holder[:-1]+'cap$'))
+            else:
+                pre_replacements_list_4.append((old.capitalize(),new.capitalize(),place_holder[:-1]+'cap$'))
+    elif format_type in ('替换后文字列のみ(仅)保留(简单替换)'):
+        for old,new,place_holder in pre_replacements_list_3:
+            pre_replacements_list_4.append((old,new,place_holder))
+            if case_insensitive_matching and is_case_insensitive_rule(old):
+                continue
+            pre_replacements_list_4.append((old.upper(),new.upper(),place_holder[:-1]+'up$'))
+            if old[0]==' ':
+                pre_replacements_list_4.append((old[0] + old[1:].capitalize() ,new[0] + new[1:].capitalize() ,place_holder[:-1]+'cap$'))
+            else:
+                pre_replacements_list_4.append((old.capitalize(),new.capitalize(),place_holder[:-1]+'cap$'))
+
+    replacements_final_list=[]
+    for old, new, place_holder in pre_replacements_list_4:
+        if native_word_boundaries and (old.startswith(' ') or old.endswith(' ')):
+            # 把前后的空格转换为词边界约束
+            if old.startswith(' ') and old.endswith(' '):
+                boundary = BOUNDARY_STANDALONE
+            elif old.startswith(' '):
+                boundary = BOUNDARY_WORD_START
+            else:
+                boundary = BOUNDARY_WORD_END
+            if old.startswith(' ') and new.startswith(' '):
+                new = new[1:]
+            if old.endswith(' ') and new.endswith(' '):
+                new = new[:-1]
+            replacements_final_list.append((old.strip(' '), new, place_holder, boundary))
+            continue
+        modified_placeholder = place_holder
+        if old.startswith(' '):
+            modified_placeholder = ' ' + modified_placeholder
+            if not new.startswith(' '):
+                new = ' ' + new
+        if old.endswith(' '):
+            modified_placeholder = modified_placeholder + ' '
+            if not new.endswith(' '):
+                new = new + ' '
+        replacements_final_list.append((old, new, modified_placeholder))
+    if native_word_boundaries:
+        replacements_final_list = merge_word_boundary_duplicates(replacements_final_list)
+
+    # 生成 2字词根的替换列表（按 独立词、后缀、前缀 的顺序）
+    replacements_list_for_2char=[]
+    for kind, root, replaced, place_holder in two_char_root_rows:
+        replaced = remove_redundant_ruby_if_identical(render(replaced))
+        add_case_variants = not (case_insensitive_matching and is_case_insensitive_rule(root))
+        for old, new, variant_placeholder in two_char_root_case_variants(root, replaced, place_holder, add_case_variants):
+            if kind == TWO_CHAR_ROOT_SUFFIX:
+                replacements_list_for_2char.append(["$"+old,"$"+new,"$"+variant_placeholder])
+            elif kind == TWO_CHAR_ROOT_PREFIX:
+                replacements_list_for_2char.append([old+"$",new+"$",variant_placeholder+"$"])
+            elif native_word_boundaries:
+                replacements_list_for_2char.append([old,new,variant_placeholder,BOUNDARY_STANDALONE])
+            else:
+                replacements_list_for_2char.append([" "+old+" "," "+new+" "," "+variant_placeholder+" "])
+
+    replacements_list_for_localized_string = [[old, render(new), place_holder] for old, new, place_holder in localized_rows]
+
+    # -------------------------------------------------------------
+    # 最终把这三种列表合并为一个字典（即“合并3个JSON文件”的内容）
+    # -------------------------------------------------------------
+    combined_data = {}
+    combined_data[REPLACEMENTS_FINAL_LIST_KEY] = replacements_final_list
+    combined_data[REPLACEMENTS_LIST_FOR_2CHAR_KEY] = replacements_list_for_2char
+    combined_data[REPLACEMENTS_LIST_FOR_LOCALIZED_STRING_KEY] = replacements_list_for_localized_string
+    # 默认（大小写敏感）时不写这一项，与以前生成的文件相同
+    if case_insensitive_matching:
+        combined_data[CASE_INSENSITIVE_MATCHING_KEY] = True
+
+    return combined_data
+
+def is_format_independent_rule_data(data: Dict) -> bool:
+    return FORMAT_INDEPENDENT_VERSION_KEY in data
+
+def count_rule_data_rows(data: Dict) -> Tuple[int, int, int]:
+    """
+    返回 (全域, 二文字词根, 局部) 的条数。格式无关的规则文件没有展开后的列表，返回各自基本行的条数。
+    """
+    if is_format_independent_rule_data(data):
+        keys = (FORMAT_INDEPENDENT_GLOBAL_ROWS_KEY, FORMAT_INDEPENDENT_2CHAR_ROWS_KEY, FORMAT_INDEPENDENT_LOCALIZED_ROWS_KEY)
+    else:
+        keys = (REPLACEMENTS_FINAL_LIST_KEY, REPLACEMENTS_LIST_FOR_2CHAR_KEY, REPLACEMENTS_LIST_FOR_LOCALIZED_STRING_KEY)
+    return tuple(len(data[key]) for key in keys)
+
+def render_format_independent_rules(data: Dict, format_type: str, char_widths_dict=None) -> Dict:
+    """
+    由格式无关的规则文件（build_replacements_json(format_type=FORMAT_INDEPENDENT_TYPE) 的结果）
+    生成指定 format_type 的“合并3个JSON文件”字典（与直接构建该格式的结果相同）。
+    每个词根片段只调用一次 output_format（使用文件中预先测量的宽度），再用 str.translate 代入各规则。
+    char_widths_dict 只在需要插入 <br> 的过长 ruby 中使用，省略时读取默认的二进制宽度表。
+    """
+    if data.get(FORMAT_INDEPENDENT_VERSION_KEY) != FORMAT_INDEPENDENT_VERSION:
+        raise ValueError("不支持的格式无关规则文件版本")
+    if format_type not in FORMAT_TYPES:
+        raise ValueError(f"未知的 format_type: {format_type}")
+    if char_widths_dict is None:
+        char_widths_dict = load_char_width_table()
+    segment_table = {}
+    for segment_id, (main_text, ruby_content, width_main, width_ruby, remove_separators) in enumerate(data[FORMAT_INDEPENDENT_SEGMENTS_KEY]):
+        rendered = output_format(main_text, ruby_content, format_type, char_widths_dict, width_main, width_ruby)
+        if remove_separators:
+            rendered = remove_root_separators(rendered)
+        segment_table[ord(format_independent_segment_marker(segment_id))] = rendered
+    return assemble_replacements_json(
+        data[FORMAT_INDEPENDENT_GLOBAL_ROWS_KEY],
+        data[FORMAT_INDEPENDENT_2CHAR_ROWS_KEY],
+        data[FORMAT_INDEPENDENT_LOCALIZED_ROWS_KEY],
+        format_type,
+        bool(data.get(CASE_INSENSITIVE_MATCHING_KEY, False)),
+        bool(data.get(NATIVE_WORD_BOUNDARIES_KEY, False)),
+        render=lambda text: text.translate(segment_table)
+    )
+
+def sha256_of_text(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def sha256_of_file(file_path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+def sha256_of_placeholders(placeholders: List[str]) -> str:
+    return sha256_of_text('\n'.join(placeholders))
+
+def sha256_of_char_widths(char_widths_dict) -> str:
+    # 字典与二进制宽度表（load_char_width_table）的宽度相同时得到相同的哈希
+    return hashlib.sha256(np.ascontiguousarray(get_char_width_table(char_widths_dict), dtype=np.int32).tobytes()).hexdigest()
+
+def compute_build_cache_key(
+    csv_text: str,
+    custom_stemming_setting_list: List,
+    user_replacement_item_setting_list: List,
+    format_type: str,
+    case_insensitive_matching: bool = False,
+    native_word_boundaries: bool = False,
+    pejvo_stem_json_path: str = DEFAULT_PEJVO_STEM_JSON_PATH,
+    root_list_path: str = DEFAULT_ROOT_LIST_PATH,
+    include_csv: bool = True,
+    char_widths_dict=None,
+    imported_placeholders_for_global_replacement: Optional[List[str]] = None,
+    imported_placeholders_for_2char_replacement: Optional[List[str]] = None,
+    imported_placeholders_for_local_replacement: Optional[List[str]] = None
+) -> str:
+    """
+    构建缓存的键：CSV、两个自定义 JSON、format_type、构建选项、词典数据文件以及本模块代码版本的哈希。
+    include_csv=False 时不含 CSV（增量构建用来查找“同一配置下上次的构建状态”）。
+    文字宽度表与三种 placeholder 会写入构建结果，缓存构建结果时必须传入实际使用的值；
+    为 None 的项不计入键（增量构建的词根分解状态与它们无关）。
+    """
+    key_parts = {
+        'csv': sha256_of_text(csv_text) if include_csv else None,
+        'stemming_setting': sha256_of_text(json.dumps(custom_stemming_setting_list, ensure_ascii=False, sort_keys=True)),
+        'replacement_setting': sha256_of_text(json.dumps(user_replacement_item_setting_list, ensure_ascii=False, sort_keys=True)),
+        'format_type': format_type,
+        'case_insensitive_matching': case_insensitive_matching,
+        'native_word_boundaries': native_word_boundaries,
+        'pejvo_stem_json': sha256_of_file(pejvo_stem_json_path),
+        'root_list': sha256_of_file(root_list_path),
+        'code_version': BUILD_CODE_VERSION,
+        'code': sha256_of_file(os.path.abspath(__file__)),
+    }
+    if char_widths_dict is not None:
+        key_parts['char_widths'] = sha256_of_char_widths(char_widths_dict)
+    for name, placeholders in (
+        ('placeholders_for_global_replacement', imported_placeholders_for_global_replacement),
+        ('placeholders_for_2char_replacement', imported_placeholders_for_2char_replacement),
+        ('placeholders_for_local_replacement', imported_placeholders_for_local_replacement),
+    ):
+        if placeholders is not None:
+            key_parts[name] = sha256_of_placeholders(placeholders)
+    return sha256_of_text(json.dumps(key_parts, sort_keys=True))
+
+def build_stem_segmentation_state(
+    CSV_data_imported: pd.DataFrame,
+    pejvo_stem_json_path: str = DEFAULT_PEJVO_STEM_JSON_PATH,
+    root_list_path: str = DEFAULT_ROOT_LIST_PATH,
+    E_stem_with_Part_Of_Speech_list: Optional[List[List[str]]] = None,
+    previous_state: Optional[Dict] = None
+) -> Dict:
+    """
+    只做词根分解（第 1~5 步中与输出格式无关的部分），返回可传给 build_replacements_json 的 build_state。
+    词根的集合与优先顺序（按长度）不取决于 format_type，因此同一份分解结果可供所有格式共用。
+    传入另一份 CSV 的 previous_state 时，只重新分解受两份 CSV 词根差异影响的 stem（批量构建多种语言时使用）。
+    """
+    if E_stem_with_Part_Of_Speech_list is None:
+        with open(pejvo_stem_json_path, "r", encoding="utf-8") as g:
+            E_stem_with_Part_Of_Speech_list = json.load(g)
+    roots = {}
+    with open(root_list_path, 'r', encoding='utf-8') as file:
+        for E_root in file.readlines():
+            E_root = E_root.strip()
+            if not E_root.isdigit():
+                roots[E_root] = None
+    for E_root in csv_root_translation_dict(CSV_data_imported):
+        roots[E_root] = None
+    # 与 build_replacements_json 第 3 步相同：按长度从大到小稳定排序
+    replacements = [(E_root, E_root, '') for E_root in sorted(roots, key=len, reverse=True)]
+    build_state = dict(previous_state) if previous_state is not None else {}
+    build_pre_replacements_dict_incrementally(
+        E_stem_with_Part_Of_Speech_list, replacements, build_root_trie(replacements), build_state
+    )
+    build_state.pop('resegmented_stem_count', None)
+    return build_state
+
+# 多格式构建时，各 worker 进程共用的输入（由 init_multi_format_worker 在进程启动时设置一次）
+_multi_format_shared_inputs = None
+
+def init_multi_format_worker(shared_inputs: Dict):
+    global _multi_format_shared_inputs
+    _multi_format_shared_inputs = shared_inputs
+
+def build_replacements_json_for_batch_job(job_index: int) -> Tuple[int, Dict, float]:
+    """
+    在 worker 中构建批量任务 shared_inputs['jobs'][job_index]（(CSV 路径, format_type)），返回 (序号, 结果, 耗时秒数)。
+    """
+    shared_inputs = _multi_format_shared_inputs
+    csv_path, format_type = shared_inputs['jobs'][job_index]
+    csv_inputs = shared_inputs['csv_inputs'][csv_path]
+    start_time = time.perf_counter()
+    combined_data = build_replacements_json(
+        csv_inputs['CSV_data_imported'],
+        shared_inputs['custom_stemming_setting_list'],
+        shared_inputs['user_replacement_item_setting_list'],
+        format_type,
+        shared_inputs['char_widths_dict'],
+        shared_inputs['imported_placeholders_for_global_replacement'],
+        shared_inputs['imported_placeholders_for_2char_replacement'],
+        shared_inputs['imported_placeholders_for_local_replacement'],
+        case_insensitive_matching=shared_inputs['case_insensitive_matching'],
+        native_word_boundaries=shared_inputs['native_word_boundaries'],
+        build_state=dict(csv_inputs['segmentation_state']),
+        E_stem_with_Part_Of_Speech_list=shared_inputs['E_stem_with_Part_Of_Speech_list']
+    )
+    return job_index, combined_data, time.perf_counter() - start_time
+
+def build_replacements_json_for_format(format_type: str) -> Tuple[str, Dict]:
+    """
+    在 worker 中按共用的输入和词根分解结果，构建一种 format_type 的 JSON。
+    """
+    shared_inputs = _multi_format_shared_inputs
+    return format_type, build_replacements_json(
+        shared_inputs['CSV_data_imported'],
+        shared_inputs['custom_stemming_setting_list'],
+        shared_inputs['user_replacement_item_setting_list'],
+        format_type,
+        shared_inputs['char_widths_dict'],
+        shared_inputs['imported_placeholders_for_global_replacement'],
+        shared_inputs['imported_placeholders_for_2char_replacement'],
+        shared_inputs['imported_placeholders_for_local_replacement'],
+        case_insensitive_matching=shared_inputs['case_insensitive_matching'],
+        native_word_boundaries=shared_inputs['native_word_boundaries'],
+        build_state=dict(shared_inputs['segmentation_state'])
+    )
+
+def build_replacements_json_all_formats(
+    csv_text: str,
+    custom_stemming_setting_list: List,
+    user_replacement_item_setting_list: List,
+    format_types: Optional[List[str]] = None,
+    char_widths_dict: Optional[Dict[str, int]] = None,
+    imported_placeholders_for_global_replacement: Optional[List[str]] = None,
+    imported_placeholders_for_2char_replacement: Optional[List[str]] = None,
+    imported_placeholders_for_local_replacement: Optional[List[str]] = None,
+    case_insensitive_matching: bool = False,
+    native_word_boundaries: bool = False,
+    num_processes: int = 1
+) -> Dict[str, Dict]:
+    """
+    一次构建多种 format_type（默认全部 7 种）的 JSON，返回 {format_type: 合并后的字典}。
+    词根分解（最耗时、且与格式无关）只做一次；之后各格式的渲染、优先级调整与词尾扩展
+    （其中会比较渲染后的字符串，因此按格式分别进行）在 num_processes 个进程中并行。
+    每种格式的结果与单独用 build_replacements_json 构建时完全相同。
+    """
+    if format_types is None:
+        format_types = FORMAT_TYPES
+    (char_widths_dict,
+     imported_placeholders_for_global_replacement,
+     imported_placeholders_for_2char_replacement,
+     imported_placeholders_for_local_replacement) = load_default_build_resources(
+        char_widths_dict,
+        imported_placeholders_for_global_replacement,
+        imported_placeholders_for_2char_replacement,
+        imported_placeholders_for_local_replacement
+    )
+    CSV_data_imported = read_csv_for_replacement(csv_text)
+    shared_inputs = {
+        'CSV_data_imported': CSV_data_imported,
+        'custom_stemming_setting_list': custom_stemming_setting_list,
+        'user_replacement_item_setting_list': user_replacement_item_setting_list,
+        'char_widths_dict': char_widths_dict,
+        'imported_placeholders_for_global_replacement': imported_placeholders_for_global_replacement,
+        'imported_placeholders_for_2char_replacement': imported_placeholders_for_2char_replacement,
+        'imported_placeholders_for_local_replacement': imported_placeholders_for_local_replacement,
+        'case_insensitive_matching': case_insensitive_matching,
+        'native_word_boundaries': native_word_boundaries,
+        'segmentation_state': build_stem_segmentation_state(CSV_data_imported),
+    }
+
+    num_processes = max(1, min(num_processes, len(format_types)))
+    if num_processes == 1:
+        init_multi_format_worker(shared_inputs)
+        try:
+            results = [build_replacements_json_for_format(format_type) for format_type in format_types]
+        finally:
+            init_multi_format_worker(None)
+    else:
+        with multiprocessing.Pool(num_processes, initializer=init_multi_format_worker, initargs=(shared_inputs,)) as pool:
+            results = pool.map(build_replacements_json_for_format, format_types)
+    return dict(results)
+
+def count_resegmented_stems(previous_state: Optional[Dict], segmentation_state: Dict) -> int:
+    """
+    两份分解结果之间分解位置不同的 stem 数（批量构建报告用；previous_state 为 None 时为全部 stem 数）。
+    """
+    if previous_state is None:
+        return len(segmentation_state['stem_spans'])
+    previous_stem_spans = previous_state['stem_spans']
+    return sum(1 for stem, spans in segmentation_state['stem_spans'].items() if previous_stem_spans.get(stem) != spans)
+
+def build_replacements_json_batch(
+    jobs: List[Tuple[str, str]],
+    custom_stemming_setting_list: List,
+    user_replacement_item_setting_list: List,
+    char_widths_dict: Optional[Dict[str, int]] = None,
+    imported_placeholders_for_global_replacement: Optional[List[str]] = None,
+    imported_placeholders_for_2char_replacement: Optional[List[str]] = None,
+    imported_placeholders_for_local_replacement: Optional[List[str]] = None,
+    case_insensitive_matching: bool = False,
+    native_word_boundaries: bool = False,
+    num_processes: int = 1,
+    result_callback: Optional[Callable[[int, Dict, Dict], None]] = None
+) -> List[Dict]:
+    """
+    批量构建多种语言（CSV）× 格式的 JSON。jobs 为 [(CSV 路径, format_type), ...]。
+    与 CSV 无关的部分（PEJVO 列表、自定义设置、placeholder、文字宽度表）只读取一次；
+    每个 CSV 的词根分解只做一次，第二个以后的 CSV 从前一个的分解结果增量求得；
+    各任务在 num_processes 个进程中并行构建。
+    每完成一个任务调用 result_callback(序号, 结果, 报告)（例如用于写出文件，避免所有结果同时留在内存中）。
+    返回按 jobs 顺序排列的报告列表：CSV、格式、各列表条数（格式无关时为基本行数，见 count_rule_data_rows）、重新分解的 stem 数、耗时。
+    """
+    (char_widths_dict,
+     imported_placeholders_for_global_replacement,
+     imported_placeholders_for_2char_replacement,
+     imported_placeholders_for_local_replacement) = load_default_build_resources(
+        char_widths_dict,
+        imported_placeholders_for_global_replacement,
+        imported_placeholders_for_2char_replacement,
+        imported_placeholders_for_local_replacement
+    )
+    with open(DEFAULT_PEJVO_STEM_JSON_PATH, "r", encoding="utf-8") as g:
+        E_stem_with_Part_Of_Speech_list = json.load(g)
+
+    csv_inputs = {}
+    previous_state = None
+    for csv_path, _format_type in jobs:
+        if csv_path in csv_inputs:
+            continue
+        with open(csv_path, 'r', encoding='utf-8') as f:
+            CSV_data_imported = read_csv_for_replacement(f.read())
+        segmentation_state = build_stem_segmentation_state(
+            CSV_data_imported,
+            E_stem_with_Part_Of_Speech_list=E_stem_with_Part_Of_Speech_list,
+            previous_state=previous_state
+        )
+        csv_inputs[csv_path] = {
+            'CSV_data_imported': CSV_data_imported,
+            'segmentation_state': segmentation_state,
+            'resegmented_stem_count': count_resegmented_stems(previous_state, segmentation_state),
+        }
+        previous_state = segmentation_state
+
+    shared_inputs = {
+        'jobs': list(jobs),
+        'csv_inputs': csv_inputs,
+        'E_stem_with_Part_Of_Speech_list': E_stem_with_Part_Of_Speech_list,
+        'custom_stemming_setting_list': custom_stemming_setting_list,
+        'user_replacement_item_setting_list': user_replacement_item_setting_list,
+        'char_widths_dict': char_widths_dict,
+        'imported_placeholders_for_global_replacement': imported_placeholders_for_global_replacement,
+        'imported_placeholders_for_2char_replacement': imported_placeholders_for_2char_replacement,
+        'imported_placeholders_for_local_replacement': imported_placeholders_for_local_replacement,
+        'case_insensitive_matching': case_insensitive_matching,
+        'native_word_boundaries': native_word_boundaries,
+    }
+
+    reports = [None] * len(jobs)
+    def collect(job_index: int, combined_data: Dict, elapsed: float):
+        csv_path, format_type = jobs[job_index]
+        final_count, two_char_count, localized_count = count_rule_data_rows(combined_data)
+        reports[job_index] = {
+            'csv_path': csv_path,
+            'format_type': format_type,
+            'replacements_final_list': final_count,
+            'replacements_list_for_2char': two_char_count,
+            'replacements_list_for_localized_string': localized_count,
+            'resegmented_stem_count': csv_inputs[csv_path]['resegmented_stem_count'],
+            'seconds': round(elapsed, 2),
+        }
+        if result_callback is not None:
+            result_callback(job_index, combined_data, reports[job_index])
+
+    num_processes = max(1, min(num_processes, len(jobs)))
+    if num_processes == 1:
+        init_multi_format_worker(shared_inputs)
+        try:
+            for job_index in range(len(jobs)):
+                collect(*build_replacements_json_for_batch_job(job_index))
+        finally:
+            init_multi_format_worker(None)
+    else:
+        with multiprocessing.Pool(num_processes, initializer=init_multi_format_worker, initargs=(shared_inputs,)) as pool:
+            for result in pool.imap_unordered(build_replacements_json_for_batch_job, range(len(jobs))):
+                collect(*result)
+    return reports
+
+def load_default_build_resources(
+    char_widths_dict: Optional[Dict[str, int]],
+    imported_placeholders_for_global_replacement: Optional[List[str]],
+    imported_placeholders_for_2char_replacement: Optional[List[str]],
+    imported_placeholders_for_local_replacement: Optional[List[str]]
+) -> Tuple[Dict[str, int], List[str], List[str], List[str]]:
+    """
+    为 None 的参数从默认文件读取（文字宽度表（优先使用二进制版）、三种 placeholder）。
+    """
+    if char_widths_dict is None:
+        if os.path.exists(DEFAULT_CHAR_WIDTHS_BIN_PATH):
+            char_widths_dict = load_char_width_table(DEFAULT_CHAR_WIDTHS_BIN_PATH)
+        else:
+            with open(DEFAULT_CHAR_WIDTHS_JSON_PATH, 'r', encoding='utf-8') as fp:
+                char_widths_dict = json.load(fp)
+    if imported_placeholders_for_global_replacement is None:
+        imported_placeholders_for_global_replacement = import_placeholders(DEFAULT_PLACEHOLDERS_FOR_GLOBAL_REPLACEMENT_PATH)
+    if imported_placeholders_for_2char_replacement is None:
+        imported_placeholders_for_2char_replacement = import_placeholders(DEFAULT_PLACEHOLDERS_FOR_2CHAR_REPLACEMENT_PATH)
+    if imported_placeholders_for_local_replacement is None:
+        imported_placeholders_for_local_replacement = import_placeholders(DEFAULT_PLACEHOLDERS_FOR_LOCAL_REPLACEMENT_PATH)
+    return (char_widths_dict,
+            imported_placeholders_for_global_replacement,
+            imported_placeholders_for_2char_replacement,
+            imported_placeholders_for_local_replacement)
+
+def write_json_atomically(data, file_path: str):
+    """
+    先写入临时文件再 os.replace，避免中途中断时留下不完整的缓存文件。
+    """
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, file_path)
+
+# 输出的压缩方式 → 文件扩展名（读取端见 esp_text_replacement_module.load_rule_file，按 magic number 自动识别）
+JSON_OUTPUT_COMPRESSIONS = {'none': '.json', 'gzip': '.json.gz', 'zstd': '.json.zst'}
+# 流式写出时每次写入的规则条数
+JSON_STREAM_WRITE_BATCH_SIZE = 2000
+
+def iter_replacements_json_chunks(combined_data: Dict, compact: bool = True) -> Iterator[str]:
+    """
+    把 combined_data 逐段转为 JSON 文本（列表型的值每 JSON_STREAM_WRITE_BATCH_SIZE 条生成一段），
+    不在内存中生成整个 JSON 字符串。
+    拼接结果与 json.dumps(combined_data, ensure_ascii=False, separators=(',', ':'))（compact=True）
+    或 json.dumps(combined_data, ensure_ascii=False, indent=2)（compact=False）完全相同。
+    """
+    if compact:
+        dumps = lambda value: json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+        key_prefix, key_separator, item_prefix, list_suffix, dict_suffix = '', ':', '', ']', '}'
+    else:
+        dumps = lambda value: json.dumps(value, ensure_ascii=False, indent=2).replace('\n', '\n    ')
+        key_prefix, key_separator, item_prefix, list_suffix, dict_suffix = '\n  ', ': ', '\n    ', '\n  ]', '\n}'
+    if not combined_data:
+        yield '{}'
+        return
+    yield '{'
+    for key_index, (key, value) in enumerate(combined_data.items()):
+        head = (',' if key_index else '') + key_prefix + json.dumps(key, ensure_ascii=False) + key_separator
+        if not isinstance(value, list) or not value:
+            yield head + (dumps(value) if compact else json.dumps(value, ensure_ascii=False, indent=2).replace('\n', '\n  '))
+            continue
+        yield head + '['
+        for start in range(0, len(value), JSON_STREAM_WRITE_BATCH_SIZE):
+            batch = value[start:start + JSON_STREAM_WRITE_BATCH_SIZE]
+            yield (',' if start else '') + item_prefix + (',' + item_prefix).join(dumps(item) for item in batch)
+        yield list_suffix
+    yield dict_suffix
+
+def write_replacements_json_to_stream(
+    combined_data: Dict,
+    binary_stream,
+    compression: str = 'none',
+    compact: bool = True
+):
+    """
+    把 combined_data 以 UTF-8 JSON 流式写入二进制流 binary_stream（不关闭 binary_stream）。
+    compression: 'none' / 'gzip' / 'zstd'（见 JSON_OUTPUT_COMPRESSIONS）。
+    """
+    if compression not in JSON_OUTPUT_COMPRESSIONS:
+        raise ValueError(f"未知的压缩方式: {compression}")
+    if compression == 'gzip':
+        compressed_stream = gzip.GzipFile(fileobj=binary_stream, mode='wb', mtime=0)
+    elif compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstd 压缩需要安装 zstandard（pip install zstandard）")
+        compressed_stream = zstandard.ZstdCompressor().stream_writer(binary_stream, closefd=False)
+    else:
+        compressed_stream = None
+    text_stream = io.TextIOWrapper(compressed_stream or binary_stream, encoding='utf-8', newline='')
+    try:
+        text_stream.writelines(iter_replacements_json_chunks(combined_data, compact))
+        text_stream.flush()
+    finally:
+        # 先关闭压缩流（写出尾部），同时避免 TextIOWrapper 关闭调用方的 binary_stream
+        text_stream.detach()
+        if compressed_stream is not None:
+            compressed_stream.close()
+
+def write_replacements_json(
+    combined_data: Dict,
+    file_path: str,
+    compression: Optional[str] = None,
+    compact: bool = True
+):
+    """
+    把 combined_data 流式写入 file_path（先写临时文件再 os.replace）。
+    compression 为 None 时按扩展名判断（.gz → gzip，.zst → zstd，其余不压缩）。
+    """
+    if compression is None:
+        compression = 'gzip' if file_path.endswith('.gz') else 'zstd' if file_path.endswith('.zst') else 'none'
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        write_replacements_json_to_stream(combined_data, f, compression, compact)
+    os.replace(tmp_path, file_path)
+
+def encode_replacements_json(combined_data: Dict, compression: str = 'none', compact: bool = True) -> bytes:
+    """
+    返回 combined_data 的（压缩后）JSON 字节串，用于下载按钮等需要 bytes 的场合。
+    压缩时内存中只保留压缩后的数据。
+    """
+    buffer = io.BytesIO()
+    write_replacements_json_to_stream(combined_data, buffer, compression, compact)
+    return buffer.getvalue()
+
+def build_replacements_json_cached(
+    csv_text: str,
+    custom_stemming_setting_list: List,
+    user_replacement_item_setting_list: List,
+    format_type: str,
+    char_widths_dict: Optional[Dict[str, int]] = None,
+    imported_placeholders_for_global_replacement: Optional[List[str]] = None,
+    imported_placeholders_for_2char_replacement: Optional[List[str]] = None,
+    imported_placeholders_for_local_replacement: Optional[List[str]] = None,
+    use_parallel: bool = False,
+    num_processes: int = 4,
+    case_insensitive_matching: bool = False,
+    native_word_boundaries: bool = False,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    cache_dir: Optional[str] = DEFAULT_BUILD_CACHE_DIR
+) -> Tuple[Dict, bool]:
+    """
+    带磁盘缓存的 build_replacements_json。
+    以 compute_build_cache_key 的结果为文件名，把构建结果保存在 cache_dir 中；
+    输入（含文字宽度表与三种 placeholder）完全相同时直接读取缓存。返回 (合并后的字典, 是否命中缓存)。
+    cache_dir=None 时不使用缓存。
+    char_widths_dict / placeholder 列表省略时，从默认文件读取。
+    """
+    (char_widths_dict,
+     imported_placeholders_for_global_replacement,
+     imported_placeholders_for_2char_replacement,
+     imported_placeholders_for_local_replacement) = load_default_build_resources(
+        char_widths_dict,
+        imported_placeholders_for_global_replacement,
+        imported_placeholders_for_2char_replacement,
+        imported_placeholders_for_local_replacement
+    )
+
+    cache_path = None
+    if cache_dir is not None:
+        cache_key = compute_build_cache_key(
+            csv_text, custom_stemming_setting_list, user_replacement_item_setting_list, format_type,
+            case_insensitive_matching, native_word_boundaries,
+            char_widths_dict=char_widths_dict,
+            imported_placeholders_for_global_replacement=imported_placeholders_for_global_replacement,
+            imported_placeholders_for_2char_replacement=imported_placeholders_for_2char_replacement,
+            imported_placeholders_for_local_replacement=imported_placeholders_for_local_replacement
+        )
+        cache_path = os.path.join(cache_dir, cache_key + '.json')
+        if os.path.exists(cache_path):
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f), True
+
+    combined_data = build_replacements_json(
+        read_csv_for_replacement(csv_text),
+        custom_stemming_setting_list,
+        user_replacement_item_setting_list,
+        format_type,
+        char_widths_dict,
+        imported_placeholders_for_global_replacement,
+        imported_placeholders_for_2char_replacement,
+        imported_placeholders_for_local_replacement,
+        use_parallel=use_parallel,
+        num_processes=num_processes,
+        case_insensitive_matching=case_insensitive_matching,
+        native_word_boundaries=native_word_boundaries,
+        progress_callback=progress_callback
+    )
+
+    if cache_path is not None:
+        write_json_atomically(combined_data, cache_path)
+    return combined_data, False
+
+def build_replacements_json_incremental(
+    csv_text: str,
+    custom_stemming_setting_list: List,
+    user_replacement_item_setting_list: List,
+    format_type: str,
+    char_widths_dict: Optional[Dict[str, int]] = None,
+    imported_placeholders_for_global_replacement: Optional[List[str]] = None,
+    imported_placeholders_for_2char_replacement: Optional[List[str]] = None,
+    imported_placeholders_for_local_replacement: Optional[List[str]] = None,
+    case_insensitive_matching: bool = False,
+    native_word_boundaries: bool = False,
+    cache_dir: str = DEFAULT_BUILD_CACHE_DIR
+) -> Tuple[Dict, Dict]:
+    """
+    增量构建：与同一配置（两个自定义 JSON、format_type、选项、词典数据、代码版本）下上次构建的 CSV 比较，
+    只对受修改影响的 stem 重新做词根分解，其余 stem 沿用上次的分解结果。
+    第 6 步以后的优先级调整、二文字词根列表、局部替换列表会互相参照相邻的词条（例如 i+'an' 是否存在），
+    因此按新的分解结果重新生成；placeholder 仍按排序后的顺序分配，结果与完整构建完全相同。
+    返回 (合并后的字典, 报告)，报告包含 CSV 的增/删/改行数和重新分解的 stem 数。
+    """
+    state_key = compute_build_cache_key(
+        csv_text, custom_stemming_setting_list, user_replacement_item_setting_list, format_type,
+        case_insensitive_matching, native_word_boundaries, include_csv=False
+    )
+    state_path = os.path.join(cache_dir, 'incremental_state_' + state_key + '.json')
+
+    build_state = {}
+    if os.path.exists(state_path):
+        with open(state_path, 'r', encoding='utf-8') as f:
+            build_state = json.load(f)
+    previous_build_found = bool(build_state)
+    previous_csv_rows = build_state.get('csv_rows', {})
+
+    (char_widths_dict,
+     imported_placeholders_for_global_replacement,
+     imported_placeholders_for_2char_replacement,
+     imported_placeholders_for_local_replacement) = load_default_build_resources(
+        char_widths_dict,
+        imported_placeholders_for_global_replacement,
+        imported_placeholders_for_2char_replacement,
+        imported_placeholders_for_local_replacement
+    )
+
+    combined_data = build_replacements_json(
+        read_csv_for_replacement(csv_text),
+        custom_stemming_setting_list,
+        user_replacement_item_setting_list,
+        format_type,
+        char_widths_dict,
+        imported_placeholders_for_global_replacement,
+        imported_placeholders_for_2char_replacement,
+        imported_placeholders_for_local_replacement,
+        case_insensitive_matching=case_insensitive_matching,
+        native_word_boundaries=native_word_boundaries,
+        build_state=build_state
+    )
+
+    csv_rows = build_state['csv_rows']
+    report = {
+        'previous_build_found': previous_build_found,
+        'added_rows': sum(1 for root in csv_rows if root not in previous_csv_rows),
+        'removed_rows': sum(1 for root in previous_csv_rows if root not in csv_rows),
+        'changed_rows': sum(1 for root, translation in csv_rows.items()
+                            if root in previous_csv_rows and previous_csv_rows[root] != translation),
+        'resegmented_stem_count': build_state.pop('resegmented_stem_count'),
+    }
+    write_json_atomically(build_state, state_path)
+    return combined_data, report
+
+# ================================
+# 9) 命令行入口
+# ================================
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    不经过 Streamlit 页面、直接在命令行构建替换用 JSON（可用于脚本或 CI）。
+    例：python esp_replacement_json_make_module.py --format-type HTML格式 --output 替换用.json
+    """
+    parser = argparse.ArgumentParser(description="构建世界语文本(汉字)替换用的 JSON 文件（合并3个JSON文件）")
+    parser.add_argument('--format-type', choices=FORMAT_TYPES + [FORMAT_INDEPENDENT_TYPE], help="输出格式（与 main.py 中的选项相同）")
+    parser.add_argument('--output', help="输出 JSON 文件路径")
+    parser.add_argument('--csv', default=DEFAULT_CSV_PATH, help="世界语词根 - 翻译 CSV 文件")
+    parser.add_argument('--stemming-json', default=DEFAULT_STEMMING_SETTING_JSON_PATH, help="词根分解法自定义 JSON")
+    parser.add_argument('--replacement-json', default=DEFAULT_REPLACEMENT_SETTING_JSON_PATH, help="替换后文字自定义 JSON")
+    parser.add_argument('--global-placeholders', default=DEFAULT_PLACEHOLDERS_FOR_GLOBAL_REPLACEMENT_PATH, help="全域替换用占位符文件")
+    parser.add_argument('--2char-placeholders', dest='two_char_placeholders', default=DEFAULT_PLACEHOLDERS_FOR_2CHAR_REPLACEMENT_PATH, help="二文字词根替换用占位符文件")
+    parser.add_argument('--local-placeholders', default=DEFAULT_PLACEHOLDERS_FOR_LOCAL_REPLACEMENT_PATH, help="局部文字替换用占位符文件")
+    parser.add_argument('--processes', type=int, default=1, help="并行进程数（1 表示不并行）")
+    parser.add_argument('--case-insensitive', action='store_true', help="大小写不敏感匹配（只保存小写规则）")
+    parser.add_argument('--word-boundaries', action='store_true', help="使用词边界约束代替空格填充")
+    parser.add_argument('--cache-dir', default=DEFAULT_BUILD_CACHE_DIR, help="构建缓存目录")
+    parser.add_argument('--no-cache', action='store_true', help="不使用构建缓存")
+    parser.add_argument('--incremental', action='store_true', help="增量构建（只重新分解受 CSV 修改影响的词根；与 --processes 不同时使用）")
+    parser.add_argument('--all-formats', metavar='OUTPUT_DIR',
+                        help="一次构建全部 7 种格式，输出到该目录（词根分解只做一次，--processes 指定并行进程数）")
+    parser.add_argument('--batch-job', nargs=2, action='append', metavar=('CSV', 'FORMAT_TYPE'),
+                        help="批量构建任务（可重复指定）；结果写入 --output-dir")
+    parser.add_argument('--batch-shipped-csvs', metavar='FORMAT_TYPE', choices=FORMAT_TYPES + [FORMAT_INDEPENDENT_TYPE],
+                        help="用该格式批量构建仓库中所有语言的 CSV；结果写入 --output-dir")
+    parser.add_argument('--output-dir', default='.', help="批量构建的输出目录")
+    parser.add_argument('--compact', action='store_true', help="输出紧凑 JSON（不缩进、不换行）")
+    parser.add_argument('--compression', choices=list(JSON_OUTPUT_COMPRESSIONS),
+                        help="输出的压缩方式（默认：--output 按扩展名 .gz/.zst 判断，目录输出不压缩）")
+    parser.add_argument('--convert-char-widths', action='store_true',
+                        help="只把文字宽度 JSON 转换为二进制宽度表（%s）后退出" % DEFAULT_CHAR_WIDTHS_BIN_PATH)
+    args = parser.parse_args(argv)
+
+    if args.convert_char_widths:
+        convert_char_widths_json_to_binary(DEFAULT_CHAR_WIDTHS_JSON_PATH, DEFAULT_CHAR_WIDTHS_BIN_PATH)
+        print(f"已生成 {DEFAULT_CHAR_WIDTHS_BIN_PATH}")
+        return 0
+    batch_jobs = [tuple(job) for job in (args.batch_job or [])]
+    if args.batch_shipped_csvs is not None:
+        batch_jobs += [(csv_path, args.batch_shipped_csvs) for csv_path in SHIPPED_ROOT_CSV_PATHS]
+    for _csv_path, format_type in batch_jobs:
+        if format_type not in FORMAT_TYPES and format_type != FORMAT_INDEPENDENT_TYPE:
+            parser.error(f"未知的 format_type: {format_type}")
+    if not batch_jobs and args.all_formats is None and (args.format_type is None or args.output is None):
+        parser.error("构建时需要指定 --format-type 和 --output（或 --all-formats / --batch-job / --batch-shipped-csvs）")
+
+    with open(args.csv, 'r', encoding='utf-8') as f:
+        csv_text = f.read()
+    with open(args.stemming_json, 'r', encoding='utf-8') as f:
+        custom_stemming_setting_list = json.load(f)
+    with open(args.replacement_json, 'r', encoding='utf-8') as f:
+        user_replacement_item_setting_list = json.load(f)
+
+    placeholder_kwargs = dict(
+        imported_placeholders_for_global_replacement=import_placeholders(args.global_placeholders),
+        imported_placeholders_for_2char_replacement=import_placeholders(args.two_char_placeholders),
+        imported_placeholders_for_local_replacement=import_placeholders(args.local_placeholders)
+    )
+    output_extension = JSON_OUTPUT_COMPRESSIONS[args.compression or 'none']
+    if batch_jobs:
+        os.makedirs(args.output_dir, exist_ok=True)
+        def write_batch_result(job_index, combined_data, report):
+            csv_name = os.path.splitext(os.path.basename(report['csv_path']))[0]
+            report['output_path'] = os.path.join(args.output_dir, f"{csv_name}_{report['format_type']}{output_extension}")
+            write_replacements_json(combined_data, report['output_path'], args.compression or 'none', args.compact)
+
+        reports = build_replacements_json_batch(
+            batch_jobs,
+            custom_stemming_setting_list,
+            user_replacement_item_setting_list,
+            case_insensitive_matching=args.case_insensitive,
+            native_word_boundaries=args.word_boundaries,
+            num_processes=args.processes,
+            result_callback=write_batch_result,
+            **placeholder_kwargs
+        )
+        print("批量构建完成：")
+        for report in reports:
+            print(f"  {report['output_path']}：全域 {report['replacements_final_list']} 条，"
+                  f"二文字词根 {report['replacements_list_for_2char']} 条，局部 {report['replacements_list_for_localized_string']} 条，"
+                  f"重新分解 {report['resegmented_stem_count']} 个 stem，{report['seconds']} 秒"
+                  f"{'（格式无关，基本行）' if report['format_type'] == FORMAT_INDEPENDENT_TYPE else ''}")
+        return 0
+
+    if args.all_formats is not None:
+        all_format_data = build_replacements_json_all_formats(
+            csv_text,
+            custom_stemming_setting_list,
+            user_replacement_item_setting_list,
+            case_insensitive_matching=args.case_insensitive,
+            native_word_boundaries=args.word_boundaries,
+            num_processes=args.processes,
+            **placeholder_kwargs
+        )
+        os.makedirs(args.all_formats, exist_ok=True)
+        for format_type, combined_data in all_format_data.items():
+            output_path = os.path.join(args.all_formats, f"世界语文本替换用_合并3个JSON文件_{format_type}{output_extension}")
+            write_replacements_json(combined_data, output_path, args.compression or 'none', args.compact)
+            print(f"已生成 {output_path}")
+        return 0
+
+    if args.incremental:
+        combined_data, report = build_replacements_json_incremental(
+            csv_text,
+            custom_stemming_setting_list,
+            user_replacement_item_setting_list,
+            args.format_type,
+            case_insensitive_matching=args.case_insensitive,
+            native_word_boundaries=args.word_boundaries,
+            cache_dir=args.cache_dir,
+            **placeholder_kwargs
+        )
+        cache_hit = False
+        print(f"增量构建：CSV 新增 {report['added_rows']} 行，删除 {report['removed_rows']} 行，"
+              f"修改 {report['changed_rows']} 行；重新分解 {report['resegmented_stem_count']} 个 stem"
+              f"{'' if report['previous_build_found'] else '（没有上次的构建状态，已完整构建）'}")
+    else:
+        combined_data, cache_hit = build_replacements_json_cached(
+            csv_text,
+            custom_stemming_setting_list,
+            user_replacement_item_setting_list,
+            args.format_type,
+            use_parallel=args.processes > 1,
+            num_processes=args.processes,
+            case_insensitive_matching=args.case_insensitive,
+            native_word_boundaries=args.word_boundaries,
+            cache_dir=None if args.no_cache else args.cache_dir,
+            **placeholder_kwargs
+        )
+    write_replacements_json(combined_data, args.output, args.compression, args.compact)
+
+    final_count, two_char_count, localized_count = count_rule_data_rows(combined_data)
+    print(f"{'(缓存命中) ' if cache_hit else ''}已生成 {args.output}："
+          f"全域 {final_count} 条，二文字词根 {two_char_count} 条，局部 {localized_count} 条"
+          f"{'（格式无关，基本行）' if is_format_independent_rule_data(combined_data) else ''}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,6 +8,12 @@ esp_text_replacement_module.py
 3. safe_replace()：使用 placeholder（占位符）进行安全替换
 4. orchestrate_comprehensive_esperanto_text_replacement()：综合替换流程的核心函数
 5. parallel_process()：使用多进程来并行处理长文本
+6. load_rule_file() / load_rule_file_streaming()：读取替换规则 JSON（支持 gzip / zstd 压缩、逐条流式读取）
+7. CompactRuleList：节省内存的规则存储（可直接代替规则列表传给 4)、5) 的函数）
+8. build_text_ir() / render_text_ir()：先得到匹配结果的中间表示（token 列表），再按输出格式渲染
+9. ParagraphResultCache：段落转换结果的磁盘缓存（SQLite，LRU），4)、5) 的函数可以先在其中查找
+10. convert_many() / convert_series() / convert_dataframe()：批量转换大量短文本（共用词汇表，可并行，保持输入顺序）
+11. ProcessTreeRssSampler / limit_worker_count()：测量主进程和子进程的内存，按内存预算减少并行进程数
 
 代码大体结构：
 - 定义若干世界语字符转换的字典（如 x_to_circumflex 等）
@@ -18,9 +24,20 @@ esp_text_replacement_module.py
 """
 
 import re
+import io
+import os
+import sys
+import gzip
 import json
-from typing import List, Tuple, Dict
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import List, Tuple, Dict, Optional, Callable
 import multiprocessing
+from array import array
+from collections.abc import Sequence
+from contextlib import contextmanager
 
 # ================================
 # 1) 世界语字符转换相关的字典
@@ -52,6 +69,19 @@ def replace_esperanto_chars(text, char_dict: Dict[str, str]) -> str:
         text = text.replace(original_char, converted_char)
     return text
 
+# 输出时的字母形式（与 main.py 中的选项相同）；'x 形式' 不做转换
+LETTER_TYPE_CONVERSIONS = {
+    '上标形式': (x_to_circumflex, hat_to_circumflex),
+    '^形式': (x_to_hat, circumflex_to_hat),
+}
+def apply_letter_type(text: str, letter_type: Optional[str]) -> str:
+    """
+    把转换结果中的世界语字母改为 letter_type 指定的形式（上标形式 / ^形式）。
+    """
+    for char_dict in LETTER_TYPE_CONVERSIONS.get(letter_type, ()):
+        text = replace_esperanto_chars(text, char_dict)
+    return text
+
 def convert_to_circumflex(text: str) -> str:
     """
     将给定文本中的世界语特殊字母统一转换为字上符形式（ĉ, ĝ, ĥ, ĵ, ŝ, ŭ等）。
@@ -61,33 +91,256 @@ def convert_to_circumflex(text: str) -> str:
     text = replace_esperanto_chars(text, x_to_circumflex)
     return text
 
+HALFWIDTH_SPACES = "\u00A0\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200A"
+HALFWIDTH_SPACE_PATTERN = re.compile(f"[{HALFWIDTH_SPACES}]")
 def unify_halfwidth_spaces(text: str) -> str:
     """
     将文本中的各种半角空白（如 \u00A0, \u2002 等）统一为 ASCII 标准半角空格 (U+0020)。
     不处理全角空格 (U+3000)。
     """
-    pattern = r"[\u00A0\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200A]"
-    return re.sub(pattern, " ", text)
+    return HALFWIDTH_SPACE_PATTERN.sub(" ", text)
+
+# 换行符、或 2 个以上连续的半角空格
+# （各种特殊半角空白已在替换前由 unify_halfwidth_spaces 统一；规则的替换后文字中有意使用的 NBSP（U+00A0）等不在此处改变）
+HTML_EMIT_PATTERN = re.compile(r"\n| {2,}")
+def emit_html_text(text: str) -> str:
+    """
+    HTML 输出用的收尾处理（一次扫描完成）：
+      - 换行符 -> "<br>\n"
+      - 连续空格 -> &nbsp;（与旧实现相同：先按 3 个一组、再按 2 个一组替换，余下的单个空格保持原样）
+    结果逐段写入 io.StringIO，避免每一步都生成一份完整的新字符串。
+    """
+    buffer = io.StringIO()
+    last_end = 0
+    for match in HTML_EMIT_PATTERN.finditer(text):
+        start, end = match.span()
+        buffer.write(text[last_end:start])
+        if text[start] == "\n":
+            buffer.write("<br>\n")
+        else:
+            n = end - start
+            buffer.write("&nbsp;" * (n - 1 if n % 3 == 1 else n))
+            if n % 3 == 1:
+                buffer.write(" ")
+        last_end = end
+    buffer.write(text[last_end:])
+    return buffer.getvalue()
+
+# -------------------------------
+# 大小写变体（大小写不敏感匹配用）
+# -------------------------------
+RUBY_PATTERN = re.compile(
+    r'^'
+    r'(.*?)'
+    r'(<ruby>)'
+    r'([^<]+)'
+    r'(<rt[^>]*>)'
+    r'([^<]*?(?:<br>[^<]*?){0,2})'
+    r'(</rt>)'
+    r'(</ruby>)?'
+    r'(.*)'
+    r'$'
+)
+def capitalize_ruby_and_rt(text: str) -> str:
+    """
+    把 <ruby>xxx<rt>yyy</rt></ruby> 中的 xxx 和 yyy 首字母大写；若没匹配到，就把整段做 text.capitalize()。
+    JSON 构建时生成首字母大写的规则、以及运行时的大小写变体都使用本函数，两者的结果因此逐字节相同。
+    """
+    def replacer(match):
+        g1, g2, g3, g4, g5, g6, g7, g8 = match.groups()
+        if g1.strip():
+            return g1.capitalize() + g2 + g3 + g4 + g5 + g6 + (g7 if g7 else '') + g8
+        else:
+            return g1 + g2 + g3.capitalize() + g4 + g5.capitalize() + g6 + (g7 if g7 else '') + g8
+
+    replaced_text = RUBY_PATTERN.sub(replacer, text)
+    if replaced_text == text:
+        replaced_text = text.capitalize()
+    return replaced_text
+
+# 规则两端用作边界标记的字符（' la ' 的空格、2字词根的 '$'）
+RULE_SENTINEL_CHARS = ' $'
+CASE_VARIANTS = ('lower', 'up', 'cap')
+PLACEHOLDER_CORE_PATTERN = re.compile(r'([$@%])(\d+)\1')
+
+def is_case_insensitive_rule(old: str) -> bool:
+    """
+    只有全小写、且含有可大写字符的 old 才按大小写不敏感方式匹配。
+    """
+    return old == old.lower() and old != old.upper()
+
+def apply_case_variant(s: str, variant: str) -> str:
+    """
+    生成 old 或 new 的大小写变体，与 JSON 构建页面原先生成的三种规则一致：
+      'lower' -> 原样；'up' -> s.upper()；
+      'cap'   -> 跳过开头的边界标记（空格、$）后做 capitalize_ruby_and_rt。
+    """
+    if variant == 'up':
+        return s.upper()
+    if variant == 'cap':
+        body = s.lstrip(RULE_SENTINEL_CHARS)
+        return s[:len(s) - len(body)] + capitalize_ruby_and_rt(body)
+    return s
+
+def case_variant_placeholder(placeholder: str, variant: str) -> str:
+    """
+    由基本 placeholder 生成大小写变体用的 placeholder（$123$ -> $123up$ / $123cap$）。
+    """
+    if variant == 'lower':
+        return placeholder
+    return PLACEHOLDER_CORE_PATTERN.sub(lambda m: m.group(1) + m.group(2) + variant + m.group(1), placeholder, count=1)
+
+# -------------------------------
+# 词边界约束
+# -------------------------------
+# 规则的第 4 个元素（可省略）：
+#   BOUNDARY_WORD_START -> 匹配位置前面必须是词边界（相当于旧规则 ' amo' 开头的空格）
+#   BOUNDARY_WORD_END   -> 匹配位置后面必须是词边界（相当于旧规则 'amu ' 末尾的空格）
+#   BOUNDARY_STANDALONE -> 两侧都必须是词边界（相当于旧规则 ' la '）
+# 与空格填充不同，文本开头/结尾、标点、换行也算作边界，而且不会“吃掉”相邻规则共用的空格。
+BOUNDARY_WORD_START = 'start'
+BOUNDARY_WORD_END = 'end'
+BOUNDARY_STANDALONE = 'standalone'
+# placeholder 由这些字符构成，它们代表已被替换的词根，因此不算作边界
+PLACEHOLDER_CHARS = '$@%'
+# URL、文件路径、标识符里连接各部分的字符。把它们当作词的一部分，
+# 以免 'example.com/la?x=1' 中的 'la' 被当作独立的词 la 替换。
+# '.' 同时是句末标点，仍算作边界，因此 'example.la' 这类域名后缀仍会被当作独立的词。
+WORD_JOINER_CHARS = '/?=&#_~'
+
+def is_word_char(ch: str) -> bool:
+    """
+    判断字符是否属于“词”的一部分（字母、数字、placeholder 字符、WORD_JOINER_CHARS）。
+    """
+    return ch.isalnum() or ch in PLACEHOLDER_CHARS or ch in WORD_JOINER_CHARS
+
+def satisfies_word_boundary(text: str, start: int, end: int, boundary: str) -> bool:
+    """
+    检查 text[start:end] 这一出现位置是否满足规则的词边界约束。
+    """
+    if not boundary:
+        return True
+    if boundary != BOUNDARY_WORD_END and start > 0 and is_word_char(text[start - 1]):
+        return False
+    if boundary != BOUNDARY_WORD_START and end < len(text) and is_word_char(text[end]):
+        return False
+    return True
+
+def lower_preserving_length(text: str) -> str:
+    """
+    text.lower()，但保证长度不变（极少数字符小写化后会变长，此时保留原字符），
+    以便小写文本中的位置可以直接对应到原文本。
+    """
+    text_lower = text.lower()
+    if len(text_lower) == len(text):
+        return text_lower
+    return ''.join(ch_lower if len(ch_lower) == 1 else ch for ch, ch_lower in ((ch, ch.lower()) for ch in text))
 
 # ================================
 # 3) 占位符（placeholder）相关
 # ================================
 
-def safe_replace(text: str, replacements: List[Tuple[str, str, str]]) -> str:
+def safe_replace(
+    text: str,
+    replacements: List[Tuple[str, str, str]],
+    case_insensitive: bool = False
+) -> str:
     """
     执行安全替换：replacements 列表中每个元素是 (old, new, placeholder)。
     先把 text 中的 old 全部替换为 placeholder，再把 placeholder 替换为 new。
     这样可避免重复替换或交叉覆盖的问题。
+    case_insensitive=True 时，全小写的 old 同时匹配其大写/首字母大写形式（见 replace_with_placeholders）。
     """
-    valid_replacements = {}
-    for old, new, placeholder in replacements:
-        if old in text:
-            text = text.replace(old, placeholder)
-            valid_replacements[placeholder] = new
+    text, valid_replacements = replace_with_placeholders(text, replacements, case_insensitive)
     for placeholder, new in valid_replacements.items():
         text = text.replace(placeholder, new)
     return text
 
+def replace_with_placeholders(
+    text: str,
+    replacements: List[Tuple[str, str, str]],
+    case_insensitive: bool = False,
+    placeholder_wrapper: str = "",
+    rule_indices: Optional[Dict[str, Tuple[int, str]]] = None
+) -> Tuple[str, Dict[str, str]]:
+    """
+    safe_replace 的前半部分：按列表顺序把 old 替换为 placeholder（两侧可加 placeholder_wrapper），
+    返回 (替换后的 text, {实际使用的 placeholder: new})，供调用方稍后恢复。
+
+    规则可以带第 4 个元素（词边界约束，见 BOUNDARY_*），此时只替换满足边界条件的出现位置。
+
+    case_insensitive=True 时（对应只保存小写规则的 JSON），对于全小写的 old，
+    会在一次扫描中同时匹配 old / OLD / Old 三种形式，并在此时才生成对应的大写化 new 和 placeholder
+    （与旧版 JSON 构建时生成的 up$ / cap$ 规则相同）。含大写字母的 old 仍然精确匹配。
+
+    replacements 也可以是 CompactRuleList：此时按块取出所有 old 逐个检查，只为出现在当前文本中的规则创建视图。
+
+    rule_indices 不为 None 时，记录 {实际使用的 placeholder: (规则在 replacements 中的序号, 大小写变体)}（供 build_text_ir 使用）。
+    """
+    valid_replacements = {}
+    text_lower = lower_preserving_length(text) if case_insensitive else text
+
+    def iter_candidate_rules():
+        # 生成器按需执行，因此每次检查的都是循环体更新后的 text_lower
+        for index, old in enumerate(replacements.iter_keys()):
+            if old in text_lower:
+                yield index, replacements[index]
+
+    for rule_index, rule in iter_candidate_rules() if isinstance(replacements, CompactRuleList) else enumerate(replacements):
+        old = rule[0]
+        if old not in text_lower:
+            continue
+        boundary = rule[3] if len(rule) > 3 else ''
+        fold_case = case_insensitive and is_case_insensitive_rule(old)
+        if not boundary and not fold_case:
+            # 普通规则：直接 str.replace（与旧实现相同）
+            if old in text:
+                wrapped_placeholder = placeholder_wrapper + rule[2] + placeholder_wrapper
+                text = text.replace(old, wrapped_placeholder)
+                text_lower = lower_preserving_length(text) if case_insensitive else text
+                valid_replacements[wrapped_placeholder] = rule[1]
+                if rule_indices is not None:
+                    rule_indices[wrapped_placeholder] = (rule_index, 'lower')
+            continue
+
+        if fold_case:
+            variants = {}
+            for variant in CASE_VARIANTS:
+                variants.setdefault(apply_case_variant(old, variant), variant)
+        else:
+            variants = {old: 'lower'}
+        pieces = []
+        pieces_lower = []
+        last_end = 0
+        index = text_lower.find(old)
+        while index != -1:
+            end = index + len(old)
+            variant = variants.get(text[index:end])
+            if variant is None or not satisfies_word_boundary(text, index, end, boundary):
+                index = text_lower.find(old, index + 1)
+                continue
+            wrapped_placeholder = placeholder_wrapper + case_variant_placeholder(rule[2], variant) + placeholder_wrapper
+            if wrapped_placeholder not in valid_replacements:
+                valid_replacements[wrapped_placeholder] = apply_case_variant(rule[1], variant)
+                if rule_indices is not None:
+                    rule_indices[wrapped_placeholder] = (rule_index, variant)
+            pieces.append(text[last_end:index])
+            pieces.append(wrapped_placeholder)
+            if case_insensitive:
+                pieces_lower.append(text_lower[last_end:index])
+                pieces_lower.append(wrapped_placeholder)
+            last_end = end
+            index = text_lower.find(old, end)
+        if pieces:
+            pieces.append(text[last_end:])
+            text = ''.join(pieces)
+            if case_insensitive:
+                pieces_lower.append(text_lower[last_end:])
+                text_lower = ''.join(pieces_lower)
+            else:
+                text_lower = text
+    return text, valid_replacements
+
 def import_placeholders(filename: str) -> List[str]:
     """
     从指定文件读取 placeholder 列表。文件中每行一个 placeholder，返回一个列表。
@@ -149,44 +402,352 @@ def find_at_enclosed_strings_for_localized_replacement(text: str) -> List[str]:
 def create_replacements_list_for_localized_replacement(
     text,
     placeholders: List[str],
-    replacements_list_for_localized_string: List[Tuple[str, str, str]]
+    replacements_list_for_localized_string: List[Tuple[str, str, str]],
+    case_insensitive: bool = False,
+    convert_localized: Optional[Callable[[str], str]] = None
 ) -> List[List[str]]:
     """
     针对文本中出现的 @xxx@，用 replacements_list_for_localized_string 对其中的内容执行 safe_replace。
     最终返回 [("@xxx@", placeholder, replaced_xxx), ...] 形式。
+    convert_localized 不为 None 时用它代替 safe_replace 转换 xxx（build_text_ir 把结果记录为 token）。
     """
     matches = find_at_enclosed_strings_for_localized_replacement(text)
     tmp_replacements_list_for_localized_string = []
     for i, match in enumerate(matches):
         if i < len(placeholders):
-            replaced_match = safe_replace(match, replacements_list_for_localized_string)
+            if convert_localized is None:
+                replaced_match = safe_replace(match, replacements_list_for_localized_string, case_insensitive)
+            else:
+                replaced_match = convert_localized(match)
             tmp_replacements_list_for_localized_string.append([f"@{match}@", placeholders[i], replaced_match])
         else:
             break
     return tmp_replacements_list_for_localized_string
 
+# -------------------------------
+# 只把“可能匹配规则的文字段”交给替换引擎（script-run fast path）
+# -------------------------------
+# 规则的 key 只由有限的字符（拉丁字母、ĉĝĥĵŝŭ、空格、少数标点等）构成。
+# 文本中不属于这些字符的部分（汉字、假名、换行、很多标点……）不可能成为任何匹配的一部分，
+# 因此先把它们剔除，只扫描剩下的文字段，结果与扫描全文完全相同。
+SCRIPT_RUN_MIN_GAP_RATIO = 0.1
+_rule_gap_pattern_cache: Dict[Tuple, re.Pattern] = {}
+
+def rule_keys_text(rules) -> str:
+    """
+    规则列表中所有 old 以 '\0' 连接成的字符串（CompactRuleList 直接拼接其键块，见 CompactRuleList.keys_text）。
+    """
+    if isinstance(rules, CompactRuleList):
+        return rules.keys_text()
+    return RULE_STORE_KEY_SEPARATOR.join(rule[0] for rule in rules)
+
+def rule_lists_cache_key(rule_lists, rule_set_hash: Optional[str] = None) -> Tuple:
+    """
+    由规则列表派生的数据（正则等）的缓存键。
+    调用方有规则文件的哈希时（如 main.py 的缓存键）作为 rule_set_hash 传入，直接使用；
+    否则使用各列表所有 old 的 sha1。键只取决于内容：列表对象被释放、id 被新的列表重新使用时也不会误用旧的结果。
+    """
+    if rule_set_hash is None:
+        sha1 = hashlib.sha1()
+        for rules in rule_lists:
+            sha1.update(rule_keys_text(rules).encode('utf-8'))
+            sha1.update(b'\x1e')
+        rule_set_hash = 'keys:' + sha1.hexdigest()
+    return (rule_set_hash,) + tuple(len(rules) for rules in rule_lists)
+
+def build_rule_gap_pattern(*rule_lists: List[Tuple[str, str, str]], rule_set_hash: Optional[str] = None) -> re.Pattern:
+    """
+    收集所有规则 key（及其大写形式）中出现的字符，再加上 placeholder 用字符，
+    返回匹配“不含这些字符的连续片段”的正则。结果按 rule_lists_cache_key 缓存。
+    """
+    cache_key = rule_lists_cache_key(rule_lists, rule_set_hash)
+    pattern = _rule_gap_pattern_cache.get(cache_key)
+    if pattern is None:
+        alphabet = set(PLACEHOLDER_CHARS + '0123456789')
+        for rules in rule_lists:
+            keys = rule_keys_text(rules)
+            alphabet.update(keys)
+            alphabet.update(keys.upper())
+        alphabet.discard(RULE_STORE_KEY_SEPARATOR)
+        pattern = re.compile('[^' + ''.join(re.escape(ch) for ch in sorted(alphabet)) + ']+')
+        if len(_rule_gap_pattern_cache) >= 8:
+            _rule_gap_pattern_cache.clear()
+        _rule_gap_pattern_cache[cache_key] = pattern
+    return pattern
+
+def join_script_runs(text: str, gap_pattern: re.Pattern) -> Optional[Tuple[str, List[str], str]]:
+    """
+    把 text 中的“间隙”（gap_pattern 匹配的部分）压缩为 gap[0] + 分隔符 + gap[-1]，
+    返回 (拼接后的文字段, 原来的间隙列表, 分隔符)。
+    间隙首尾字符保留下来，因此词边界判断与原文相同。
+    间隙太少、不值得拆分时返回 None。
+    """
+    gaps = []
+    pieces = []
+    last_end = 0
+    gap_total = 0
+    for match in gap_pattern.finditer(text):
+        start, end = match.span()
+        gaps.append(text[start:end])
+        pieces.append(text[last_end:start])
+        gap_total += end - start
+        last_end = end
+    if gap_total < len(text) * SCRIPT_RUN_MIN_GAP_RATIO:
+        return None
+    pieces.append(text[last_end:])
+    separator = next(chr(cp) for cp in range(0xE000, 0xF900) if chr(cp) not in text)
+    joined_pieces = [pieces[0]]
+    for gap, run in zip(gaps, pieces[1:]):
+        joined_pieces.append(gap[0] + separator + gap[-1])
+        joined_pieces.append(run)
+    joined = ''.join(joined_pieces)
+    return joined, gaps, separator
+
+def split_script_runs(joined: str, gaps: List[str], separator: str) -> str:
+    """
+    join_script_runs 的逆操作：把处理后的文字段与原来的间隙重新拼回完整文本。
+    """
+    parts = joined.split(separator)
+    result = [parts[0][:-1] if len(parts) > 1 else parts[0]]
+    for i, gap in enumerate(gaps):
+        part = parts[i + 1]
+        result.append(gap)
+        result.append(part[1:-1] if i + 1 < len(gaps) else part[1:])
+    return ''.join(result)
+
+# -------------------------------
+# 词汇表模式：只对文本中不同的词（及其前后各一个字符）执行替换
+# -------------------------------
+# 规则的 key 不含内部空格，所以一个匹配只会落在“规则字符”构成的一个词之内，
+# 再加上前后各一个字符（' la ' 的空格、词边界约束的判断对象）。因此每个 (前一字符, 词, 后一字符)
+# 只需转换一次：把它们用分隔符连成一个小文本一次转换，再按出现位置拼回去。
+# 例外是两侧都带空格的同一条规则在“词 词”中共用一个空格（str.replace 不会重叠匹配），
+# 所以只隔一个空格、（不区分大小写）相同的相邻词合并为一个单位，在原来的上下文中转换。
+_vocabulary_token_pattern_cache: Dict[Tuple, re.Pattern] = {}
+
+def build_vocabulary_token_pattern(*rule_lists: List[Tuple[str, str, str]], rule_set_hash: Optional[str] = None) -> re.Pattern:
+    """
+    返回匹配“词”（规则 key 中出现的字符及其大写形式，不含空格和 placeholder 用字符）的正则。结果按 rule_lists_cache_key 缓存。
+    """
+    cache_key = rule_lists_cache_key(rule_lists, rule_set_hash)
+    pattern = _vocabulary_token_pattern_cache.get(cache_key)
+    if pattern is None:
+        alphabet = set()
+        for rules in rule_lists:
+            keys = rule_keys_text(rules)
+            alphabet.update(keys)
+            alphabet.update(keys.upper())
+        alphabet -= set(' ' + RULE_STORE_KEY_SEPARATOR + PLACEHOLDER_CHARS + '0123456789')
+        pattern = re.compile('[' + ''.join(re.escape(ch) for ch in sorted(alphabet)) + ']+')
+        if len(_vocabulary_token_pattern_cache) >= 8:
+            _vocabulary_token_pattern_cache.clear()
+        _vocabulary_token_pattern_cache[cache_key] = pattern
+    return pattern
+
+def needs_second_two_char_pass(replacements_list_for_2char: List[Tuple[str, str, str]]) -> bool:
+    """
+    2 字母词根的第二次替换只为空格填充的独立词规则（' la '）而设：'la la' 中两个词共用一个空格，第一次只能替换前一个。
+    独立词规则都带词边界约束时（--word-boundaries 生成的 JSON），第一次就能替换全部出现位置，第二次可以省略。
+    """
+    return any(
+        len(rule) <= 3 or not rule[3]
+        for rule in replacements_list_for_2char
+        if rule[0].startswith(' ') and rule[0].endswith(' ')
+    )
+
+def restore_placeholders(text: str, valid_replacements: Dict[str, str], reverse: bool = False) -> str:
+    """
+    把 replace_with_placeholders 返回的 placeholder 恢复为替换后文字（reverse=True 时从后往前）。
+    """
+    items = reversed(valid_replacements.items()) if reverse else valid_replacements.items()
+    for placeholder, new in items:
+        text = text.replace(placeholder, new)
+    return text
+
+def apply_rule_passes(
+    text: str,
+    replacements_final_list: List[Tuple[str, str, str]],
+    replacements_list_for_2char: List[Tuple[str, str, str]],
+    case_insensitive: bool = False,
+    rule_set_hash: Optional[str] = None,
+    restore_as_text_ir: Optional[Callable[[str, Dict[str, str], Dict[str, Tuple[int, str]], int, bool], str]] = None
+) -> str:
+    """
+    orchestrate_comprehensive_esperanto_text_replacement 的 5)~7)：大域替换、2字词根替换、恢复 placeholder。
+    rule_set_hash 见 rule_lists_cache_key。
+    restore_as_text_ir 不为 None 时（build_text_ir），恢复 placeholder 时改为调用
+    restore_as_text_ir(text, valid_replacements, rule_indices, 规则列表的种类 TEXT_IR_*_RULES, reverse)。
+    """
+    # 只保留可能匹配规则的文字段（汉字、换行等不参与扫描）
+    script_runs = join_script_runs(
+        text, build_rule_gap_pattern(replacements_final_list, replacements_list_for_2char, rule_set_hash=rule_set_hash)
+    )
+    if script_runs is not None:
+        text, gaps, separator = script_runs
+
+    # 中间表示需要知道各 placeholder 对应的规则
+    rule_indices = {} if restore_as_text_ir is not None else None
+    rule_indices_for_2char_roots = {} if restore_as_text_ir is not None else None
+    rule_indices_for_2char_roots_2 = {} if restore_as_text_ir is not None else None
+
+    # 大域替换
+    text, valid_replacements = replace_with_placeholders(
+        text, replacements_final_list, case_insensitive, rule_indices=rule_indices
+    )
+
+    # 2 字母词根，两次替换（第二次的 placeholder 两侧加 "!"，见 needs_second_two_char_pass）
+    text, valid_replacements_for_2char_roots = replace_with_placeholders(
+        text, replacements_list_for_2char, case_insensitive, rule_indices=rule_indices_for_2char_roots
+    )
+    valid_replacements_for_2char_roots_2 = {}
+    if needs_second_two_char_pass(replacements_list_for_2char):
+        text, valid_replacements_for_2char_roots_2 = replace_with_placeholders(
+            text, replacements_list_for_2char, case_insensitive, "!", rule_indices=rule_indices_for_2char_roots_2
+        )
+
+    # 恢复 placeholder
+    if restore_as_text_ir is None:
+        text = restore_placeholders(text, valid_replacements_for_2char_roots_2, reverse=True)
+        text = restore_placeholders(text, valid_replacements_for_2char_roots, reverse=True)
+        text = restore_placeholders(text, valid_replacements)
+    else:
+        text = restore_as_text_ir(text, valid_replacements_for_2char_roots_2, rule_indices_for_2char_roots_2, TEXT_IR_2CHAR_RULES, True)
+        text = restore_as_text_ir(text, valid_replacements_for_2char_roots, rule_indices_for_2char_roots, TEXT_IR_2CHAR_RULES, True)
+        text = restore_as_text_ir(text, valid_replacements, rule_indices, TEXT_IR_GLOBAL_RULES, False)
+
+    if script_runs is not None:
+        text = split_script_runs(text, gaps, separator)
+    return text
+
+def collect_vocabulary_units(
+    text: str,
+    token_pattern: re.Pattern,
+    vocabulary: Dict[Tuple[str, str, str], int]
+) -> List[Tuple[int, int, int]]:
+    """
+    返回 text 中各单位的 (start, end, 词汇表 id)。新的 (前一字符, 词, 后一字符) 追加到 vocabulary（可在多个文本间共用）。
+    """
+    spans = []
+    last_token_lower = None
+    for match in token_pattern.finditer(text):
+        start, end = match.span()
+        token_lower = match.group().lower()
+        if spans and spans[-1][1] == start - 1 and text[start - 1] == ' ' and token_lower == last_token_lower:
+            spans[-1][1] = end
+        else:
+            spans.append([start, end])
+        last_token_lower = token_lower
+    return [
+        (start, end, vocabulary.setdefault((text[start - 1:start], text[start:end], text[end:end + 1]), len(vocabulary)))
+        for start, end in spans
+    ]
+
+def convert_vocabulary_chunk(
+    contexts: List[Tuple[str, str, str]],
+    replacements_final_list: List[Tuple[str, str, str]],
+    replacements_list_for_2char: List[Tuple[str, str, str]],
+    case_insensitive: bool = False,
+    rule_set_hash: Optional[str] = None
+) -> Optional[List[str]]:
+    """
+    把 (前一字符, 词, 后一字符) 用分隔符连成一个文本一次转换，返回各词的转换结果。无法按分隔符拆回时返回 None。
+    """
+    joined = ''.join(''.join(context) for context in contexts)
+    separator = next(chr(cp) for cp in range(0xE000, 0xF900) if chr(cp) not in joined)
+    converted_items = apply_rule_passes(
+        separator.join(''.join(context) for context in contexts),
+        replacements_final_list,
+        replacements_list_for_2char,
+        case_insensitive,
+        rule_set_hash
+    ).split(separator)
+    if len(converted_items) != len(contexts):
+        return None
+    converted_units = []
+    for (before, _unit, after), item in zip(contexts, converted_items):
+        if not (item.startswith(before) and item.endswith(after)) or len(item) < len(before) + len(after):
+            return None
+        converted_units.append(item[len(before):len(item) - len(after)])
+    return converted_units
+
+def convert_vocabulary(
+    vocabulary: Dict[Tuple[str, str, str], int],
+    replacements_final_list: List[Tuple[str, str, str]],
+    replacements_list_for_2char: List[Tuple[str, str, str]],
+    case_insensitive: bool = False,
+    num_processes: int = 1,
+    rule_set_hash: Optional[str] = None
+) -> Optional[List[str]]:
+    """
+    按词汇表 id 的顺序返回各单位的转换结果（convert_vocabulary_chunk）。num_processes > 1 时把词汇表分块交给子进程。
+    """
+    contexts = list(vocabulary)
+    if num_processes <= 1 or len(contexts) < 2:
+        return convert_vocabulary_chunk(contexts, replacements_final_list, replacements_list_for_2char, case_insensitive, rule_set_hash)
+    chunk_size = -(-len(contexts) // num_processes)
+    with multiprocessing.Pool(processes=num_processes) as pool:
+        chunk_results = pool.starmap(
+            convert_vocabulary_chunk,
+            [
+                (contexts[start:start + chunk_size], replacements_final_list, replacements_list_for_2char, case_insensitive, rule_set_hash)
+                for start in range(0, len(contexts), chunk_size)
+            ]
+        )
+    if any(result is None for result in chunk_results):
+        return None
+    return [unit for result in chunk_results for unit in result]
+
+def splice_vocabulary_units(text: str, units: List[Tuple[int, int, int]], converted_units: List[str]) -> str:
+    """
+    把 collect_vocabulary_units 得到的各单位替换为转换结果。
+    """
+    pieces = []
+    last_end = 0
+    for start, end, unit_id in units:
+        pieces.append(text[last_end:start])
+        pieces.append(converted_units[unit_id])
+        last_end = end
+    pieces.append(text[last_end:])
+    return ''.join(pieces)
+
+def apply_rule_passes_by_vocabulary(
+    text: str,
+    replacements_final_list: List[Tuple[str, str, str]],
+    replacements_list_for_2char: List[Tuple[str, str, str]],
+    case_insensitive: bool = False,
+    rule_set_hash: Optional[str] = None
+) -> str:
+    """
+    结果与 apply_rule_passes(text, ...) 相同，但只转换不同的 (前一字符, 词, 后一字符)（见本节开头的说明）。
+    转换结果无法按分隔符拆回时，改为对全文执行 apply_rule_passes。
+    """
+    vocabulary: Dict[Tuple[str, str, str], int] = {}
+    units = collect_vocabulary_units(
+        text, build_vocabulary_token_pattern(replacements_final_list, replacements_list_for_2char, rule_set_hash=rule_set_hash), vocabulary
+    )
+    if not units:
+        return text
+    converted_units = convert_vocabulary(
+        vocabulary, replacements_final_list, replacements_list_for_2char, case_insensitive, rule_set_hash=rule_set_hash
+    )
+    if converted_units is None:
+        return apply_rule_passes(text, replacements_final_list, replacements_list_for_2char, case_insensitive, rule_set_hash)
+    return splice_vocabulary_units(text, units, converted_units)
+
 # ================================
 # 4) 综合替换主函数
 # ================================
-def orchestrate_comprehensive_esperanto_text_replacement(
-    text,
+def protect_special_parts(
+    text: str,
     placeholders_for_skipping_replacements: List[str],
     replacements_list_for_localized_string: List[Tuple[str, str, str]],
     placeholders_for_localized_replacement: List[str],
-    replacements_final_list: List[Tuple[str, str, str]],
-    replacements_list_for_2char: List[Tuple[str, str, str]],
-    format_type: str
-) -> str:
+    case_insensitive: bool = False,
+    convert_localized: Optional[Callable[[str], str]] = None
+) -> Tuple[str, List[Tuple[str, str]], List[Tuple[str, str, str]]]:
     """
-    进行一系列替换操作：
-      1) 统一半角空格
-      2) 将 c^, cx 等转为 ĉ, ĝ 等
-      3) 把 %...% 段落替换为占位符（跳过后续替换）
-      4) 把 @...@ 段落提取、执行局部替换后再替换成占位符
-      5) 对其余文本进行大范围替换（replacements_final_list）
-      6) 针对 2字词根（replacements_list_for_2char）进行多次替换
-      7) 恢复 placeholder
-      8) 若是 HTML 形式，替换换行符为 <br>，空白处理等
+    orchestrate_comprehensive_esperanto_text_replacement 的 1)~4)。返回 (text, %...% 列表, @...@ 列表)，两个列表交给 restore_special_parts。
+    convert_localized 见 create_replacements_list_for_localized_replacement。
     """
     text = unify_halfwidth_spaces(text)
     text = convert_to_circumflex(text)
@@ -198,52 +759,108 @@ def orchestrate_comprehensive_esperanto_text_replacement(
         text = text.replace(original, place_holder_)
 
     # 处理 @...@ 局部替换
-    tmp_replacements_list_for_localized_string_2 = create_replacements_list_for_localized_replacement(text, placeholders_for_localized_replacement, replacements_list_for_localized_string)
+    tmp_replacements_list_for_localized_string_2 = create_replacements_list_for_localized_replacement(
+        text, placeholders_for_localized_replacement, replacements_list_for_localized_string, case_insensitive, convert_localized
+    )
     sorted_replacements_list_for_localized_string = sorted(tmp_replacements_list_for_localized_string_2, key=lambda x: len(x[0]), reverse=True)
     for original, place_holder_, replaced_original in sorted_replacements_list_for_localized_string:
         text = text.replace(original, place_holder_)
 
-    # 大域替换
-    valid_replacements = {}
-    for old, new, placeholder in replacements_final_list:
-        if old in text:
-            text = text.replace(old, placeholder)
-            valid_replacements[placeholder] = new
-
-    # 2 字母词根，两次替换
-    valid_replacements_for_2char_roots = {}
-    for old, new, placeholder in replacements_list_for_2char:
-        if old in text:
-            text = text.replace(old, placeholder)
-            valid_replacements_for_2char_roots[placeholder] = new
-
-    valid_replacements_for_2char_roots_2 = {}
-    for old, new, placeholder in replacements_list_for_2char:
-        if old in text:
-            place_holder_second = "!"+placeholder+"!"
-            text = text.replace(old, place_holder_second)
-            valid_replacements_for_2char_roots_2[place_holder_second] = new
-
-    # 恢复 placeholder
-    for place_holder_second, new in reversed(valid_replacements_for_2char_roots_2.items()):
-        text = text.replace(place_holder_second, new)
-    for placeholder, new in reversed(valid_replacements_for_2char_roots.items()):
-        text = text.replace(placeholder, new)
-    for placeholder, new in valid_replacements.items():
-        text = text.replace(placeholder, new)
+    return text, sorted_replacements_list_for_intact_parts, sorted_replacements_list_for_localized_string
 
+def restore_special_parts(
+    text: str,
+    sorted_replacements_list_for_intact_parts: List[Tuple[str, str]],
+    sorted_replacements_list_for_localized_string: List[Tuple[str, str, str]],
+    format_type: Optional[str],
+    letter_type: Optional[str] = None
+) -> str:
+    """
+    orchestrate_comprehensive_esperanto_text_replacement 的 8)~9) 以及 @...@ / %...% 的恢复。
+    format_type 为 None 时只恢复 @...@ / %...%（build_text_ir：HTML 的处理留给 render_text_ir）。
+    """
     for original, place_holder_, replaced_original in sorted_replacements_list_for_localized_string:
         text = text.replace(place_holder_, replaced_original.replace("@",""))
     for original, place_holder_ in sorted_replacements_list_for_intact_parts:
         text = text.replace(place_holder_, original.replace("%",""))
 
     # 如果是 HTML 形式，可替换换行符为 <br> 等
-    if "HTML" in format_type:
-        text = text.replace("\n", "<br>\n")
-        text = re.sub(r"   ", "&nbsp;&nbsp;&nbsp;", text)
-        text = re.sub(r"  ", "&nbsp;&nbsp;", text)
+    if format_type is not None and "HTML" in format_type:
+        text = emit_html_text(text)
 
-    return text
+    return apply_letter_type(text, letter_type)
+
+def orchestrate_comprehensive_esperanto_text_replacement(
+    text,
+    placeholders_for_skipping_replacements: List[str],
+    replacements_list_for_localized_string: List[Tuple[str, str, str]],
+    placeholders_for_localized_replacement: List[str],
+    replacements_final_list: List[Tuple[str, str, str]],
+    replacements_list_for_2char: List[Tuple[str, str, str]],
+    format_type: str,
+    case_insensitive: bool = False,
+    letter_type: Optional[str] = None,
+    paragraph_cache: Optional['ParagraphResultCache'] = None,
+    rule_set_hash: Optional[str] = None,
+    vocabulary_mode: bool = False
+) -> str:
+    """
+    进行一系列替换操作：
+      1) 统一半角空格
+      2) 将 c^, cx 等转为 ĉ, ĝ 等
+      3) 把 %...% 段落替换为占位符（跳过后续替换）
+      4) 把 @...@ 段落提取、执行局部替换后再替换成占位符
+      5) 对其余文本进行大范围替换（replacements_final_list）
+      6) 针对 2字词根（replacements_list_for_2char）进行多次替换
+      7) 恢复 placeholder
+      8) 若是 HTML 形式，替换换行符为 <br>，空白处理等
+      9) 按 letter_type 转换字母形式（None 时不转换）
+    case_insensitive=True 用于只保存小写规则的 JSON（参见 replace_with_placeholders）。
+    paragraph_cache 不为 None 时，先在磁盘缓存中查找各段落的结果，只转换缺少的段落（见 convert_with_paragraph_cache）；
+    rule_set_hash 省略时由规则列表计算（compute_rule_set_hash）；给出时也用作正则等派生数据的缓存键（rule_lists_cache_key）。
+    vocabulary_mode=True 时 5)~7) 只对不同的词执行一次（apply_rule_passes_by_vocabulary，结果相同；
+    长文本中重复的词越多越快）。
+    """
+    if paragraph_cache is not None:
+        rule_set_hash = rule_set_hash or compute_rule_set_hash(
+            replacements_final_list, replacements_list_for_2char, replacements_list_for_localized_string, case_insensitive
+        )
+        return convert_with_paragraph_cache(
+            text,
+            paragraph_cache,
+            rule_set_hash,
+            format_type,
+            letter_type,
+            lambda missing_text: orchestrate_comprehensive_esperanto_text_replacement(
+                missing_text,
+                placeholders_for_skipping_replacements,
+                replacements_list_for_localized_string,
+                placeholders_for_localized_replacement,
+                replacements_final_list,
+                replacements_list_for_2char,
+                format_type,
+                case_insensitive,
+                letter_type,
+                rule_set_hash=rule_set_hash,
+                vocabulary_mode=vocabulary_mode
+            )
+        )
+
+    text, sorted_intact_parts, sorted_localized_parts = protect_special_parts(
+        text,
+        placeholders_for_skipping_replacements,
+        replacements_list_for_localized_string,
+        placeholders_for_localized_replacement,
+        case_insensitive
+    )
+
+    # 大域替换、2字词根替换、恢复 placeholder
+    if vocabulary_mode:
+        text = apply_rule_passes_by_vocabulary(text, replacements_final_list, replacements_list_for_2char, case_insensitive, rule_set_hash)
+    else:
+        text = apply_rule_passes(text, replacements_final_list, replacements_list_for_2char, case_insensitive, rule_set_hash)
+
+    return restore_special_parts(text, sorted_intact_parts, sorted_localized_parts, format_type, letter_type)
 
 # ================================
 # 5) 多进程处理长文本
@@ -255,7 +872,10 @@ def process_segment(
     placeholders_for_localized_replacement: List[str],
     replacements_final_list: List[Tuple[str, str, str]],
     replacements_list_for_2char: List[Tuple[str, str, str]],
-    format_type: str
+    format_type: str,
+    case_insensitive: bool = False,
+    vocabulary_mode: bool = False,
+    rule_set_hash: Optional[str] = None
 ) -> str:
     """
     用于并行处理的子函数：把若干行拼成一段，然后调用 orchestrate_comprehensive_esperanto_text_replacement。
@@ -268,7 +888,10 @@ def process_segment(
         placeholders_for_localized_replacement,
         replacements_final_list,
         replacements_list_for_2char,
-        format_type
+        format_type,
+        case_insensitive,
+        rule_set_hash=rule_set_hash,
+        vocabulary_mode=vocabulary_mode
     )
     return result
 
@@ -280,11 +903,51 @@ def parallel_process(
     placeholders_for_localized_replacement: List[str],
     replacements_final_list: List[Tuple[str, str, str]],
     replacements_list_for_2char: List[Tuple[str, str, str]],
-    format_type: str
+    format_type: str,
+    case_insensitive: bool = False,
+    letter_type: Optional[str] = None,
+    paragraph_cache: Optional['ParagraphResultCache'] = None,
+    rule_set_hash: Optional[str] = None,
+    vocabulary_mode: bool = False,
+    memory_budget_bytes: Optional[int] = None
 ) -> str:
     """
     把文本按行拆分，分配给多个子进程并行处理（process_segment），然后再拼接结果。
+    letter_type / paragraph_cache / rule_set_hash / vocabulary_mode 与 orchestrate_comprehensive_esperanto_text_replacement 相同
+    （使用磁盘缓存时，只有缺少结果的段落会分配给子进程）。
+    memory_budget_bytes 不为 None 时，按内存预算减少进程数（limit_worker_count），并记录子进程的实测内存。
     """
+    if paragraph_cache is not None:
+        rule_set_hash = rule_set_hash or compute_rule_set_hash(
+            replacements_final_list, replacements_list_for_2char, replacements_list_for_localized_string, case_insensitive
+        )
+        return convert_with_paragraph_cache(
+            text,
+            paragraph_cache,
+            rule_set_hash,
+            format_type,
+            letter_type,
+            lambda missing_text: parallel_process(
+                missing_text,
+                num_processes,
+                placeholders_for_skipping_replacements,
+                replacements_list_for_localized_string,
+                placeholders_for_localized_replacement,
+                replacements_final_list,
+                replacements_list_for_2char,
+                format_type,
+                case_insensitive,
+                letter_type,
+                rule_set_hash=rule_set_hash,
+                vocabulary_mode=vocabulary_mode,
+                memory_budget_bytes=memory_budget_bytes
+            )
+        )
+
+    rule_lists = (replacements_final_list, replacements_list_for_2char, replacements_list_for_localized_string)
+    if memory_budget_bytes is not None:
+        num_processes = limit_worker_count(num_processes, memory_budget_bytes, *rule_lists, rule_set_hash=rule_set_hash)
+
     if num_processes <= 1:
         return orchestrate_comprehensive_esperanto_text_replacement(
             text,
@@ -293,7 +956,11 @@ def parallel_process(
             placeholders_for_localized_replacement,
             replacements_final_list,
             replacements_list_for_2char,
-            format_type
+            format_type,
+            case_insensitive,
+            letter_type,
+            rule_set_hash=rule_set_hash,
+            vocabulary_mode=vocabulary_mode
         )
 
     lines = re.findall(r'.*?\n|.+$', text)
@@ -306,14 +973,19 @@ def parallel_process(
             placeholders_for_localized_replacement,
             replacements_final_list,
             replacements_list_for_2char,
-            format_type
+            format_type,
+            case_insensitive,
+            letter_type,
+            rule_set_hash=rule_set_hash,
+            vocabulary_mode=vocabulary_mode
         )
 
     lines_per_process = max(num_lines // num_processes, 1)
     ranges = [(i * lines_per_process, (i + 1) * lines_per_process) for i in range(num_processes)]
     ranges[-1] = (ranges[-1][0], num_lines)
 
-    with multiprocessing.Pool(processes=num_processes) as pool:
+    with multiprocessing.Pool(processes=num_processes) as pool, \
+            worker_memory_monitor(rule_lists if memory_budget_bytes is not None else None, rule_set_hash):
         results = pool.starmap(
             process_segment,
             [
@@ -324,13 +996,16 @@ def parallel_process(
                     placeholders_for_localized_replacement,
                     replacements_final_list,
                     replacements_list_for_2char,
-                    format_type
+                    format_type,
+                    case_insensitive,
+                    vocabulary_mode,
+                    rule_set_hash
                 )
                 for (start, end) in ranges
             ]
         )
 
-    return ''.join(results)
+    return apply_letter_type(''.join(results), letter_type)
 
 def apply_ruby_html_header_and_footer(processed_text: str, format_type: str) -> str:
     """
@@ -443,3 +1118,1089 @@ ruby rt {
         ruby_style_tail = ""
     
     return ruby_style_head + processed_text + ruby_style_tail
+
+# ================================
+# 6) 替换规则文件（JSON / gzip / zstd）的读取
+# ================================
+# 规则文件可以是普通 JSON，也可以是 gzip（.json.gz）或 zstd（.json.zst）压缩的 JSON。
+# 压缩方式按文件开头的 magic number 判断，与扩展名无关；解压以流的方式进行，不在内存中保留整个解压后的文件。
+# zstd 需要可选依赖 zstandard（pip install zstandard），gzip 只用标准库。
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+def detect_rule_file_compression(head: bytes) -> str:
+    """
+    根据文件开头的几个字节判断压缩方式，返回 'gzip' / 'zstd' / 'none'。
+    """
+    if head.startswith(GZIP_MAGIC):
+        return 'gzip'
+    if head.startswith(ZSTD_MAGIC):
+        return 'zstd'
+    return 'none'
+
+def open_rule_file(source) -> io.BufferedIOBase:
+    """
+    以二进制流打开规则文件并透明解压。source 为文件路径(str)、文件内容(bytes) 或 二进制文件对象。
+    调用方负责关闭返回的流（可用 with 语句）。
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        raw = io.BytesIO(source)
+    elif isinstance(source, str):
+        raw = open(source, 'rb')
+    else:
+        raw = source
+    raw = raw if hasattr(raw, 'peek') else io.BufferedReader(raw)
+    compression = detect_rule_file_compression(raw.peek(4)[:4])
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=raw, mode='rb')
+    if compression == 'zstd':
+        if zstandard is None:
+            raw.close()
+            raise RuntimeError("读取 zstd 压缩的规则文件需要安装 zstandard（pip install zstandard）")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True))
+    return raw
+
+def load_rule_file(source) -> Dict:
+    """
+    读取（可能经过压缩的）规则 JSON 文件，返回字典。source 的形式同 open_rule_file。
+    """
+    with open_rule_file(source) as stream:
+        return json.load(io.TextIOWrapper(stream, encoding='utf-8'))
+
+# 流式读取时每次从文件读取的字符数
+RULE_FILE_READ_CHUNK_SIZE = 1 << 20
+JSON_WHITESPACE_PATTERN = re.compile(r'[ \t\n\r]*')
+
+def load_rule_file_streaming(
+    source,
+    rule_factory: Callable = tuple,
+    rule_list_factory: Callable = list,
+    chunk_size: int = RULE_FILE_READ_CHUNK_SIZE
+) -> Dict:
+    """
+    逐条读取规则文件（顶层为字典、规则以列表形式保存），不把整个 JSON 文本或文档一次性读入内存。
+    source 的形式同 open_rule_file（支持 gzip / zstd）。
+
+    顶层字典中值为数组的项，逐个元素解析：元素（列表）经 rule_factory 转换（默认转为 tuple，比 list 占用内存少）后，
+    append 到 rule_list_factory() 创建的容器中（默认 list；也可以是 CompactRuleList 等规则存储结构）。
+    其余值原样存入结果字典。内存峰值约为最终数据结构 + chunk_size 个字符。
+    """
+    decoder = json.JSONDecoder()
+    with open_rule_file(source) as stream:
+        reader = io.TextIOWrapper(stream, encoding='utf-8')
+        buffer = ''
+        pos = 0
+        eof = False
+        batch_enabled = True
+
+        def read_more():
+            # 丢弃已解析的部分，再读入一块
+            nonlocal buffer, pos, eof, batch_enabled
+            chunk = reader.read(chunk_size)
+            if not chunk:
+                eof = True
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            batch_enabled = True
+
+        def next_char() -> str:
+            # 跳过空白，返回下一个字符（不前进）
+            nonlocal pos
+            while True:
+                pos = JSON_WHITESPACE_PATTERN.match(buffer, pos).end()
+                if pos < len(buffer):
+                    return buffer[pos]
+                if eof:
+                    raise ValueError("规则文件意外结束")
+                read_more()
+
+        def expect(ch: str):
+            nonlocal pos
+            if next_char() != ch:
+                raise ValueError(f"规则文件格式错误：应为 {ch!r}，实际为 {buffer[pos:pos + 20]!r}")
+            pos += 1
+
+        def decode_value():
+            # 解析一个完整的值；值可能被块边界截断，此时读入下一块后重试
+            # （数字被截断时 raw_decode 也会成功，因此还要确认数字之后紧跟分隔符）
+            nonlocal pos
+            next_char()
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                    if eof or (end < len(buffer) and (not isinstance(value, (int, float)) or buffer[end] in ',]} \t\n\r')):
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                read_more()
+
+        def add_rule(rules, rule):
+            rules.append(rule_factory(rule) if isinstance(rule, list) else rule)
+
+        data = {}
+        expect('{')
+        if next_char() == '}':
+            return data
+        while True:
+            key = decode_value()
+            expect(':')
+            if next_char() == '[':
+                pos += 1
+                rules = rule_list_factory()
+                if next_char() == ']':
+                    pos += 1
+                else:
+                    while True:
+                        # 快速路径：把缓冲区中到最后一个逗号为止的若干元素一次交给 json.loads（C 实现）。
+                        # 该逗号位于字符串内部或数组之外时，拼出的文本不是合法 JSON，
+                        # 此时改为逐个元素解析，直到读入下一块为止。
+                        if batch_enabled:
+                            cut = buffer.rfind(',', pos)
+                            try:
+                                batch = json.loads('[' + buffer[pos:cut] + ']') if cut > pos else None
+                            except json.JSONDecodeError:
+                                batch = None
+                            if batch:
+                                for rule in batch:
+                                    add_rule(rules, rule)
+                                pos = cut + 1
+                                continue
+                            batch_enabled = False
+                        add_rule(rules, decode_value())
+                        separator = next_char()
+                        pos += 1
+                        if separator == ']':
+                            break
+                        if separator != ',':
+                            raise ValueError(f"规则文件格式错误：数组中出现 {separator!r}")
+                data[key] = rules
+            else:
+                data[key] = decode_value()
+            separator = next_char()
+            pos += 1
+            if separator == '}':
+                return data
+            if separator != ',':
+                raise ValueError(f"规则文件格式错误：字典中出现 {separator!r}")
+
+# ================================
+# 7) 紧凑的规则存储
+# ================================
+# 30 万条规则若以 (old, new, placeholder) 的 list/tuple 保存，约有 120 万个 Python 对象，对象头的开销很大，
+# 而且 new 中的 <ruby>、<rt class="...">、</rt></ruby> 等标签在每条规则中重复出现。
+# CompactRuleList 按每 RULE_STORE_BLOCK_SIZE 条规则分块：
+#   - 键块：该块所有 old 以 '\0' 连接成的一个 str（替换时只需 split 键块即可依次检查 old，见 replace_with_placeholders）；
+#   - 值块：该块所有 new、placeholder 拼接成的一个 str；
+#   - 各字段的结束位置保存在 array 中；
+#   - new 中的标签替换为私用区字符（每种标签只保存一次），读取时用 str.translate 还原。
+# 按序号访问时返回 CompactRule 视图（__slots__），rule[0] / rule[1] / rule[2] / len(rule) / 解包 的用法与 tuple 相同。
+RULE_STORE_BLOCK_SIZE = 4096
+RULE_STORE_FIELD_COUNT = 3
+RULE_STORE_KEY_SEPARATOR = '\0'
+RULE_MARKUP_FRAGMENT_PATTERN = re.compile(r'<[^<>]*>')
+# 标签编码所用的私用区字符范围（BMP 内，不会使块变为 4 字节/字符）
+RULE_MARKUP_CODE_START = 0xE000
+RULE_MARKUP_CODE_END = 0xF900
+RULE_MARKUP_CODE_PATTERN = re.compile('[\uE000-\uF8FF]')
+
+class CompactRule:
+    """
+    CompactRuleList 中一条规则的只读视图。
+    """
+    __slots__ = ('_rules', '_index')
+
+    def __init__(self, rules: 'CompactRuleList', index: int):
+        self._rules = rules
+        self._index = index
+
+    def __getitem__(self, field):
+        if field.__class__ is int and 0 <= field < RULE_STORE_FIELD_COUNT:
+            return self._rules._field(self._index, field)
+        return self._rules._rule_tuple(self._index)[field]
+
+    def __len__(self) -> int:
+        return len(self._rules._rule_tuple(self._index))
+
+    def __iter__(self):
+        return iter(self._rules._rule_tuple(self._index))
+
+    def __eq__(self, other) -> bool:
+        try:
+            return self._rules._rule_tuple(self._index) == tuple(other)
+        except TypeError:
+            return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self._rules._rule_tuple(self._index))
+
+    def __repr__(self) -> str:
+        return repr(self._rules._rule_tuple(self._index))
+
+class CompactRuleList(Sequence):
+    """
+    只能追加的规则序列，元素为 CompactRule 视图。
+    可直接代替 List[Tuple[str, str, str]] 传给 safe_replace / orchestrate_comprehensive_esperanto_text_replacement / parallel_process。
+    不是 3 个字段的规则（例如带词边界约束的第 4 个元素），以及含有 '\0' 或私用区字符的规则，原样保存在 _extras 中
+    （键块中对应位置为空字符串）。
+    """
+    __slots__ = ('_key_blocks', '_value_blocks', '_key_ends', '_value_ends', '_extras', '_length',
+                 '_pending_keys', '_pending_values', '_pending_key_length', '_pending_value_length',
+                 '_markup_codes', '_markup_table')
+
+    def __init__(self, rules=()):
+        self._key_blocks: List[str] = []
+        self._value_blocks: List[str] = []
+        self._key_ends = array('I')
+        self._value_ends = array('I')
+        self._extras: Dict[int, tuple] = {}
+        self._length = 0
+        self._pending_keys: List[str] = []
+        self._pending_values: List[str] = []
+        self._pending_key_length = 0
+        self._pending_value_length = 0
+        self._markup_codes: Dict[str, str] = {}
+        self._markup_table: Dict[int, str] = {}
+        for rule in rules:
+            self.append(rule)
+
+    def _encode_markup(self, new: str) -> str:
+        for fragment, code in self._markup_codes.items():
+            new = new.replace(fragment, code)
+        if '<' in new:
+            for fragment in RULE_MARKUP_FRAGMENT_PATTERN.findall(new):
+                code_point = RULE_MARKUP_CODE_START + len(self._markup_codes)
+                if fragment in self._markup_codes or code_point >= RULE_MARKUP_CODE_END:
+                    continue
+                self._markup_codes[fragment] = chr(code_point)
+                self._markup_table[code_point] = fragment
+                new = new.replace(fragment, chr(code_point))
+        return new
+
+    def append(self, rule):
+        """
+        追加一条规则（list / tuple / CompactRule 均可）。
+        """
+        index = self._length
+        if index % RULE_STORE_BLOCK_SIZE == 0 and self._pending_keys:
+            self._flush_pending()
+        if not self._pending_keys and index % RULE_STORE_BLOCK_SIZE:
+            # 最后一块未满（之前访问过规则而提前拼接），重新打开继续追加
+            self._pending_keys.append(self._key_blocks.pop())
+            self._pending_values.append(self._value_blocks.pop())
+        fields = rule if rule.__class__ is tuple else tuple(rule)
+        if (len(fields) != RULE_STORE_FIELD_COUNT or RULE_STORE_KEY_SEPARATOR in fields[0]
+                or RULE_MARKUP_CODE_PATTERN.search(fields[1]) is not None):
+            self._extras[index] = fields
+            old = new = placeholder = ''
+        else:
+            old, new, placeholder = fields
+            if '<' in new:
+                new = self._encode_markup(new)
+        if index % RULE_STORE_BLOCK_SIZE:
+            self._pending_key_length += 1
+        self._pending_keys.append(old)
+        self._pending_key_length += len(old)
+        self._key_ends.append(self._pending_key_length)
+        self._pending_values.append(new)
+        self._pending_value_length += len(new)
+        self._value_ends.append(self._pending_value_length)
+        self._pending_values.append(placeholder)
+        self._pending_value_length += len(placeholder)
+        self._value_ends.append(self._pending_value_length)
+        self._length = index + 1
+
+    def _flush_pending(self):
+        # 把未拼接的规则拼接为块（块未满时，之后 append 会重新打开它）
+        if self._pending_keys:
+            self._key_blocks.append(RULE_STORE_KEY_SEPARATOR.join(self._pending_keys))
+            self._value_blocks.append(''.join(self._pending_values))
+            self._pending_keys = []
+            self._pending_values = []
+        if self._length % RULE_STORE_BLOCK_SIZE == 0:
+            self._pending_key_length = 0
+            self._pending_value_length = 0
+
+    def _field(self, index: int, field: int) -> str:
+        if self._extras and index in self._extras:
+            return self._extras[index][field]
+        block = index // RULE_STORE_BLOCK_SIZE
+        if field == 0:
+            end = self._key_ends[index]
+            start = self._key_ends[index - 1] + 1 if index % RULE_STORE_BLOCK_SIZE else 0
+            return self._key_blocks[block][start:end]
+        position = index * 2 + field - 1
+        end = self._value_ends[position]
+        start = self._value_ends[position - 1] if position % (RULE_STORE_BLOCK_SIZE * 2) else 0
+        value = self._value_blocks[block][start:end]
+        return value.translate(self._markup_table) if field == 1 and self._markup_table else value
+
+    def _rule_tuple(self, index: int) -> tuple:
+        if self._extras and index in self._extras:
+            return self._extras[index]
+        return (self._field(index, 0), self._field(index, 1), self._field(index, 2))
+
+    def iter_keys(self):
+        """
+        按顺序返回所有规则的 old（_extras 中的规则返回空字符串，需要时用 self[序号] 取得完整规则）。
+        每块只做一次 split，比逐条创建视图快得多。
+        """
+        if self._pending_keys:
+            self._flush_pending()
+        for key_block in self._key_blocks:
+            yield from key_block.split(RULE_STORE_KEY_SEPARATOR)
+
+    def keys_text(self) -> str:
+        """
+        所有规则的 old 以 '\0' 连接成的字符串：各键块再加上 _extras 中规则的 old（用于收集字符、计算摘要，不必逐条创建视图）。
+        """
+        if self._pending_keys:
+            self._flush_pending()
+        return RULE_STORE_KEY_SEPARATOR.join(self._key_blocks + [fields[0] for fields in self._extras.values()])
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("规则序号超出范围")
+        if self._pending_keys:
+            self._flush_pending()
+        return CompactRule(self, index)
+
+    def __iter__(self):
+        for index in range(self._length):
+            yield self[index]
+
+    def __getstate__(self):
+        if self._pending_keys:
+            self._flush_pending()
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+def load_rule_file_compact(source) -> Dict:
+    """
+    流式读取规则文件，值为数组的项直接逐条存入 CompactRuleList（不经过中间的规则列表）。
+    返回的字典可以像 load_rule_file 的结果一样使用。
+    """
+    return load_rule_file_streaming(source, rule_factory=tuple, rule_list_factory=CompactRuleList)
+
+# ================================
+# 8) 中间表示（token 列表）与渲染
+# ================================
+# build_text_ir() 只做匹配（与 orchestrate_comprehensive_esperanto_text_replacement 共用 protect_special_parts、
+# apply_rule_passes、restore_special_parts，只是恢复 placeholder 时换成 token 标记），
+# 结果是“原样输出的文字(str)”与 token 交替的列表。token 为 (surface, rule_ref, annotation)：
+#   surface    -> 被替换的原文（去掉两端的边界标记 ' ' / '$'）
+#   rule_ref   -> (规则列表的种类 TEXT_IR_*_RULES, 规则在该列表中的序号, 大小写变体)
+#   annotation -> 匹配时所用规则的替换后文字（同样去掉与 placeholder 共用的边界标记）
+# render_text_ir() 再把它拼成最终文本；annotate 可以换成其他格式的规则（见 make_rule_list_annotator），
+# 因此改变输出格式或字母形式时不必重新匹配。
+TEXT_IR_GLOBAL_RULES = 0
+TEXT_IR_2CHAR_RULES = 1
+TEXT_IR_LOCALIZED_RULES = 2
+# 恢复 placeholder 时先用这些私用区字符代表各个 token，最后再拆分为列表
+TEXT_IR_MARKER_RANGES = ((0xF0000, 0xFFFFE), (0x100000, 0x10FFFE))
+TEXT_IR_MARKER_PATTERN = re.compile('[\U000F0000-\U000FFFFD\U00100000-\U0010FFFD]')
+
+def new_text_ir_marker_allocator(text: str) -> Callable[[], str]:
+    """
+    返回一个函数，每次调用给出一个 text 中没有出现过的私用区字符。
+    """
+    used = set(TEXT_IR_MARKER_PATTERN.findall(text))
+    def code_points():
+        for start, end in TEXT_IR_MARKER_RANGES:
+            for code_point in range(start, end):
+                if chr(code_point) not in used:
+                    yield chr(code_point)
+        raise ValueError("token 数量超出标记字符的范围")
+    return code_points().__next__
+
+def rule_value_sentinel_lengths(placeholder: str, new: str) -> Tuple[int, int]:
+    """
+    new 两端与 placeholder 共用的边界标记（' la ' 的空格、2字词根的 '$'）的长度。
+    恢复 placeholder 时这些字符必须留在文本中（相邻的 placeholder 会共用它们）。
+    """
+    lead = 0
+    while lead < min(len(placeholder), len(new)) and placeholder[lead] == new[lead] and new[lead] in RULE_SENTINEL_CHARS:
+        lead += 1
+    trail = 0
+    while (trail < min(len(placeholder), len(new) - lead) and placeholder[-1 - trail] == new[-1 - trail]
+           and new[-1 - trail] in RULE_SENTINEL_CHARS):
+        trail += 1
+    return lead, trail
+
+def restore_placeholders_as_text_ir_markers(
+    text: str,
+    valid_replacements: Dict[str, str],
+    rule_indices: Dict[str, Tuple[int, str]],
+    rules,
+    rule_list_kind: int,
+    markers: Dict[str, Tuple],
+    new_marker: Callable[[], str],
+    reverse: bool = False
+) -> str:
+    """
+    与 restore_placeholders 相同，
+    只是把替换后文字换成 token 标记（两端的边界标记照原样恢复），token 记录在 markers 中。
+    """
+    items = reversed(valid_replacements.items()) if reverse else valid_replacements.items()
+    for wrapped_placeholder, new in items:
+        rule_index, variant = rule_indices[wrapped_placeholder]
+        rule = rules[rule_index]
+        lead, trail = rule_value_sentinel_lengths(case_variant_placeholder(rule[2], variant), new)
+        marker = new_marker()
+        annotation = new[lead:len(new) - trail]
+        if rule_list_kind == TEXT_IR_LOCALIZED_RULES:
+            annotation = annotation.replace("@", "")
+        surface = apply_case_variant(rule[0], variant).strip(RULE_SENTINEL_CHARS)
+        markers[marker] = (surface, (rule_list_kind, rule_index, variant), annotation)
+        text = text.replace(wrapped_placeholder, new[:lead] + marker + new[len(new) - trail:])
+    return text
+
+def build_text_ir(
+    text,
+    placeholders_for_skipping_replacements: List[str],
+    replacements_list_for_localized_string: List[Tuple[str, str, str]],
+    placeholders_for_localized_replacement: List[str],
+    replacements_final_list: List[Tuple[str, str, str]],
+    replacements_list_for_2char: List[Tuple[str, str, str]],
+    case_insensitive: bool = False,
+    rule_set_hash: Optional[str] = None
+) -> List:
+    """
+    执行与 orchestrate_comprehensive_esperanto_text_replacement 相同的匹配，返回中间表示（见本节开头）。
+    render_text_ir(build_text_ir(...), format_type) 与 orchestrate_comprehensive_esperanto_text_replacement(..., format_type, ...) 的结果相同。
+    rule_set_hash 见 rule_lists_cache_key。
+    """
+    # 1)~2) 不改变私用区字符，因此可以先按原文分配标记
+    new_marker = new_text_ir_marker_allocator(text)
+    markers: Dict[str, Tuple] = {}
+    rule_lists = {
+        TEXT_IR_GLOBAL_RULES: replacements_final_list,
+        TEXT_IR_2CHAR_RULES: replacements_list_for_2char,
+        TEXT_IR_LOCALIZED_RULES: replacements_list_for_localized_string,
+    }
+
+    def restore_as_text_ir(text, valid_replacements, rule_indices, rule_list_kind, reverse=False):
+        return restore_placeholders_as_text_ir_markers(
+            text, valid_replacements, rule_indices, rule_lists[rule_list_kind], rule_list_kind, markers, new_marker, reverse
+        )
+
+    def convert_localized(match):
+        # 局部替换的结果同样拆分为 token
+        rule_indices = {}
+        replaced_match, valid_replacements = replace_with_placeholders(
+            match, replacements_list_for_localized_string, case_insensitive, rule_indices=rule_indices
+        )
+        return restore_as_text_ir(replaced_match, valid_replacements, rule_indices, TEXT_IR_LOCALIZED_RULES)
+
+    text, sorted_intact_parts, sorted_localized_parts = protect_special_parts(
+        text,
+        placeholders_for_skipping_replacements,
+        replacements_list_for_localized_string,
+        placeholders_for_localized_replacement,
+        case_insensitive,
+        convert_localized
+    )
+    text = apply_rule_passes(
+        text, replacements_final_list, replacements_list_for_2char, case_insensitive, rule_set_hash, restore_as_text_ir
+    )
+    text = restore_special_parts(text, sorted_intact_parts, sorted_localized_parts, None)
+
+    # 按标记拆分为 [文字, token, 文字, ...]
+    text_ir = []
+    last_end = 0
+    for match in TEXT_IR_MARKER_PATTERN.finditer(text):
+        token = markers.get(match.group())
+        if token is None:
+            continue
+        if match.start() > last_end:
+            text_ir.append(text[last_end:match.start()])
+        text_ir.append(token)
+        last_end = match.end()
+    if last_end < len(text):
+        text_ir.append(text[last_end:])
+    return text_ir
+
+def render_text_ir(text_ir: List, format_type: str, annotate: Optional[Callable[[Tuple], str]] = None) -> str:
+    """
+    把中间表示拼成最终文本。annotate(token) 返回 token 的替换后文字，省略时使用 token 中记录的 annotation。
+    若是 HTML 形式，与 orchestrate_comprehensive_esperanto_text_replacement 一样替换换行符为 <br> 等。
+    """
+    if annotate is None:
+        text = ''.join(item if isinstance(item, str) else item[2] for item in text_ir)
+    else:
+        text = ''.join(item if isinstance(item, str) else annotate(item) for item in text_ir)
+    if "HTML" in format_type:
+        text = emit_html_text(text)
+    return text
+
+def make_rule_list_annotator(
+    replacements_final_list: List[Tuple[str, str, str]],
+    replacements_list_for_2char: List[Tuple[str, str, str]],
+    replacements_list_for_localized_string: List[Tuple[str, str, str]]
+) -> Callable[[Tuple], str]:
+    """
+    返回 render_text_ir 用的 annotate：用给定的三种规则列表（例如同一 CSV 生成的另一种格式的规则）中
+    同一序号的规则生成替换后文字。规则与中间表示不对应（old 不同）时抛出 ValueError。
+    """
+    rule_lists = {
+        TEXT_IR_GLOBAL_RULES: replacements_final_list,
+        TEXT_IR_2CHAR_RULES: replacements_list_for_2char,
+        TEXT_IR_LOCALIZED_RULES: replacements_list_for_localized_string,
+    }
+    annotations: Dict[Tuple, str] = {}
+
+    def annotate(token: Tuple) -> str:
+        surface, rule_ref, _annotation = token
+        annotation = annotations.get(rule_ref)
+        if annotation is None:
+            rule_list_kind, rule_index, variant = rule_ref
+            rules = rule_lists[rule_list_kind]
+            rule = rules[rule_index] if rule_index < len(rules) else None
+            if rule is None or apply_case_variant(rule[0], variant).strip(RULE_SENTINEL_CHARS) != surface:
+                raise ValueError(f"替换规则与中间表示不对应（{surface}）：请使用由同一 CSV 生成的规则")
+            new = apply_case_variant(rule[1], variant)
+            lead, trail = rule_value_sentinel_lengths(case_variant_placeholder(rule[2], variant), new)
+            annotation = new[lead:len(new) - trail]
+            if rule_list_kind == TEXT_IR_LOCALIZED_RULES:
+                annotation = annotation.replace("@", "")
+            annotations[rule_ref] = annotation
+        return annotation
+    return annotate
+
+def process_segment_text_ir(
+    lines: List[str],
+    placeholders_for_skipping_replacements: List[str],
+    replacements_list_for_localized_string: List[Tuple[str, str, str]],
+    placeholders_for_localized_replacement: List[str],
+    replacements_final_list: List[Tuple[str, str, str]],
+    replacements_list_for_2char: List[Tuple[str, str, str]],
+    case_insensitive: bool = False,
+    rule_set_hash: Optional[str] = None
+) -> List:
+    """
+    parallel_build_text_ir 的子进程函数（与 process_segment 相同，只是返回中间表示）。
+    """
+    return build_text_ir(
+        ''.join(lines),
+        placeholders_for_skipping_replacements,
+        replacements_list_for_localized_string,
+        placeholders_for_localized_replacement,
+        replacements_final_list,
+        replacements_list_for_2char,
+        case_insensitive,
+        rule_set_hash
+    )
+
+def parallel_build_text_ir(
+    text: str,
+    num_processes: int,
+    placeholders_for_skipping_replacements: List[str],
+    replacements_list_for_localized_string: List[Tuple[str, str, str]],
+    placeholders_for_localized_replacement: List[str],
+    replacements_final_list: List[Tuple[str, str, str]],
+    replacements_list_for_2char: List[Tuple[str, str, str]],
+    case_insensitive: bool = False,
+    memory_budget_bytes: Optional[int] = None,
+    rule_set_hash: Optional[str] = None
+) -> List:
+    """
+    与 parallel_process 相同地按行拆分文本、多进程执行 build_text_ir，再把各段的中间表示连接起来。
+    memory_budget_bytes 与 parallel_process 相同，rule_set_hash 与 build_text_ir 相同。
+    """
+    args = (
+        placeholders_for_skipping_replacements,
+        replacements_list_for_localized_string,
+        placeholders_for_localized_replacement,
+        replacements_final_list,
+        replacements_list_for_2char,
+        case_insensitive,
+        rule_set_hash
+    )
+    rule_lists = (replacements_final_list, replacements_list_for_2char, replacements_list_for_localized_string)
+    if memory_budget_bytes is not None:
+        num_processes = limit_worker_count(num_processes, memory_budget_bytes, *rule_lists, rule_set_hash=rule_set_hash)
+    lines = re.findall(r'.*?\n|.+$', text)
+    num_lines = len(lines)
+    if num_processes <= 1 or num_lines <= 1:
+        return build_text_ir(text, *args)
+
+    lines_per_process = max(num_lines // num_processes, 1)
+    ranges = [(i * lines_per_process, (i + 1) * lines_per_process) for i in range(num_processes)]
+    ranges[-1] = (ranges[-1][0], num_lines)
+
+    with multiprocessing.Pool(processes=num_processes) as pool, \
+            worker_memory_monitor(rule_lists if memory_budget_bytes is not None else None, rule_set_hash):
+        results = pool.starmap(process_segment_text_ir, [(lines[start:end],) + args for (start, end) in ranges])
+
+    return [item for text_ir in results for item in text_ir]
+
+# ================================
+# 9) 段落结果的磁盘缓存
+# ================================
+# 同一教材往往会被反复转换。ParagraphResultCache 把“段落 -> 转换结果”保存在 SQLite 文件中，
+# 键为 (规则集的哈希, format_type, 字母形式, 段落的哈希)。段落按行划分（与 parallel_process 相同），
+# 替换规则不会跨行匹配，所以各段落可以单独查找、缺少的段落合在一起一次转换。
+# 总大小超过 max_bytes 时，删除最久未使用的段落（LRU）直到降到 PARAGRAPH_CACHE_EVICT_RATIO 以下。
+DEFAULT_PARAGRAPH_CACHE_PATH = './.paragraph_result_cache.sqlite3'
+DEFAULT_PARAGRAPH_CACHE_MAX_BYTES = 256 << 20
+PARAGRAPH_CACHE_EVICT_RATIO = 0.9
+PARAGRAPH_PATTERN = re.compile(r'.*?\n|.+$')
+
+def split_paragraphs(text: str) -> List[str]:
+    """
+    按行拆分文本（每段保留末尾的换行符），''.join 的结果与原文相同。
+    """
+    return PARAGRAPH_PATTERN.findall(text)
+
+def compute_rule_set_hash(
+    replacements_final_list: List[Tuple[str, str, str]],
+    replacements_list_for_2char: List[Tuple[str, str, str]],
+    replacements_list_for_localized_string: List[Tuple[str, str, str]],
+    case_insensitive: bool = False
+) -> str:
+    """
+    三种规则列表（及匹配方式）的 sha256，作为段落缓存键的一部分。
+    每次都对内容计算（不按列表对象记忆：原地修改过的列表、或重新使用了旧 id 的新列表，都不能得到旧的哈希，
+    否则磁盘缓存会返回用其他规则转换的段落）。
+    调用方已经有规则文件的哈希时（如 main.py 的缓存键），应直接把它作为 rule_set_hash 传入，省去这次计算。
+    """
+    sha256 = hashlib.sha256(b'1' if case_insensitive else b'0')
+    for rules in (replacements_final_list, replacements_list_for_2char, replacements_list_for_localized_string):
+        sha256.update(b'\x1e')
+        sha256.update(''.join('\x1f'.join(map(str, rule)) + '\x1d' for rule in rules).encode('utf-8'))
+    return sha256.hexdigest()
+
+class ParagraphResultCache:
+    """
+    SQLite 文件中的段落结果缓存（多个线程可共用一个实例；子进程不访问它）。
+    stats() 返回累计的命中/未命中次数以及当前的条数和大小。
+    """
+
+    def __init__(self, path: str = DEFAULT_PARAGRAPH_CACHE_PATH, max_bytes: int = DEFAULT_PARAGRAPH_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS paragraphs (key TEXT PRIMARY KEY, result TEXT NOT NULL, "
+                "size INTEGER NOT NULL, last_used INTEGER NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS paragraphs_last_used ON paragraphs (last_used)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO stats (name, value) VALUES (?, 0)", [('hits',), ('misses',)]
+            )
+
+    @staticmethod
+    def paragraph_key(rule_set_hash: str, format_type: str, letter_type: Optional[str], paragraph: str) -> str:
+        paragraph_hash = hashlib.sha256(paragraph.encode('utf-8')).hexdigest()
+        return hashlib.sha256('\0'.join((rule_set_hash, format_type, letter_type or '', paragraph_hash)).encode('utf-8')).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, str]:
+        """
+        查找多个键，返回 {键: 结果}（只包含命中的键），并更新命中段落的最近使用时间。
+        """
+        unique_keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock, self._connection:
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                rows = self._connection.execute(
+                    f"SELECT key, result FROM paragraphs WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                found.update(rows)
+            now = time.time_ns()
+            self._connection.executemany("UPDATE paragraphs SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+            self._connection.execute("UPDATE stats SET value = value + ? WHERE name = 'hits'", (len(found),))
+            self._connection.execute("UPDATE stats SET value = value + ? WHERE name = 'misses'", (len(unique_keys) - len(found),))
+        return found
+
+    def put_many(self, results: Dict[str, str]) -> None:
+        """
+        保存 {键: 结果}，超过 max_bytes 时按 LRU 删除旧的段落。
+        """
+        if not results:
+            return
+        now = time.time_ns()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO paragraphs (key, result, size, last_used) VALUES (?, ?, ?, ?)",
+                [(key, result, len(key) + len(result.encode('utf-8')), now) for key, result in results.items()]
+            )
+            total_size = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM paragraphs").fetchone()[0]
+            if total_size > self.max_bytes:
+                target_size = self.max_bytes * PARAGRAPH_CACHE_EVICT_RATIO
+                evicted = []
+                for key, size in self._connection.execute("SELECT key, size FROM paragraphs ORDER BY last_used"):
+                    if total_size <= target_size:
+                        break
+                    evicted.append((key,))
+                    total_size -= size
+                self._connection.executemany("DELETE FROM paragraphs WHERE key = ?", evicted)
+
+    def get_text(self, rule_set_hash: str, format_type: str, letter_type: Optional[str], text: str) -> Optional[str]:
+        """
+        text 的所有段落都在缓存中时返回拼接后的结果，否则返回 None。
+        """
+        keys = [self.paragraph_key(rule_set_hash, format_type, letter_type, paragraph) for paragraph in split_paragraphs(text)]
+        found = self.get_many(keys)
+        if len(found) < len(set(keys)):
+            return None
+        return ''.join(found[key] for key in keys)
+
+    def put_text(self, rule_set_hash: str, format_type: str, letter_type: Optional[str], text: str, result: str) -> bool:
+        """
+        保存整段文本的转换结果（结果按行拆分后与原文的段落一一对应时才保存，返回是否保存）。
+        """
+        paragraphs = split_paragraphs(text)
+        result_paragraphs = split_paragraphs(result)
+        if len(paragraphs) != len(result_paragraphs):
+            return False
+        self.put_many({
+            self.paragraph_key(rule_set_hash, format_type, letter_type, paragraph): result_paragraph
+            for paragraph, result_paragraph in zip(paragraphs, result_paragraphs)
+        })
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counters = dict(self._connection.execute("SELECT name, value FROM stats"))
+            entries, total_size = self._connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM paragraphs").fetchone()
+        return {'hits': counters['hits'], 'misses': counters['misses'], 'entries': entries, 'bytes': total_size}
+
+    def clear(self) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM paragraphs")
+            self._connection.execute("UPDATE stats SET value = 0")
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+def convert_with_paragraph_cache(
+    text: str,
+    paragraph_cache: ParagraphResultCache,
+    rule_set_hash: str,
+    format_type: str,
+    letter_type: Optional[str],
+    convert: Callable[[str], str]
+) -> str:
+    """
+    先在 paragraph_cache 中查找 text 的各段落；缺少的段落（去重后）合在一起交给 convert 一次转换，
+    再把结果按行拆回各段落、存入缓存。结果与 convert(text) 相同。
+    """
+    paragraphs = split_paragraphs(text)
+    keys = [paragraph_cache.paragraph_key(rule_set_hash, format_type, letter_type, paragraph) for paragraph in paragraphs]
+    found = paragraph_cache.get_many(keys)
+    missing = {}
+    for key, paragraph in zip(keys, paragraphs):
+        if key not in found:
+            missing.setdefault(key, paragraph)
+    if missing:
+        # 没有换行符的段落（只可能是最后一段）放在最后，以免与下一段连在一起
+        missing_keys = sorted(missing, key=lambda key: not missing[key].endswith('\n'))
+        converted = split_paragraphs(convert(''.join(missing[key] for key in missing_keys)))
+        if len(converted) != len(missing_keys):
+            converted = [convert(missing[key]) for key in missing_keys]
+        new_results = dict(zip(missing_keys, converted))
+        paragraph_cache.put_many(new_results)
+        found.update(new_results)
+    return ''.join(found[key] for key in keys)
+
+# ================================
+# 10) 批量转换大量短文本（列表 / pandas）
+# ================================
+def convert_many(
+    texts: List[str],
+    placeholders_for_skipping_replacements: List[str],
+    replacements_list_for_localized_string: List[Tuple[str, str, str]],
+    placeholders_for_localized_replacement: List[str],
+    replacements_final_list: List[Tuple[str, str, str]],
+    replacements_list_for_2char: List[Tuple[str, str, str]],
+    format_type: str,
+    case_insensitive: bool = False,
+    letter_type: Optional[str] = None,
+    num_processes: int = 1,
+    paragraph_cache: Optional[ParagraphResultCache] = None,
+    rule_set_hash: Optional[str] = None
+) -> List[str]:
+    """
+    按输入顺序返回各文本的转换结果，与逐个调用 orchestrate_comprehensive_esperanto_text_replacement 相同。
+    相同的文本只转换一次；所有文本共用一个词汇表（见 3) 的词汇表模式），不同的 (前一字符, 词, 后一字符) 只转换一次，
+    num_processes > 1 时把词汇表分块交给子进程。paragraph_cache 不为 None 时先在缓存中查找（所有段落都命中的文本不再转换）。
+    """
+    unique_texts = list(dict.fromkeys(texts))
+    results: Dict[str, str] = {}
+
+    if paragraph_cache is not None:
+        rule_set_hash = rule_set_hash or compute_rule_set_hash(
+            replacements_final_list, replacements_list_for_2char, replacements_list_for_localized_string, case_insensitive
+        )
+        text_keys = {
+            text: [paragraph_cache.paragraph_key(rule_set_hash, format_type, letter_type, paragraph) for paragraph in split_paragraphs(text)]
+            for text in unique_texts
+        }
+        found = paragraph_cache.get_many([key for keys in text_keys.values() for key in keys])
+        for text, keys in text_keys.items():
+            if all(key in found for key in keys):
+                results[text] = ''.join(found[key] for key in keys)
+
+    pending_texts = [text for text in unique_texts if text not in results]
+    if pending_texts:
+        token_pattern = build_vocabulary_token_pattern(replacements_final_list, replacements_list_for_2char, rule_set_hash=rule_set_hash)
+        vocabulary: Dict[Tuple[str, str, str], int] = {}
+        prepared = []
+        for text in pending_texts:
+            protected_text, sorted_intact_parts, sorted_localized_parts = protect_special_parts(
+                text,
+                placeholders_for_skipping_replacements,
+                replacements_list_for_localized_string,
+                placeholders_for_localized_replacement,
+                case_insensitive
+            )
+            units = collect_vocabulary_units(protected_text, token_pattern, vocabulary)
+            prepared.append((text, protected_text, units, sorted_intact_parts, sorted_localized_parts))
+
+        converted_units = convert_vocabulary(
+            vocabulary, replacements_final_list, replacements_list_for_2char, case_insensitive, num_processes, rule_set_hash
+        )
+        new_results = {}
+        for text, protected_text, units, sorted_intact_parts, sorted_localized_parts in prepared:
+            if converted_units is None:
+                protected_text = apply_rule_passes(
+                    protected_text, replacements_final_list, replacements_list_for_2char, case_insensitive, rule_set_hash
+                )
+            else:
+                protected_text = splice_vocabulary_units(protected_text, units, converted_units)
+            results[text] = restore_special_parts(protected_text, sorted_intact_parts, sorted_localized_parts, format_type, letter_type)
+            if paragraph_cache is not None:
+                paragraphs = split_paragraphs(text)
+                result_paragraphs = split_paragraphs(results[text])
+                if len(paragraphs) == len(result_paragraphs):
+                    new_results.update(zip(text_keys[text], result_paragraphs))
+        if paragraph_cache is not None:
+            paragraph_cache.put_many(new_results)
+
+    return [results[text] for text in texts]
+
+def convert_series(series, *args, **kwargs):
+    """
+    转换 pandas.Series 中的字符串（非字符串的值如 NaN 保持原样），返回 index / name 相同的新 Series。
+    其余参数与 convert_many 相同。
+    """
+    result = series.astype(object)
+    positions = [i for i, value in enumerate(result) if isinstance(value, str)]
+    if positions:
+        result.iloc[positions] = convert_many([result.iloc[i] for i in positions], *args, **kwargs)
+    return result
+
+def convert_dataframe(df, columns: List[str], *args, suffix: str = '', **kwargs):
+    """
+    转换 pandas.DataFrame 中 columns 各列的字符串，返回副本。所有列的值一起交给 convert_many（共用词汇表）。
+    suffix 不为空时结果写入新列（列名 + suffix），原列保持不变。其余参数与 convert_many 相同。
+    """
+    result = df.copy()
+    values = {column: df[column].astype(object).tolist() for column in columns}
+    cells = [(column, i) for column in columns for i, value in enumerate(values[column]) if isinstance(value, str)]
+    converted = convert_many([values[column][i] for column, i in cells], *args, **kwargs)
+    for (column, i), value in zip(cells, converted):
+        values[column][i] = value
+    for column in columns:
+        result[column + suffix] = values[column]
+    return result
+
+# ================================
+# 11) 内存测量与预算（并行处理时自动减少进程数）
+# ================================
+# 常见的部署环境（如 Streamlit Cloud）内存上限为 1 GB。每个子进程都持有一份规则列表，
+# 所以进程数过多时，“主进程 + 各子进程”的常驻内存（RSS）会超过上限。
+# ProcessTreeRssSampler 在后台线程中定期读取主进程及其所有子进程的 RSS；
+# limit_worker_count 根据当前主进程的 RSS 和每个子进程的内存（优先使用最近一次实测的峰值，否则按规则列表的大小估算）
+# 计算预算内能同时运行的进程数。parallel_process / parallel_build_text_ir 的 memory_budget_bytes 参数使用这两者。
+# RSS 优先用可选依赖 psutil（pip install psutil）读取，没有时读取 Linux 的 /proc；两者都不可用时不限制进程数。
+DEFAULT_MEMORY_BUDGET_BYTES = 1 << 30
+MEMORY_BUDGET_SAFETY_RATIO = 0.9
+# 子进程启动后、收到规则之前的大致 RSS（Python 解释器 + 导入的模块）
+WORKER_BASE_RSS_BYTES = 64 << 20
+RSS_SAMPLE_INTERVAL_SECONDS = 0.05
+_observed_worker_peak_rss: Dict[Tuple, int] = {}
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+def process_rss_bytes(pid: Optional[int] = None) -> Optional[int]:
+    """
+    返回进程 pid（省略时为当前进程）的 RSS 字节数；无法读取时返回 None。
+    """
+    pid = os.getpid() if pid is None else pid
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        with open(f'/proc/{pid}/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def child_process_ids(pid: Optional[int] = None) -> List[int]:
+    """
+    返回进程 pid（省略时为当前进程）的所有子孙进程的 pid；无法读取时返回空列表。
+    """
+    pid = os.getpid() if pid is None else pid
+    if psutil is not None:
+        try:
+            return [child.pid for child in psutil.Process(pid).children(recursive=True)]
+        except psutil.Error:
+            return []
+    try:
+        entries = [entry for entry in os.listdir('/proc') if entry.isdigit()]
+    except OSError:
+        return []
+    children: Dict[int, List[int]] = {}
+    for entry in entries:
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                # 第 2 个字段（进程名）可能含空格，父进程 pid 是 ')' 之后的第 2 个字段
+                parent_pid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(parent_pid, []).append(int(entry))
+    descendants = []
+    pending = [pid]
+    while pending:
+        for child_pid in children.get(pending.pop(), []):
+            descendants.append(child_pid)
+            pending.append(child_pid)
+    return descendants
+
+def estimate_rule_lists_bytes(*rule_lists) -> int:
+    """
+    粗略估算规则列表占用的内存（普通列表按最多 1000 条抽样的平均大小推算；CompactRuleList 统计其各块）。
+    """
+    total = 0
+    for rules in rule_lists:
+        if isinstance(rules, CompactRuleList):
+            total += sum(sys.getsizeof(block) for block in rules._key_blocks + rules._value_blocks)
+            total += sys.getsizeof(rules._key_ends) + sys.getsizeof(rules._value_ends)
+            continue
+        if not rules:
+            continue
+        step = max(len(rules) // 1000, 1)
+        sample = rules[::step]
+        sample_bytes = sum(sys.getsizeof(rule) + sum(sys.getsizeof(field) for field in rule) for rule in sample)
+        total += sys.getsizeof(rules) + sample_bytes * len(rules) // len(sample)
+    return total
+
+class ProcessTreeRssSampler:
+    """
+    with ProcessTreeRssSampler() as sampler: ... 期间每 interval 秒读取一次当前进程及其子孙进程的 RSS。
+    结束后：
+      parent_peak_bytes -> 当前进程的 RSS 峰值
+      worker_peak_bytes -> {子进程 pid: RSS 峰值}
+      total_peak_bytes  -> 同一时刻“当前进程 + 所有子进程”之和的峰值
+    RSS 无法读取时均为 0 / 空字典。
+    """
+    def __init__(self, interval: float = RSS_SAMPLE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.parent_peak_bytes = 0
+        self.worker_peak_bytes: Dict[int, int] = {}
+        self.total_peak_bytes = 0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def sample(self) -> None:
+        parent_rss = process_rss_bytes() or 0
+        total = parent_rss
+        for child_pid in child_process_ids():
+            child_rss = process_rss_bytes(child_pid)
+            if child_rss is None:
+                continue
+            total += child_rss
+            self.worker_peak_bytes[child_pid] = max(self.worker_peak_bytes.get(child_pid, 0), child_rss)
+        self.parent_peak_bytes = max(self.parent_peak_bytes, parent_rss)
+        self.total_peak_bytes = max(self.total_peak_bytes, total)
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def __enter__(self) -> 'ProcessTreeRssSampler':
+        self.sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop_event.set()
+        self._thread.join()
+        self.sample()
+
+def worker_memory_key(rule_lists, rule_set_hash: Optional[str] = None) -> Tuple:
+    """
+    实测峰值的键：规则内容（rule_lists_cache_key）再加上估算的大小。
+    同一规则文件生成的不同格式的规则 old 相同、new 不同，大小的估算值可以把它们区分开。
+    """
+    return rule_lists_cache_key(rule_lists, rule_set_hash) + (estimate_rule_lists_bytes(*rule_lists),)
+
+def limit_worker_count(
+    num_processes: int,
+    memory_budget_bytes: int,
+    *rule_lists,
+    per_worker_bytes: Optional[int] = None,
+    rule_set_hash: Optional[str] = None
+) -> int:
+    """
+    返回不超过 num_processes、且“当前进程 + 各子进程”的 RSS 预计不超过 memory_budget_bytes × MEMORY_BUDGET_SAFETY_RATIO 的进程数（至少 1）。
+    每个子进程的内存为 per_worker_bytes；省略时使用同一组规则最近一次实测的峰值（见 worker_memory_monitor，键为 worker_memory_key），
+    没有时按 estimate_rule_lists_bytes 估算（子进程中反序列化的规则 + 传输时的序列化数据，约为规则列表的 2 倍）。
+    无法读取 RSS 时原样返回 num_processes。
+    """
+    if num_processes <= 1:
+        return num_processes
+    parent_rss = process_rss_bytes()
+    if parent_rss is None:
+        return num_processes
+    if per_worker_bytes is None:
+        per_worker_bytes = _observed_worker_peak_rss.get(worker_memory_key(rule_lists, rule_set_hash))
+    if per_worker_bytes is None:
+        per_worker_bytes = WORKER_BASE_RSS_BYTES + 2 * estimate_rule_lists_bytes(*rule_lists)
+    available_bytes = memory_budget_bytes * MEMORY_BUDGET_SAFETY_RATIO - parent_rss
+    return max(1, min(num_processes, int(available_bytes // per_worker_bytes)))
+
+@contextmanager
+def worker_memory_monitor(rule_lists: Optional[tuple], rule_set_hash: Optional[str] = None):
+    """
+    with multiprocessing.Pool(...) as pool, worker_memory_monitor(rule_lists): ...
+    在进程池运行期间采样子进程的 RSS，结束时把子进程的最大峰值记录为这组规则的实测值（供 limit_worker_count 使用）。
+    rule_lists 为 None 时什么也不做。rule_set_hash 见 rule_lists_cache_key。
+    """
+    if rule_lists is None:
+        yield None
+        return
+    with ProcessTreeRssSampler() as sampler:
+        yield sampler
+    if sampler.worker_peak_bytes:
+        if len(_observed_worker_peak_rss) >= 8:
+            _observed_worker_peak_rss.clear()
+        _observed_worker_peak_rss[worker_memory_key(rule_lists, rule_set_hash)] = max(sampler.worker_peak_bytes.values())
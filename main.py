@@ -6,7 +6,9 @@
 import streamlit as st
 import re
 import io
+import os
 import json
+import hashlib
 import pandas as pd  # 如果需要的话使用
 from typing import List, Dict, Tuple, Optional
 import streamlit.components.v1 as components
@@ -29,26 +31,44 @@ from esp_text_replacement_module import (
     replace_esperanto_chars,
     import_placeholders,
 
-    orchestrate_comprehensive_esperanto_text_replacement,
-    parallel_process,
-    apply_ruby_html_header_and_footer
+    build_text_ir,
+    parallel_build_text_ir,
+    render_text_ir,
+    make_rule_list_annotator,
+    apply_letter_type,
+    convert_dataframe,
+    limit_worker_count,
+    DEFAULT_MEMORY_BUDGET_BYTES,
+    ParagraphResultCache,
+    apply_ruby_html_header_and_footer,
+    load_rule_file_streaming,
+    load_rule_file_compact,
+    CompactRuleList
+)
+# 格式无关的规则文件在选择输出格式后，用 esp_replacement_json_make_module 中的函数生成该格式的规则
+from esp_replacement_json_make_module import (
+    is_format_independent_rule_data,
+    render_format_independent_rules
 )
 
 # --------------------------------------------------------------------
-# 通过对函数的结果进行 cache_data，可以加快读取默认的替换用 JSON 文件(可能有 50MB左右)
-# (约 1.0 秒 -> 0.5 秒 的加速)
+# 替换规则（可能有 50MB 左右）使用 cache_resource 缓存：
+#   - cache_data 每次调用都会对返回值做 pickle/unpickle（即每次 rerun 都要重新反序列化三个列表），
+#     cache_resource 则直接返回同一个内存中的对象，多个会话（session）共享同一份规则。
+#   - 缓存键：默认文件用“路径 + mtime + 内容哈希”，上传文件用“内容哈希”。
+#   - 最多保留 RULE_SET_CACHE_MAX_ENTRIES 份，超出后由 Streamlit 自动淘汰最旧的。
+# 注意：返回的列表被所有会话共享，调用方不得修改其内容。
 # --------------------------------------------------------------------
-@st.cache_data
-def load_replacements_lists(json_path: str) -> Tuple[List, List, List]:
+RULE_SET_CACHE_MAX_ENTRIES = 4
+
+def extract_replacements_lists(data: Dict) -> Tuple[List, List, List, bool]:
     """
-    从 JSON 文件中读取以下三种列表并以元组形式返回:
+    从（合并3个JSON文件的）字典中取出以下三种列表及匹配方式，并以元组形式返回:
       1) replacements_final_list
       2) replacements_list_for_localized_string
       3) replacements_list_for_2char
+      4) case_insensitive（JSON 是否只保存了小写规则；旧版 JSON 中没有此项，视为 False）
     """
-    with open(json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
     replacements_final_list = data.get(
         "全域替换用のリスト(列表)型配列(replacements_final_list)", []
     )
@@ -58,13 +78,67 @@ def load_replacements_lists(json_path: str) -> Tuple[List, List, List]:
     replacements_list_for_2char = data.get(
         "二文字词根替换用のリスト(列表)型配列(replacements_list_for_2char)", []
     )
+    case_insensitive = bool(data.get("大小写不敏感匹配(case_insensitive_matching)", False))
 
     return (
         replacements_final_list,
         replacements_list_for_localized_string,
         replacements_list_for_2char,
+        case_insensitive,
     )
 
+@st.cache_data
+def compute_file_sha256(file_path: str, mtime_ns: int, file_size: int) -> str:
+    """
+    计算文件内容的 sha256。mtime_ns / file_size 只作为 cache_data 的键使用，
+    文件未被修改时不会重复计算哈希。
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+def default_json_cache_key(json_path: str) -> str:
+    """
+    默认 JSON 的缓存键：路径 + mtime + 内容哈希。
+    """
+    stat = os.stat(json_path)
+    return f"file:{json_path}:{stat.st_mtime_ns}:{compute_file_sha256(json_path, stat.st_mtime_ns, stat.st_size)}"
+
+@st.cache_resource(max_entries=RULE_SET_CACHE_MAX_ENTRIES)
+def load_rule_data(cache_key: str, _source, compact: bool = False) -> Dict:
+    """
+    读取替换规则文件并缓存（用 extract_replacements_lists 取出各列表）。_source 为 JSON 文件路径(str) 或 上传文件的内容(bytes)。
+    JSON 可以经过 gzip / zstd 压缩（按文件内容自动识别，边读边解压）。
+    规则逐条读取并保存为 tuple，不会先把整个 JSON 文本/文档读入内存（内存峰值约为最终规则列表的大小）。
+    compact=True 时保存为 CompactRuleList（内存约为 tuple 列表的 1/4，可直接传给替换函数）。
+    （以 _ 开头的参数不参与 Streamlit 的哈希计算，缓存由 cache_key 和 compact 决定）
+    """
+    if compact:
+        return load_rule_file_compact(_source)
+    return load_rule_file_streaming(_source)
+
+@st.cache_resource(max_entries=RULE_SET_CACHE_MAX_ENTRIES)
+def render_rule_data(cache_key: str, _data: Dict, format_type: str, compact: bool = False) -> Dict:
+    """
+    由格式无关的规则文件生成 format_type 格式的规则并缓存（切换输出格式时不必重新读取文件）。
+    _data 为 load_rule_data 的结果，缓存由 cache_key、format_type 和 compact 决定。
+    """
+    data = render_format_independent_rules(_data, format_type)
+    if compact:
+        for key, value in data.items():
+            if isinstance(value, list):
+                data[key] = CompactRuleList(value)
+    return data
+
+@st.cache_resource
+def get_paragraph_cache() -> ParagraphResultCache:
+    """
+    段落结果的磁盘缓存（所有会话共用一个 SQLite 文件）。
+    """
+    return ParagraphResultCache()
+
 # 设置页面基本信息
 st.set_page_config(page_title="（汉字替换）世界语文本转换工具", layout="wide")
 
@@ -82,6 +156,10 @@ selected_option = st.radio(
     ("使用默认 JSON", "上传 JSON 文件")
 )
 
+compact_rule_store = st.checkbox(
+    "以紧凑方式保存替换规则（内存占用约为 1/4，转换速度略慢）", value=True
+)
+
 # 在折叠框中提供一个示例 JSON 文件可下载
 with st.expander("【示例 JSON 文件（替换用）】"):
     json_file_path = './Appの运行に使用する各类文件/最终的な替换用リスト(列表)(合并3个JSON文件).json'
@@ -93,30 +171,26 @@ with st.expander("【示例 JSON 文件（替换用）】"):
             mime="application/json"
         )
 
-# 准备好这三个列表，以便之后进行替换
-replacements_final_list: List[Tuple[str, str, str]] = []
-replacements_list_for_localized_string: List[Tuple[str, str, str]] = []
-replacements_list_for_2char: List[Tuple[str, str, str]] = []
+# 读取的替换规则（三个列表在选择输出格式后用 extract_replacements_lists 取出）
+rule_data: Dict = {}
+rule_data_cache_key: str = ""
 
 if selected_option == "使用默认 JSON":
     default_json_path = "./Appの运行に使用する各类文件/最终的な替换用リスト(列表)(合并3个JSON文件).json"
     try:
-        replacements_final_list, replacements_list_for_localized_string, replacements_list_for_2char = load_replacements_lists(default_json_path)
+        rule_data_cache_key = default_json_cache_key(default_json_path)
+        rule_data = load_rule_data(rule_data_cache_key, default_json_path, compact_rule_store)
         st.success("成功读取默认 JSON 文件。")
     except Exception as e:
         st.error(f"读取默认 JSON 文件时出错: {e}")
         st.stop()
 else:
-    uploaded_file = st.file_uploader("请上传 JSON 文件 (合并3个JSON文件).json 格式", type="json")
+    uploaded_file = st.file_uploader("请上传 JSON 文件 (合并3个JSON文件).json 格式（也可上传 .json.gz / .json.zst 压缩文件）", type=["json", "gz", "zst"])
     if uploaded_file is not None:
         try:
-            combined_data = json.load(uploaded_file)
-            replacements_final_list = combined_data.get(
-                "全域替换用のリスト(列表)型配列(replacements_final_list)", [])
-            replacements_list_for_localized_string = combined_data.get(
-                "局部文字替换用のリスト(列表)型配列(replacements_list_for_localized_string)", [])
-            replacements_list_for_2char = combined_data.get(
-                "二文字词根替换用のリスト(列表)型配列(replacements_list_for_2char)", [])
+            uploaded_bytes = uploaded_file.getvalue()
+            rule_data_cache_key = "upload:" + hashlib.sha256(uploaded_bytes).hexdigest()
+            rule_data = load_rule_data(rule_data_cache_key, uploaded_bytes, compact_rule_store)
             st.success("已成功读取上传的 JSON 文件。")
         except Exception as e:
             st.error(f"读取上传 JSON 文件时出错: {e}")
@@ -148,6 +222,25 @@ with st.expander("点击此处配置并行处理"):
     """)
     use_parallel = st.checkbox("使用并行处理", value=False)
     num_processes = st.number_input("并行进程数量", min_value=2, max_value=4, value=4, step=1)
+    # 每个子进程都持有一份规则，进程太多时可能超过部署环境的内存上限（例如 1 GB）
+    use_memory_budget = st.checkbox("按内存预算自动减少进程数", value=True)
+    memory_budget_mb = st.number_input("内存预算（MB）", min_value=256, max_value=65536,
+                                       value=DEFAULT_MEMORY_BUDGET_BYTES >> 20, step=256)
+    memory_budget_bytes = int(memory_budget_mb) << 20 if use_memory_budget else None
+
+    st.write("""
+        反复转换相同的教材时，可以把各段落的转换结果保存在磁盘上，下次只转换有变化的段落。
+    """)
+    use_paragraph_cache = st.checkbox("使用段落结果缓存（磁盘）", value=False)
+    if use_paragraph_cache:
+        paragraph_cache = get_paragraph_cache()
+        paragraph_cache_stats = paragraph_cache.stats()
+        st.caption(
+            f"缓存：{paragraph_cache_stats['entries']} 段，{paragraph_cache_stats['bytes'] / (1 << 20):.1f} MB；"
+            f"累计命中 {paragraph_cache_stats['hits']} 次，未命中 {paragraph_cache_stats['misses']} 次"
+        )
+        if st.button("清空段落结果缓存"):
+            paragraph_cache.clear()
 
 
 st.write("---")
@@ -168,6 +261,26 @@ format_type = st.selectbox(
     ]
 )
 
+# 格式无关的规则文件可用于任意输出格式：按所选格式生成规则（每种格式只生成一次并缓存）
+if is_format_independent_rule_data(rule_data):
+    try:
+        rule_data = render_rule_data(rule_data_cache_key, rule_data, format_type, compact_rule_store)
+    except Exception as e:
+        st.error(f"生成 {format_type} 格式的替换规则时出错: {e}")
+        st.stop()
+    st.info("当前 JSON 为格式无关的规则文件，可选择任意输出格式。")
+
+replacements_final_list, replacements_list_for_localized_string, replacements_list_for_2char, case_insensitive = extract_replacements_lists(rule_data)
+
+if use_parallel and memory_budget_bytes is not None:
+    allowed_processes = limit_worker_count(
+        num_processes, memory_budget_bytes, replacements_final_list, replacements_list_for_2char, replacements_list_for_localized_string,
+        rule_set_hash=rule_data_cache_key
+    )
+    if allowed_processes < num_processes:
+        st.info(f"为了不超过内存预算（{memory_budget_bytes >> 20} MB），并行进程数减少为 {allowed_processes}。")
+        num_processes = allowed_processes
+
 # 准备一个全局字符串 processed_text 来保存处理后的文本
 processed_text = ""
 
@@ -222,38 +335,67 @@ with st.form(key='profile_form'):
         # 将本次输入保存到会话状态
         st.session_state["text0_value"] = text0  
 
-        # 根据是否勾选并行处理，调用不同函数
-        if use_parallel:
-            processed_text = parallel_process(
-                text=text0,
-                num_processes=num_processes,
-                placeholders_for_skipping_replacements=placeholders_for_skipping_replacements,
-                replacements_list_for_localized_string=replacements_list_for_localized_string,
-                placeholders_for_localized_replacement=placeholders_for_localized_replacement,
-                replacements_final_list=replacements_final_list,
-                replacements_list_for_2char=replacements_list_for_2char,
-                format_type=format_type
-            )
-        else:
-            processed_text = orchestrate_comprehensive_esperanto_text_replacement(
-                text=text0,
-                placeholders_for_skipping_replacements=placeholders_for_skipping_replacements,
-                replacements_list_for_localized_string=replacements_list_for_localized_string,
-                placeholders_for_localized_replacement=placeholders_for_localized_replacement,
-                replacements_final_list=replacements_final_list,
-                replacements_list_for_2char=replacements_list_for_2char,
-                format_type=format_type
+        # 匹配结果（中间表示）按“规则文件 + 输入文本”保存在会话状态中（在下面渲染时才生成）：
+        # 只改变输出格式或字母形式时不必重新匹配，直接重新渲染
+        text_ir_key = (rule_data_cache_key, hashlib.sha256(text0.encode('utf-8')).hexdigest())
+        if st.session_state.get("text_ir_key") != text_ir_key:
+            st.session_state["text_ir_key"] = text_ir_key
+            st.session_state["text_ir"] = None
+
+# --------------------------------------------------------------------
+# 用当前的输出格式、字母形式渲染最近一次提交的文本
+# （规则文件已更换时不再显示旧的结果）
+# --------------------------------------------------------------------
+if st.session_state.get("text_ir_key", ("",))[0] == rule_data_cache_key:
+    submitted_text = st.session_state["text0_value"]
+    processed_text = None
+    # 所有段落都在磁盘缓存中时，不必匹配
+    if use_paragraph_cache:
+        processed_text = paragraph_cache.get_text(rule_data_cache_key, format_type, letter_type, submitted_text)
+
+    if processed_text is None:
+        if st.session_state["text_ir"] is None:
+            # 根据是否勾选并行处理，调用不同函数
+            if use_parallel:
+                st.session_state["text_ir"] = parallel_build_text_ir(
+                    text=submitted_text,
+                    num_processes=num_processes,
+                    placeholders_for_skipping_replacements=placeholders_for_skipping_replacements,
+                    replacements_list_for_localized_string=replacements_list_for_localized_string,
+                    placeholders_for_localized_replacement=placeholders_for_localized_replacement,
+                    replacements_final_list=replacements_final_list,
+                    replacements_list_for_2char=replacements_list_for_2char,
+                    case_insensitive=case_insensitive,
+                    memory_budget_bytes=memory_budget_bytes,
+                    rule_set_hash=rule_data_cache_key
+                )
+            else:
+                st.session_state["text_ir"] = build_text_ir(
+                    text=submitted_text,
+                    placeholders_for_skipping_replacements=placeholders_for_skipping_replacements,
+                    replacements_list_for_localized_string=replacements_list_for_localized_string,
+                    placeholders_for_localized_replacement=placeholders_for_localized_replacement,
+                    replacements_final_list=replacements_final_list,
+                    replacements_list_for_2char=replacements_list_for_2char,
+                    case_insensitive=case_insensitive,
+                    rule_set_hash=rule_data_cache_key
+                )
+        try:
+            processed_text = render_text_ir(
+                st.session_state["text_ir"],
+                format_type,
+                make_rule_list_annotator(replacements_final_list, replacements_list_for_2char, replacements_list_for_localized_string)
             )
+        except ValueError as e:
+            st.error(f"渲染转换结果时出错: {e}")
+            st.stop()
 
         # 将上标形式等应用到结果中
-        if letter_type == '上标形式':
-            processed_text = replace_esperanto_chars(processed_text, x_to_circumflex)
-            processed_text = replace_esperanto_chars(processed_text, hat_to_circumflex)
-        elif letter_type == '^形式':
-            processed_text = replace_esperanto_chars(processed_text, x_to_hat)
-            processed_text = replace_esperanto_chars(processed_text, circumflex_to_hat)
+        processed_text = apply_letter_type(processed_text, letter_type)
+        if use_paragraph_cache:
+            paragraph_cache.put_text(rule_data_cache_key, format_type, letter_type, submitted_text, processed_text)
 
-        processed_text = apply_ruby_html_header_and_footer(processed_text, format_type)
+    processed_text = apply_ruby_html_header_and_footer(processed_text, format_type)
 
 # --------------------------------------------------------------------
 # 表单外：若已经生成 processed_text，则展示结果
@@ -293,6 +435,49 @@ if processed_text:
         mime="text/html"
     )
 
+# --------------------------------------------------------------------
+# 5) 批量转换 CSV 中的某些列（每个单元格是一段短文本）
+# --------------------------------------------------------------------
+st.write("---")
+st.subheader("批量转换 CSV 的列")
+with st.expander("点击此处上传 CSV 并选择要转换的列"):
+    st.write("""
+        上传的 CSV 中，所选列的每个单元格分别转换（输出格式、字母形式、并行处理、段落结果缓存使用上面的设置），
+        结果以“列名_转换结果”的新列追加在表格后面。
+    """)
+    csv_file = st.file_uploader("上传 CSV 文件 (UTF-8 编码)", type=["csv"], key="csv_file")
+    if csv_file is not None:
+        try:
+            csv_df = pd.read_csv(csv_file, dtype=str, keep_default_na=False)
+        except Exception as e:
+            st.error(f"读取 CSV 文件时出错: {e}")
+            st.stop()
+        csv_columns = st.multiselect("要转换的列", list(csv_df.columns))
+        if csv_columns and st.button("转换所选的列"):
+            converted_df = convert_dataframe(
+                csv_df,
+                csv_columns,
+                placeholders_for_skipping_replacements,
+                replacements_list_for_localized_string,
+                placeholders_for_localized_replacement,
+                replacements_final_list,
+                replacements_list_for_2char,
+                format_type,
+                case_insensitive,
+                letter_type,
+                num_processes=num_processes if use_parallel else 1,
+                paragraph_cache=paragraph_cache if use_paragraph_cache else None,
+                rule_set_hash=rule_data_cache_key,
+                suffix="_转换结果"
+            )
+            st.dataframe(converted_df.head(100))
+            st.download_button(
+                label="下载转换结果 (CSV)",
+                data=converted_df.to_csv(index=False).encode('utf-8-sig'),
+                file_name="转换结果.csv",
+                mime="text/csv"
+            )
+
 st.write("---")
 st.title("GitHub 仓库链接")
 st.markdown("https://github.com/Takatakatake/Esperanto-Kanji-Converter-and-Ruby-Annotation-Tool_Chinese_beta")
@@ -0,0 +1,49 @@
+import io
+import os
+import sys
+import contextlib
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import esp_replacement_json_make_module as builder
+
+# 仓库中没有附带全域替换用占位符文件（约 48 万行），测试时按文件名中的范围生成
+GLOBAL_PLACEHOLDER_RANGE = (20987, 499999)
+
+@pytest.fixture(scope='session', autouse=True)
+def repo_root_cwd():
+    # 默认文件路径（DEFAULT_FILES_DIR 等）是相对于仓库根目录的
+    previous_cwd = os.getcwd()
+    os.chdir(REPO_ROOT)
+    yield REPO_ROOT
+    os.chdir(previous_cwd)
+
+@pytest.fixture(scope='session')
+def global_placeholders_path(tmp_path_factory):
+    if os.path.exists(builder.DEFAULT_PLACEHOLDERS_FOR_GLOBAL_REPLACEMENT_PATH):
+        return builder.DEFAULT_PLACEHOLDERS_FOR_GLOBAL_REPLACEMENT_PATH
+    path = tmp_path_factory.mktemp('placeholders') / 'global_placeholders.txt'
+    first, last = GLOBAL_PLACEHOLDER_RANGE
+    path.write_text(''.join(f"${n}$\n" for n in range(first, last + 1)), encoding='utf-8')
+    return str(path)
+
+@pytest.fixture(scope='session')
+def format_independent_build(repo_root_cwd, tmp_path_factory, global_placeholders_path):
+    """
+    用命令行构建一次默认 CSV 的格式无关规则文件，返回 (输出路径, 标准输出)。
+    """
+    output_path = tmp_path_factory.mktemp('rules') / 'rules_format_independent.json'
+    stdout = io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        exit_code = builder.main([
+            '--format-type', builder.FORMAT_INDEPENDENT_TYPE,
+            '--output', str(output_path),
+            '--global-placeholders', global_placeholders_path,
+            '--no-cache',
+            '--compact',
+        ])
+    assert exit_code == 0
+    return str(output_path), stdout.getvalue()
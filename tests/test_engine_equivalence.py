@@ -0,0 +1,165 @@
+"""
+各转换引擎（流式读取、CompactRuleList、中间表示、段落缓存、词汇表模式、convert_many）的结果
+与 orchestrate_comprehensive_esperanto_text_replacement 逐字节相同。
+为了缩短测试时间，规则使用默认 CSV 构建的格式无关规则文件，全域规则每 RULE_SUBSAMPLE_STEP 条取一条，
+文本使用例句文件的开头部分。
+"""
+import json
+import random
+
+import pytest
+
+import esp_replacement_json_make_module as builder
+import esp_text_replacement_module as engine
+
+RULE_SUBSAMPLE_STEP = 5
+SAMPLE_TEXT_PATH = './例句_Esperanto文本.txt'
+SAMPLE_TEXT_LENGTH = 10000
+HTML_FORMAT = 'HTML格式'
+PARENTHESES_FORMAT = '括弧(号)格式'
+PLACEHOLDERS_FOR_SKIPPING_PATH = builder.DEFAULT_FILES_DIR + '/占位符(placeholders)_%1854%-%4934%_文字列替换skip用.txt'
+PLACEHOLDERS_FOR_LOCALIZED_PATH = builder.DEFAULT_FILES_DIR + '/占位符(placeholders)_@5134@-@9728@_局部文字列替换结果捕捉用.txt'
+
+
+@pytest.fixture(scope='module')
+def rule_sets(format_independent_build):
+    """
+    {format_type: {规则列表的键: 规则列表}}。各格式取同一序号的全域规则，因此中间表示可以换用另一种格式的规则渲染。
+    """
+    with open(format_independent_build[0], encoding='utf-8') as f:
+        format_independent_data = json.load(f)
+    result = {}
+    for format_type in (HTML_FORMAT, PARENTHESES_FORMAT):
+        combined_data = builder.render_format_independent_rules(format_independent_data, format_type)
+        combined_data[builder.REPLACEMENTS_FINAL_LIST_KEY] = combined_data[builder.REPLACEMENTS_FINAL_LIST_KEY][::RULE_SUBSAMPLE_STEP]
+        result[format_type] = combined_data
+    return result
+
+
+@pytest.fixture(scope='module')
+def placeholders():
+    return engine.import_placeholders(PLACEHOLDERS_FOR_SKIPPING_PATH), engine.import_placeholders(PLACEHOLDERS_FOR_LOCALIZED_PATH)
+
+
+@pytest.fixture(scope='module')
+def sample_text():
+    with open(SAMPLE_TEXT_PATH, encoding='utf-8') as f:
+        text = f.read(SAMPLE_TEXT_LENGTH)
+    # 也覆盖 %...%（跳过替换）与 @...@（局部替换）
+    return text + "\n%Mi amas vin% kaj @la hundo@ la la la.\n"
+
+
+def rule_lists(combined_data):
+    return (
+        combined_data[builder.REPLACEMENTS_FINAL_LIST_KEY],
+        combined_data[builder.REPLACEMENTS_LIST_FOR_2CHAR_KEY],
+        combined_data[builder.REPLACEMENTS_LIST_FOR_LOCALIZED_STRING_KEY],
+    )
+
+
+def orchestrate(text, combined_data, placeholders, format_type=HTML_FORMAT, **kwargs):
+    final_list, two_char_list, localized_list = rule_lists(combined_data)
+    skipping_placeholders, localized_placeholders = placeholders
+    return engine.orchestrate_comprehensive_esperanto_text_replacement(
+        text, skipping_placeholders, localized_list, localized_placeholders, final_list, two_char_list, format_type, **kwargs
+    )
+
+
+@pytest.fixture(scope='module')
+def expected_html(rule_sets, placeholders, sample_text):
+    return orchestrate(sample_text, rule_sets[HTML_FORMAT], placeholders)
+
+
+@pytest.mark.parametrize('compression', ['none', 'gzip'])
+def test_streaming_loader_matches_json_load(rule_sets, placeholders, sample_text, expected_html, tmp_path, compression):
+    path = str(tmp_path / ('rules.json' + ('.gz' if compression == 'gzip' else '')))
+    builder.write_replacements_json(rule_sets[HTML_FORMAT], path, compression, compact=True)
+    reference = engine.load_rule_file(path)
+    # 块很小时，批量解析的快速路径经常遇到被截断的元素，需要退回逐个解析
+    for chunk_size in (257, 4096, engine.RULE_FILE_READ_CHUNK_SIZE):
+        streamed = engine.load_rule_file_streaming(path, chunk_size=chunk_size)
+        assert streamed.keys() == reference.keys()
+        for key, value in reference.items():
+            if isinstance(value, list):
+                assert streamed[key] == [tuple(rule) for rule in value]
+            else:
+                assert streamed[key] == value
+    assert orchestrate(sample_text, streamed, placeholders) == expected_html
+
+
+def test_compact_rule_list_matches_lists(rule_sets, placeholders, sample_text, expected_html, tmp_path):
+    path = str(tmp_path / 'rules.json')
+    builder.write_replacements_json(rule_sets[HTML_FORMAT], path, 'none', compact=True)
+    compact_data = engine.load_rule_file_compact(path)
+    for key in (builder.REPLACEMENTS_FINAL_LIST_KEY, builder.REPLACEMENTS_LIST_FOR_2CHAR_KEY):
+        assert isinstance(compact_data[key], engine.CompactRuleList)
+        assert [tuple(rule) for rule in compact_data[key]] == [tuple(rule) for rule in rule_sets[HTML_FORMAT][key]]
+    assert orchestrate(sample_text, compact_data, placeholders) == expected_html
+
+
+def test_text_ir_renderers(rule_sets, placeholders, sample_text, expected_html):
+    skipping_placeholders, localized_placeholders = placeholders
+    final_list, two_char_list, localized_list = rule_lists(rule_sets[HTML_FORMAT])
+    text_ir = engine.build_text_ir(
+        sample_text, skipping_placeholders, localized_list, localized_placeholders, final_list, two_char_list
+    )
+    assert engine.render_text_ir(text_ir, HTML_FORMAT) == expected_html
+
+    # 同一中间表示换用另一种格式的规则渲染
+    other_rules = rule_sets[PARENTHESES_FORMAT]
+    annotate = engine.make_rule_list_annotator(*rule_lists(other_rules))
+    assert engine.render_text_ir(text_ir, PARENTHESES_FORMAT, annotate) == \
+        orchestrate(sample_text, other_rules, placeholders, PARENTHESES_FORMAT)
+
+
+def test_paragraph_cache_matches_orchestrate(rule_sets, placeholders, sample_text, expected_html, tmp_path):
+    cache = engine.ParagraphResultCache(str(tmp_path / 'cache.sqlite3'))
+    try:
+        assert orchestrate(sample_text, rule_sets[HTML_FORMAT], placeholders, paragraph_cache=cache) == expected_html
+        misses = cache.stats()['misses']
+        assert orchestrate(sample_text, rule_sets[HTML_FORMAT], placeholders, paragraph_cache=cache) == expected_html
+        stats = cache.stats()
+        assert stats['misses'] == misses
+        assert stats['hits'] > 0
+    finally:
+        cache.close()
+
+
+def test_paragraph_cache_evicts_least_recently_used(tmp_path):
+    entry_size = len('k0') + len('x' * 98)
+    cache = engine.ParagraphResultCache(str(tmp_path / 'cache.sqlite3'), max_bytes=entry_size * 5)
+    try:
+        for i in range(5):
+            cache.put_many({f'k{i}': 'x' * 98})
+        # 访问 k0 后，最久未使用的是 k1
+        assert cache.get_many(['k0']) == {'k0': 'x' * 98}
+        cache.put_many({'k5': 'x' * 98})
+        remaining = cache.get_many([f'k{i}' for i in range(6)])
+        assert 'k0' in remaining and 'k5' in remaining
+        assert 'k1' not in remaining
+        assert cache.stats()['bytes'] <= cache.max_bytes * engine.PARAGRAPH_CACHE_EVICT_RATIO
+    finally:
+        cache.close()
+
+
+def test_vocabulary_mode_matches_orchestrate(rule_sets, placeholders, sample_text, expected_html):
+    assert orchestrate(sample_text, rule_sets[HTML_FORMAT], placeholders, vocabulary_mode=True) == expected_html
+
+
+def test_convert_many_keeps_input_order(rule_sets, placeholders, sample_text, tmp_path):
+    lines = [line for line in sample_text.splitlines() if line.strip()][:40]
+    texts = lines + lines[:10] + ['', lines[0]]
+    random.Random(0).shuffle(texts)
+    expected = [orchestrate(text, rule_sets[HTML_FORMAT], placeholders) for text in texts]
+
+    skipping_placeholders, localized_placeholders = placeholders
+    final_list, two_char_list, localized_list = rule_lists(rule_sets[HTML_FORMAT])
+    args = (texts, skipping_placeholders, localized_list, localized_placeholders, final_list, two_char_list, HTML_FORMAT)
+    assert engine.convert_many(*args) == expected
+
+    cache = engine.ParagraphResultCache(str(tmp_path / 'cache.sqlite3'))
+    try:
+        assert engine.convert_many(*args, paragraph_cache=cache) == expected
+        assert engine.convert_many(*args, paragraph_cache=cache) == expected
+    finally:
+        cache.close()
@@ -0,0 +1,51 @@
+"""
+增量构建（build_replacements_json_incremental）的结果与完整构建（build_replacements_json）逐项相同。
+"""
+import json
+
+import esp_replacement_json_make_module as builder
+
+# 默认 CSV 与词根列表中都没有的词根，PEJVO 中有几个 stem 含有它，增量构建时这些 stem 需要重新分解
+NEW_ROOT_ROW = 'raviol,意大利饺子'
+
+
+def load_setting_lists():
+    with open(builder.DEFAULT_STEMMING_SETTING_JSON_PATH, encoding='utf-8') as f:
+        custom_stemming_setting_list = json.load(f)
+    with open(builder.DEFAULT_REPLACEMENT_SETTING_JSON_PATH, encoding='utf-8') as f:
+        user_replacement_item_setting_list = json.load(f)
+    return custom_stemming_setting_list, user_replacement_item_setting_list
+
+
+def test_incremental_build_after_adding_root_matches_full_build(global_placeholders_path, tmp_path):
+    with open(builder.DEFAULT_CSV_PATH, encoding='utf-8') as f:
+        csv_text = f.read()
+    edited_csv_text = csv_text.rstrip('\n') + '\n' + NEW_ROOT_ROW + '\n'
+    setting_lists = load_setting_lists()
+    resources = builder.load_default_build_resources(
+        None, builder.import_placeholders(global_placeholders_path), None, None
+    )
+    resource_kwargs = dict(zip((
+        'char_widths_dict',
+        'imported_placeholders_for_global_replacement',
+        'imported_placeholders_for_2char_replacement',
+        'imported_placeholders_for_local_replacement',
+    ), resources))
+
+    first_data, first_report = builder.build_replacements_json_incremental(
+        csv_text, *setting_lists, builder.FORMAT_INDEPENDENT_TYPE, cache_dir=str(tmp_path), **resource_kwargs
+    )
+    assert not first_report['previous_build_found']
+
+    incremental_data, report = builder.build_replacements_json_incremental(
+        edited_csv_text, *setting_lists, builder.FORMAT_INDEPENDENT_TYPE, cache_dir=str(tmp_path), **resource_kwargs
+    )
+    assert report['previous_build_found']
+    assert (report['added_rows'], report['removed_rows'], report['changed_rows']) == (1, 0, 0)
+    assert 0 < report['resegmented_stem_count'] < first_report['resegmented_stem_count']
+
+    full_data = builder.build_replacements_json(
+        builder.read_csv_for_replacement(edited_csv_text), *setting_lists, builder.FORMAT_INDEPENDENT_TYPE, *resources
+    )
+    assert incremental_data == full_data
+    assert incremental_data != first_data
@@ -0,0 +1,74 @@
+import json
+import os
+
+import esp_replacement_json_make_module as builder
+
+
+def expected_summary_counts(data):
+    return (
+        f"全域 {len(data[builder.FORMAT_INDEPENDENT_GLOBAL_ROWS_KEY])} 条，"
+        f"二文字词根 {len(data[builder.FORMAT_INDEPENDENT_2CHAR_ROWS_KEY])} 条，"
+        f"局部 {len(data[builder.FORMAT_INDEPENDENT_LOCALIZED_ROWS_KEY])} 条"
+    )
+
+
+def test_single_build_format_independent(format_independent_build):
+    output_path, stdout = format_independent_build
+    with open(output_path, encoding='utf-8') as f:
+        data = json.load(f)
+    assert builder.is_format_independent_rule_data(data)
+    assert builder.count_rule_data_rows(data) == (
+        len(data[builder.FORMAT_INDEPENDENT_GLOBAL_ROWS_KEY]),
+        len(data[builder.FORMAT_INDEPENDENT_2CHAR_ROWS_KEY]),
+        len(data[builder.FORMAT_INDEPENDENT_LOCALIZED_ROWS_KEY]),
+    )
+    assert expected_summary_counts(data) in stdout
+    assert '格式无关' in stdout
+
+
+def test_batch_build_format_independent(format_independent_build, global_placeholders_path, tmp_path, capsys):
+    exit_code = builder.main([
+        '--batch-job', builder.DEFAULT_CSV_PATH, builder.FORMAT_INDEPENDENT_TYPE,
+        '--output-dir', str(tmp_path),
+        '--global-placeholders', global_placeholders_path,
+        '--compact',
+    ])
+    assert exit_code == 0
+    stdout = capsys.readouterr().out
+    csv_name = os.path.splitext(os.path.basename(builder.DEFAULT_CSV_PATH))[0]
+    output_path = tmp_path / f"{csv_name}_{builder.FORMAT_INDEPENDENT_TYPE}.json"
+    with open(output_path, encoding='utf-8') as f:
+        data = json.load(f)
+    assert expected_summary_counts(data) in stdout
+
+    # 批量构建与单独构建的结果相同
+    with open(format_independent_build[0], encoding='utf-8') as f:
+        assert data == json.load(f)
+
+
+def test_build_cache_keyed_on_placeholders(global_placeholders_path, tmp_path, capsys):
+    # 换用另一份全域 placeholder 文件时不能命中上次的缓存
+    with open(global_placeholders_path, encoding='utf-8') as f:
+        shifted_placeholders = f.readlines()[1:]
+    shifted_placeholders_path = tmp_path / 'shifted_global_placeholders.txt'
+    shifted_placeholders_path.write_text(''.join(shifted_placeholders), encoding='utf-8')
+
+    outputs = []
+    for placeholders_path in (global_placeholders_path, shifted_placeholders_path, shifted_placeholders_path):
+        output_path = tmp_path / f'rules_{len(outputs)}.json'
+        exit_code = builder.main([
+            '--format-type', builder.FORMAT_INDEPENDENT_TYPE,
+            '--output', str(output_path),
+            '--global-placeholders', str(placeholders_path),
+            '--cache-dir', str(tmp_path / 'cache'),
+            '--compact',
+        ])
+        assert exit_code == 0
+        with open(output_path, encoding='utf-8') as f:
+            outputs.append((json.load(f), '(缓存命中)' in capsys.readouterr().out))
+
+    assert [cache_hit for _, cache_hit in outputs] == [False, False, True]
+    assert outputs[0][0] != outputs[1][0]
+    assert outputs[1][0] == outputs[2][0]
+    global_rows = outputs[1][0][builder.FORMAT_INDEPENDENT_GLOBAL_ROWS_KEY]
+    assert {row[-1] for row in global_rows} <= {placeholder.strip() for placeholder in shifted_placeholders}
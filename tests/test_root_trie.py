@@ -0,0 +1,59 @@
+"""
+词根分解用的 trie（trie_safe_replace）与逐条 safe_replace 的结果完全相同。
+"""
+import json
+
+import pytest
+
+import esp_replacement_json_make_module as builder
+import esp_text_replacement_module as engine
+
+# 为了缩短测试时间，PEJVO 的 stem 每 STEM_SUBSAMPLE_STEP 个取一个
+STEM_SUBSAMPLE_STEP = 10
+
+
+def root_replacements(roots, placeholders):
+    # 与 build_replacements_json 第 3 步相同：按长度从大到小稳定排序；
+    # 替换后文字含有原词根，可以检查已替换的部分不会被再次匹配
+    sorted_roots = sorted(roots, key=len, reverse=True)
+    return [(root, '[' + root + ']', placeholder) for root, placeholder in zip(sorted_roots, placeholders)]
+
+
+@pytest.mark.parametrize('roots, stem', [
+    # 较长的词根优先，即使它在右边
+    (['al', 'lta', 'ta'], 'alta'),
+    # 同样长度时按列表顺序
+    (['ab', 'bc'], 'abc'),
+    (['bc', 'ab'], 'abc'),
+    # 同一词根多次出现，相邻出现
+    (['la'], 'lala/la'),
+    # 重复的 old 只有第一次有效
+    (['ami', 'ami', 'am'], 'amiko'),
+    (['xyz'], 'amiko'),
+])
+def test_trie_safe_replace_small_cases(roots, stem):
+    replacements = [(root, '[' + root + str(rank) + ']', f'${rank}$') for rank, root in enumerate(roots)]
+    trie = builder.build_root_trie(replacements)
+    assert builder.trie_safe_replace(stem, trie) == engine.safe_replace(stem, replacements)
+
+
+def test_trie_safe_replace_matches_safe_replace_on_pejvo_stems(global_placeholders_path):
+    roots = {}
+    with open(builder.DEFAULT_ROOT_LIST_PATH, encoding='utf-8') as f:
+        for line in f:
+            root = line.strip()
+            if root and not root.isdigit():
+                roots[root] = None
+    with open(builder.DEFAULT_CSV_PATH, encoding='utf-8') as f:
+        for root in builder.csv_root_translation_dict(builder.read_csv_for_replacement(f.read())):
+            roots[root] = None
+    replacements = root_replacements(roots, engine.import_placeholders(global_placeholders_path))
+    trie = builder.build_root_trie(replacements)
+
+    with open(builder.DEFAULT_PEJVO_STEM_JSON_PATH, encoding='utf-8') as f:
+        stems = [item[0] for item in json.load(f)[::STEM_SUBSAMPLE_STEP] if len(item) == 2]
+    mismatches = [
+        stem for stem in stems
+        if builder.trie_safe_replace(stem, trie) != engine.safe_replace(stem, replacements)
+    ]
+    assert mismatches == []
@@ -0,0 +1,76 @@
+"""
+由规则列表派生、并在模块中缓存的数据（正则等）必须随规则内容变化：
+列表被原地修改、或新列表重新使用了已释放列表的 id 时，不能沿用旧的结果。
+"""
+import esp_text_replacement_module as engine
+
+
+def convert(text, final_list, **kwargs):
+    return engine.orchestrate_comprehensive_esperanto_text_replacement(
+        text, [], [], [], final_list, [], '替换后文字列のみ(仅)保留(简单替换)', **kwargs
+    )
+
+
+def test_gap_pattern_follows_rule_content():
+    rules = [('amo', 'LOVE', '$10001$')]
+    assert convert('ĉefo amo', rules) == 'ĉefo LOVE'
+    # 长度和 id 都不变，只有内容改变（与新列表重新使用旧 id 的情况相同）
+    rules[0] = ('ĉefo', 'CHIEF', '$10001$')
+    assert convert('ĉefo amo', rules) == 'CHIEF amo'
+
+
+def test_gap_pattern_uses_caller_rule_set_hash():
+    rules = [('ĉefo', 'CHIEF', '$10001$')]
+    assert convert('ĉefo', rules, rule_set_hash='set-a') == 'CHIEF'
+    assert engine.rule_lists_cache_key((rules,), 'set-a') == ('set-a', 1)
+    assert engine.rule_lists_cache_key((rules,)) != engine.rule_lists_cache_key(([('amo', 'LOVE', '$10001$')],))
+
+
+def test_compact_rule_list_keys_text_includes_extras():
+    rules = engine.CompactRuleList([('amo', 'LOVE', '$10001$'), ('ĉefo', 'CHIEF', '$10002$', engine.BOUNDARY_STANDALONE)])
+    assert set(rules.keys_text()) >= set('amoĉef')
+
+
+def test_vocabulary_token_pattern_follows_rule_content():
+    rules = [('amo', 'LOVE', '$10001$')]
+    assert convert('ĉefo amo', rules, vocabulary_mode=True) == 'ĉefo LOVE'
+    rules[0] = ('ĉefo', 'CHIEF', '$10001$')
+    assert convert('ĉefo amo', rules, vocabulary_mode=True) == 'CHIEF amo'
+
+
+def test_vocabulary_mode_sees_compact_extras():
+    # 带词边界约束的规则保存在 CompactRuleList 的 _extras 中
+    rules = engine.CompactRuleList([('ĉefo', 'CHIEF', '$10001$', engine.BOUNDARY_STANDALONE)])
+    assert convert('ĉefo, ĉefoj', rules, vocabulary_mode=True) == convert('ĉefo, ĉefoj', rules) == 'CHIEF, ĉefoj'
+
+
+def test_rule_set_hash_follows_rule_content():
+    rules, two_char_rules, localized_rules = [('amo', 'LOVE', '$10001$')], [], []
+    before = engine.compute_rule_set_hash(rules, two_char_rules, localized_rules)
+    rules[0] = ('amo', 'HATE', '$10001$')
+    assert engine.compute_rule_set_hash(rules, two_char_rules, localized_rules) != before
+    assert engine.compute_rule_set_hash(rules, two_char_rules, localized_rules, case_insensitive=True) != \
+        engine.compute_rule_set_hash(rules, two_char_rules, localized_rules)
+
+
+def test_paragraph_cache_does_not_serve_results_of_edited_rules(tmp_path):
+    cache = engine.ParagraphResultCache(str(tmp_path / 'cache.sqlite3'))
+    try:
+        rules = [('amo', 'LOVE', '$10001$')]
+        assert convert('amo\n', rules, paragraph_cache=cache) == 'LOVE\n'
+        rules[0] = ('amo', 'HATE', '$10001$')
+        assert convert('amo\n', rules, paragraph_cache=cache) == 'HATE\n'
+    finally:
+        cache.close()
+
+
+def test_observed_worker_peak_follows_rule_content(monkeypatch):
+    monkeypatch.setattr(engine, 'process_rss_bytes', lambda pid=None: 100 << 20)
+    monkeypatch.setattr(engine, '_observed_worker_peak_rss', {})
+    budget = 1 << 30
+    small_rules = [('amo', 'LOVE', '$10001$')]
+    engine._observed_worker_peak_rss[engine.worker_memory_key((small_rules, [], []))] = 1 << 20
+    assert engine.limit_worker_count(8, budget, small_rules, [], []) == 8
+    # 内容不同的规则不使用这次实测的峰值，而是按大小估算
+    large_rules = [('amo%d' % i, 'LOVE' * 50, '$%d$' % i) for i in range(100000)]
+    assert engine.limit_worker_count(8, budget, large_rules, [], []) < 8
@@ -0,0 +1,67 @@
+"""
+带词边界约束的规则（规则的第 4 个元素，见 BOUNDARY_*）在行首、标点、URL 中的行为。
+"""
+import pytest
+
+import esp_replacement_json_make_module as builder
+import esp_text_replacement_module as engine
+
+STANDALONE_LA = ('la', 'LA', '$10001$', engine.BOUNDARY_STANDALONE)
+WORD_START_AMO = ('amo', 'AMO', '$10002$', engine.BOUNDARY_WORD_START)
+WORD_END_AMU = ('amu', 'AMU', '$10003$', engine.BOUNDARY_WORD_END)
+
+
+@pytest.mark.parametrize('text, expected', [
+    # 文本开头、行首、行尾都算作边界
+    ('la hundo\nla kato', 'LA hundo\nLA kato'),
+    ('vidu la\nla', 'vidu LA\nLA'),
+    # 标点两侧也算作边界
+    ('la, la. (la) «la»!', 'LA, LA. (LA) «LA»!'),
+    # 相邻的独立词共用一个空格，一次替换全部
+    ('la la la', 'LA LA LA'),
+    # 词的一部分不替换
+    ('lago sala kolao', 'lago sala kolao'),
+    # URL 中的 '/', '?', '=' 等连接字符不算边界
+    ('example.com/la?x=1', 'example.com/la?x=1'),
+    ('?la=1&la', '?la=1&la'),
+    # '.' 仍是句末标点，域名后缀会被当作独立的词
+    ('example.la', 'example.LA'),
+])
+def test_standalone_boundary(text, expected):
+    assert engine.safe_replace(text, [STANDALONE_LA]) == expected
+
+
+def test_word_start_and_end_boundaries():
+    rules = [WORD_START_AMO, WORD_END_AMU]
+    assert engine.safe_replace('amo kamo amoj', rules) == 'AMO kamo AMOj'
+    assert engine.safe_replace('amu amuz ramu', rules) == 'AMU amuz rAMU'
+    assert engine.safe_replace('(amo)\namu.', rules) == '(AMO)\nAMU.'
+
+
+def test_placeholder_characters_are_not_boundaries():
+    # 已被替换为 placeholder 的词根与后面的文字仍是同一个词
+    rules = [('hund', 'HUND', '$10004$'), STANDALONE_LA]
+    assert engine.safe_replace('hundla la', rules) == 'HUNDla LA'
+
+
+def test_boundaries_with_case_insensitive_rules():
+    rules = [('la', 'the', '$10005$', engine.BOUNDARY_STANDALONE)]
+    assert engine.safe_replace('La LA la lago Lago', rules, case_insensitive=True) == 'The THE the lago Lago'
+
+
+def test_merge_word_boundary_duplicates_keeps_wider_rule():
+    rules = [
+        ('amu', 'AMU', '$1$', engine.BOUNDARY_STANDALONE),
+        ('amu', 'AMU', '$2$', engine.BOUNDARY_WORD_END),
+        ('kato', 'KATO', '$3$'),
+    ]
+    assert builder.merge_word_boundary_duplicates(rules) == [
+        ('amu', 'AMU', '$2$', engine.BOUNDARY_WORD_END),
+        ('kato', 'KATO', '$3$'),
+    ]
+    # 约束不能互相包含（词首与词尾）时两条都保留
+    rules = [
+        ('amu', 'AMU', '$1$', engine.BOUNDARY_WORD_START),
+        ('amu', 'AMU', '$2$', engine.BOUNDARY_WORD_END),
+    ]
+    assert builder.merge_word_boundary_duplicates(rules) == rules